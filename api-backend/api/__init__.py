@@ -3,6 +3,17 @@ from flask import Blueprint
 # Create a main blueprint for API v1
 api_v1_bp = Blueprint('api_v1', __name__, url_prefix='/api')
 
+# Async twins of views that only wait on TMDB, keyed by the Flask view function they mirror.
+# asgi.py serves these natively on its event loop instead of through the WSGI app.
+ASYNC_VIEWS = {}
+
+def async_twin(view):
+    """Registers the decorated coroutine function as the async version of ``view``"""
+    def decorator(async_view):
+        ASYNC_VIEWS[view] = async_view
+        return async_view
+    return decorator
+
 def register_blueprints(api_blueprint):
     """
     Register all blueprints with the main API blueprint.
@@ -14,11 +25,13 @@ def register_blueprints(api_blueprint):
     from api.watched_routes import watched_bp
     from api.tmdb_proxy_routes import tmdb_proxy_bp
     from api.health_check_routes import health_check_bp
+    from api.recommendation_routes import recommendations_bp
     
     api_blueprint.register_blueprint(auth_bp)
     api_blueprint.register_blueprint(lists_bp)
     api_blueprint.register_blueprint(watched_bp)
     api_blueprint.register_blueprint(tmdb_proxy_bp)
     api_blueprint.register_blueprint(health_check_bp)
+    api_blueprint.register_blueprint(recommendations_bp)
     
     return api_blueprint
\ No newline at end of file
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_mail import Message
-from extensions import mail
+from extensions import auth_tokens, mail_outbox
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
@@ -41,10 +40,7 @@ def register():
     db.session.add(favourites)
     db.session.commit()
 
-    token = jwt.encode({
-        'user_id': user.id,
-        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=24)
-    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+    token = auth_tokens.issue(user, datetime.timedelta(hours=24))
     
     return jsonify({
         "token": token,
@@ -65,10 +61,7 @@ def login():
     if not user or not check_password_hash(user.password, password):
         return jsonify({"msg": "Invalid credentials"}), 401
         
-    token = jwt.encode({
-        'user_id': user.id,
-        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=24)
-    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+    token = auth_tokens.issue(user, datetime.timedelta(hours=24))
 
     return jsonify({
         "token": token,
@@ -87,39 +80,21 @@ def recovery():
     if not user:
         return jsonify({"msg": "Email not found"}), 404 
     
-    token = jwt.encode({
-        'user_id': user.id,
-        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
-    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+    token = auth_tokens.issue(user, datetime.timedelta(hours=1))
     
     recovery_link = f"{current_app.config['FRONTEND_URL']}/recovery/{token}"
-    recovery_message = Message(
-        subject="Password Recovery",
-        sender=current_app.config['MAIL_DEFAULT_SENDER'],
-        recipients=[email],
-        body=f"Click the link to recover your password: {recovery_link}"
-    )
-    
+
+    # Queued in the mail outbox and sent by a background thread, so a slow or failing
+    # SMTP server never holds up the request
     try:
-        current_app.logger.info(f"Sending email to: {email}")
-        current_app.logger.info(f"Mail server: {current_app.config['MAIL_SERVER']}:{current_app.config['MAIL_PORT']}")
-        current_app.logger.info(f"TLS: {current_app.config['MAIL_USE_TLS']}, SSL: {current_app.config['MAIL_USE_SSL']}")
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                mail.send(recovery_message)
-                current_app.logger.info(f"Email sent successfully on attempt {attempt + 1}")
-                break
-            except Exception as retry_error:
-                current_app.logger.warning(f"Attempt {attempt + 1} failed: {str(retry_error)}")
-                if attempt == max_retries - 1:
-                    raise retry_error
-                import time
-                time.sleep(2)  # Wait 2 seconds before retry
-                
+        mail_outbox.enqueue(
+            subject="Password Recovery",
+            recipients=[email],
+            body=f"Click the link to recover your password: {recovery_link}"
+        )
     except Exception as e:
-        current_app.logger.error(f"Failed to send recovery email: {str(e)}")
+        db.session.rollback()
+        current_app.logger.error(f"Failed to queue recovery email: {str(e)}")
         # Still return success to avoid revealing user information
         
     current_app.logger.info(f"Password recovery requested for email: {email}")
@@ -144,7 +119,8 @@ def reset_password():
     try:
         # Decode and validate the JWT token
         current_app.logger.info("Attempting to decode JWT token")
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+        # Rejects recovery links issued before the last password reset (token_version changed)
+        payload = auth_tokens.verify(token)
         user_id = payload.get('user_id')
         
         current_app.logger.info(f"Token decoded successfully. User ID: {user_id}")
@@ -175,7 +151,8 @@ def reset_password():
         current_app.logger.info(f"Updating password for user: {user.email}")
         hashed_pw = generate_password_hash(new_password)
         user.password = hashed_pw
-        db.session.commit()
+        # Log out every session and invalidate this recovery link (commits the new password too)
+        auth_tokens.revoke_all(user.id)
         
         current_app.logger.info(f"Password reset successfully for user ID: {user_id} ({user.email})")
         return jsonify({"msg": "Password reset successfully"}), 200
@@ -1,23 +1,99 @@
-from flask import Blueprint, jsonify, current_app
-import requests
+import datetime
+import os
+import time
+
+from flask import Blueprint, jsonify, current_app, request
+from db_pool import ping, pool_stats
+from extensions import db, tmdb, tmdb_health
+from health import pool_exhausted
+from utils import require_metrics_token
 
 # Create a blueprint for health check routes
 health_check_bp = Blueprint('health_check', __name__, url_prefix='/health')
 
+_STARTED_AT = time.monotonic()
+
+
+def _tmdb_status(result):
+    if result is None:
+        return {"reachable": None, "latency_ms": None, "checked_at": None, "age_seconds": None}
+    age = datetime.datetime.now(datetime.timezone.utc) - result["checked_at"]
+    status = {
+        "reachable": result["reachable"],
+        "latency_ms": result["latency_ms"],
+        "checked_at": result["checked_at"].isoformat(),
+        "age_seconds": round(age.total_seconds(), 3),
+    }
+    if result["error"]:
+        status["error"] = result["error"]
+    return status
+
+
+@health_check_bp.route('/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving requests. No I/O."""
+    return jsonify({"status": "ok"}), 200
+
+
 @health_check_bp.route('', methods=['GET'])
+@health_check_bp.route('/ready', methods=['GET'])
 def health_check():
     """
-    Health check endpoint to verify if the API is running and can access TMDB.
+    Readiness probe: the database answers and the pool has a free connection. TMDB is reported
+    from the last background check (see health.py) and only degrades the status, since the
+    routes that do not call TMDB keep working without it.
     """
     # Check if TMDB API key is configured
     tmdb_api_key = current_app.config.get("TMDB_API_KEY")
     if not tmdb_api_key:
         return jsonify({"status": "error", "message": "TMDB_API_KEY is not configured"}), 500
-    tmdb_base_url = current_app.config.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
-    try:
-        # Make a test request to TMDB
-        response = requests.get(f"{tmdb_base_url}/movie/popular?api_key={tmdb_api_key}&language=en-US")
-        response.raise_for_status()  # Raise an error for bad responses
-        return jsonify({"status": "ok", "message": "API is healthy", "tmdb_reachable": True}), 200
-    except requests.exceptions.RequestException as e:
-        return jsonify({"status": "error", "message": f"TMDB API is not reachable: {str(e)}"}), 503
\ No newline at end of file
+    # A saturated pool would make the ping wait DB_POOL_TIMEOUT seconds
+    if pool_exhausted(pool_stats(db.engine)):
+        return jsonify({"status": "error", "message": "Database connection pool is exhausted", "database_reachable": True}), 503
+    database_reachable, error, _ = ping(db.engine)
+    if not database_reachable:
+        current_app.logger.warning(f"Readiness check: database is not reachable: {error}")
+        return jsonify({"status": "error", "message": "Database is not reachable", "database_reachable": False}), 503
+    result = tmdb_health.result()
+    tmdb_reachable = result["reachable"] if result else None
+    if tmdb_reachable is False:
+        return jsonify({"status": "degraded", "message": "TMDB API is not reachable", "database_reachable": True, "tmdb_reachable": False}), 200
+    return jsonify({"status": "ok", "message": "API is healthy", "database_reachable": True, "tmdb_reachable": tmdb_reachable}), 200
+
+
+@health_check_bp.route('/details', methods=['GET'])
+@require_metrics_token
+def health_details():
+    """
+    Latency of each dependency for this worker: database ping and pool statistics, and the last
+    TMDB check (``?refresh=true`` checks TMDB now instead).
+    """
+    database_reachable, error, latency_ms = ping(db.engine)
+    database = {"reachable": database_reachable, "ping_ms": latency_ms, "pool": pool_stats(db.engine)}
+    if error:
+        current_app.logger.warning(f"Database health check failed: {error}")
+        database["error"] = "Database is not reachable"
+    if request.args.get("refresh", "false").lower() in ['true', '1', 'yes']:
+        result = tmdb_health.probe()
+    else:
+        result = tmdb_health.result()
+    return jsonify({
+        "status": "ok" if database_reachable else "error",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.monotonic() - _STARTED_AT, 3),
+        "database": database,
+        "tmdb": {**_tmdb_status(result), "circuit": tmdb.breaker.stats()},
+    }), 200 if database_reachable else 503
+
+
+@health_check_bp.route('/db', methods=['GET'])
+@require_metrics_token
+def database_health():
+    """Database ping and connection pool statistics for this worker"""
+    database_reachable, error, latency_ms = ping(db.engine)
+    body = {"database_reachable": database_reachable, "ping_ms": latency_ms, "pool": pool_stats(db.engine)}
+    if error:
+        # The driver message can name hosts, users and schemas: it only goes to the log
+        current_app.logger.warning(f"Database health check failed: {error}")
+        body["error"] = "Database is not reachable"
+    return jsonify(body), 200 if database_reachable else 503
@@ -6,10 +6,34 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from extensions import db
 from models import List, MovieList
-from utils import _save_movie_details_if_not_exist, require_user_match
+from utils import (
+    _insert_ignore, _keyset_page, _page_args, _save_movie_details_if_not_exist, _save_movies_details_if_not_exist,
+    require_user_match
+)
 
 lists_bp = Blueprint('lists', __name__, url_prefix='/lists')
 
+MAX_BULK_CHANGES = 500 # add + remove + move entries accepted by PATCH /lists/<id>/movies
+
+def _list_movies_page(list_id):
+    """
+    Movies of a list in insertion order, keyset-paginated by MovieList.id when ``limit`` or
+    ``cursor`` is given. Only the needed columns are selected.
+    Returns (movies, next_cursor, error).
+    """
+    limit, cursor, error = _page_args()
+    if error:
+        return None, None, error
+    query = db.session.query(MovieList.id, MovieList.tmdb_id).filter(MovieList.list_id == list_id)
+    if cursor is not None:
+        try:
+            (last_id,) = cursor
+            query = query.filter(MovieList.id > int(last_id))
+        except (ValueError, TypeError):
+            return None, None, "Invalid cursor"
+    rows, next_cursor = _keyset_page(query.order_by(MovieList.id), limit, lambda row: [row.id])
+    return [{"tmdb_id": row.tmdb_id} for row in rows], next_cursor, None
+
 @lists_bp.route("/", methods=["GET"])
 @require_user_match
 def get_user_lists(auth_user_id): # auth_user_id is injected by the decorator
@@ -46,12 +70,12 @@ def add_movie_to_list(auth_user_id): # auth_user_id is injected by the decorator
     lista = List.query.filter_by(id=list_id, user_id=auth_user_id).first()
     if not lista:
         return jsonify({"msg": "List not found or access denied"}), 404
-    if MovieList.query.filter_by(list_id=list_id, tmdb_id=tmdb_id).first():
-        return jsonify({"msg": "Movie already in list"}), 409
-    
-    movie_list_entry = MovieList(tmdb_id=tmdb_id, list_id=list_id)
-    db.session.add(movie_list_entry)
+
+    # Single atomic insert: the unique (list_id, tmdb_id) index rejects duplicates
+    inserted = _insert_ignore(MovieList, [{"list_id": list_id, "tmdb_id": tmdb_id}])
     db.session.commit()
+    if not inserted:
+        return jsonify({"msg": "Movie already in list"}), 409
     return jsonify({"msg": "Movie added", "tmdb_id": tmdb_id}), 201
 
 @lists_bp.route("/<list_id>", methods=["GET"])
@@ -60,12 +84,11 @@ def get_list_details(auth_user_id, list_id):
     lista = List.query.filter_by(id=list_id, user_id=auth_user_id).first()
     if not lista:
         return jsonify({"msg": "List not found or access denied"}), 404
-    movie_entries = MovieList.query.filter_by(list_id=lista.id).all()
-    movies_output = []
-    for entry in movie_entries:
-        movies_output.append({"tmdb_id": entry.tmdb_id})
+    movies_output, next_cursor, error = _list_movies_page(lista.id)
+    if error:
+        return jsonify({"msg": error}), 400
 
-    return jsonify({"id": lista.id, "name": lista.name, "is_main": lista.is_main, "user_id": lista.user_id, "movies": movies_output}), 200
+    return jsonify({"id": lista.id, "name": lista.name, "is_main": lista.is_main, "user_id": lista.user_id, "movies": movies_output, "next_cursor": next_cursor}), 200
 
 @lists_bp.route("/<list_id>", methods=["DELETE"])
 @require_user_match
@@ -105,28 +128,121 @@ def remove_movie_from_list(auth_user_id, list_id, tmdb_id):
     if not lista:
         return jsonify({"msg": "List not found or access denied"}), 404
 
-    movie_list_entry = MovieList.query.filter_by(list_id=list_id, tmdb_id=tmdb_id).first()
-    if not movie_list_entry:
-        return jsonify({"msg": "Movie not found in this list"}), 404
-
-    db.session.delete(movie_list_entry)
+    deleted = MovieList.query.filter_by(list_id=list_id, tmdb_id=tmdb_id).delete()
     db.session.commit()
+    if not deleted:
+        return jsonify({"msg": "Movie not found in this list"}), 404
     return jsonify({"msg": "Movie removed from list"}), 200
 
+def _parse_bulk_changes(data, list_id):
+    """
+    Validates the PATCH /lists/<list_id>/movies body. Returns (add, remove, moves, error) where
+    moves maps each target list id to the tmdb_ids moved there.
+    """
+    if not isinstance(data, dict):
+        return None, None, None, "Expected a JSON object with add, remove and/or move"
+    try:
+        if not all(isinstance(data.get(key) or [], list) for key in ("add", "remove", "move")):
+            raise TypeError("add, remove and move must be lists")
+        add = [int(tmdb_id) for tmdb_id in data.get("add") or []]
+        remove = [int(tmdb_id) for tmdb_id in data.get("remove") or []]
+        moves = {}
+        for item in data.get("move") or []:
+            to_list_id = item["to_list_id"]
+            if not isinstance(to_list_id, str):
+                raise TypeError("to_list_id must be a string")
+            moves.setdefault(to_list_id, {})[int(item["tmdb_id"])] = None
+    except (TypeError, ValueError, KeyError):
+        return None, None, None, "add and remove must be lists of TMDB IDs, move a list of {tmdb_id, to_list_id}"
+    if list_id in moves:
+        return None, None, None, "A movie cannot be moved to the list it is already in"
+    moves = {to_list_id: list(tmdb_ids) for to_list_id, tmdb_ids in moves.items()}
+    moved = [tmdb_id for tmdb_ids in moves.values() for tmdb_id in tmdb_ids]
+    if len(moved) != len(set(moved)):
+        return None, None, None, "A movie can only be moved to one list"
+    if not (add or remove or moved):
+        return None, None, None, "Nothing to change"
+    if len(add) + len(remove) + len(moved) > MAX_BULK_CHANGES:
+        return None, None, None, f"At most {MAX_BULK_CHANGES} changes can be sent at once"
+    if len(set(add) | set(remove) | set(moved)) != len(set(add)) + len(set(remove)) + len(set(moved)):
+        return None, None, None, "A movie can only appear in one of add, remove or move"
+    return list(dict.fromkeys(add)), list(dict.fromkeys(remove)), moves, None
+
+@lists_bp.route("/<list_id>/movies", methods=["PATCH"])
+@require_user_match
+def update_list_movies(auth_user_id, list_id):
+    """
+    Adds, removes and moves several movies in one request: list ownership is checked with
+    a single query, existence checks and writes are set-based, and everything is committed once.
+    """
+    add, remove, moves, error = _parse_bulk_changes(request.get_json(silent=True), list_id)
+    if error:
+        return jsonify({"msg": error}), 400
+
+    list_ids = {list_id} | set(moves)
+    owned = {l_id for (l_id,) in db.session.query(List.id).filter(List.id.in_(list_ids), List.user_id == auth_user_id)}
+    if owned != list_ids:
+        return jsonify({"msg": "List not found or access denied"}), 404
+
+    # Movie details are stored (one IN query plus concurrent TMDB fetches of the misses) before
+    # touching the list, so a movie TMDB cannot return is reported instead of added.
+    stored = _save_movies_details_if_not_exist(add) if add else {}
+    unavailable = [tmdb_id for tmdb_id in add if tmdb_id not in stored]
+    add = [tmdb_id for tmdb_id in add if tmdb_id in stored]
+
+    moved_ids = [tmdb_id for tmdb_ids in moves.values() for tmdb_id in tmdb_ids]
+    # One IN query tells which of the touched movies are already in the list
+    in_list = {
+        tmdb_id for (tmdb_id,) in db.session.query(MovieList.tmdb_id).filter(
+            MovieList.list_id == list_id, MovieList.tmdb_id.in_(add + remove + moved_ids)
+        )
+    }
+    added = [tmdb_id for tmdb_id in add if tmdb_id not in in_list]
+    removed = [tmdb_id for tmdb_id in remove if tmdb_id in in_list]
+    moved = [
+        (tmdb_id, to_list_id) for to_list_id, tmdb_ids in moves.items()
+        for tmdb_id in tmdb_ids if tmdb_id in in_list
+    ]
+
+    try:
+        _insert_ignore(MovieList, [{"list_id": list_id, "tmdb_id": tmdb_id} for tmdb_id in added] + [
+            {"list_id": to_list_id, "tmdb_id": tmdb_id} for tmdb_id, to_list_id in moved
+        ])
+        leaving = removed + [tmdb_id for tmdb_id, _ in moved]
+        if leaving:
+            MovieList.query.filter(
+                MovieList.list_id == list_id, MovieList.tmdb_id.in_(leaving)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error updating movies of list {list_id}: {str(e)}")
+        return jsonify({"msg": "Could not update the list"}), 500
+
+    return jsonify({
+        "msg": "List updated",
+        "added": added,
+        "already_in_list": [tmdb_id for tmdb_id in add if tmdb_id in in_list],
+        "unavailable": unavailable,
+        "removed": removed,
+        "moved": [{"tmdb_id": tmdb_id, "to_list_id": to_list_id} for tmdb_id, to_list_id in moved],
+        "not_in_list": [tmdb_id for tmdb_id in remove + moved_ids if tmdb_id not in in_list]
+    }), 200
+
 @lists_bp.route("/public/<list_id>", methods=["GET"])
 def get_public_list_details(list_id):
     lista = List.query.filter_by(id=list_id).first()
     if not lista:
         return jsonify({"msg": "List not found"}), 404
-    movie_entries = MovieList.query.filter_by(list_id=lista.id).all()
-    movies_output = []
-    for entry in movie_entries:
-        movies_output.append({"tmdb_id": entry.tmdb_id})
+    movies_output, next_cursor, error = _list_movies_page(lista.id)
+    if error:
+        return jsonify({"msg": error}), 400
 
     return jsonify({
         "id": lista.id,
         "name": lista.name,
         "is_main": lista.is_main,
         "user_id": lista.user_id,
-        "movies": movies_output
+        "movies": movies_output,
+        "next_cursor": next_cursor
     }), 200
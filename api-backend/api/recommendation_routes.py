@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify, request
+import os
+import sys
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import DEFAULT_LANGUAGE
+from recommender import recommend
+from utils import LANGUAGE_PATTERN, _movie_to_dict, require_user_match
+
+recommendations_bp = Blueprint('recommendations', __name__, url_prefix='/recommendations')
+
+MAX_RECOMMENDATIONS = 100
+
+@recommendations_bp.route("", methods=["GET"])
+@require_user_match
+def get_recommendations(auth_user_id):
+    """
+    Personalized recommendations: neighbors (precomputed by `flask rebuild-recommendations`) of the
+    movies the user watched or listed, best first, without the movies already watched or listed.
+    """
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({"msg": "limit must be an integer"}), 400
+    if not 1 <= limit <= MAX_RECOMMENDATIONS:
+        return jsonify({"msg": f"limit must be between 1 and {MAX_RECOMMENDATIONS}"}), 400
+    language = request.args.get("language") or DEFAULT_LANGUAGE
+    if not LANGUAGE_PATTERN.match(language):
+        return jsonify({"msg": "Invalid language, expected a code such as pt-BR or en-US"}), 400
+
+    results = []
+    for score, movie, translation in recommend(auth_user_id, limit, language):
+        movie_dict = _movie_to_dict(movie, translation)
+        movie_dict["score"] = round(score, 4)
+        results.append(movie_dict)
+    return jsonify({"user_id": auth_user_id, "results": results}), 200
@@ -1,66 +1,172 @@
 from flask import Blueprint, jsonify, request, current_app
+import math
 import requests
 import os
 import sys
+from typing import Callable, NamedTuple
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import _get_tmdb_movie_details_internal, _save_movie_details_if_not_exist
+from api import async_twin
+from extensions import movie_refresher, response_cache, search_index, tmdb, tmdb_async
+from models import DEFAULT_LANGUAGE
+from tmdb_client import RETRY_STATUSES
+from utils import (
+    LANGUAGE_PATTERN, _get_movie_extras, _movie_to_dict, _save_movie_details_if_not_exist,
+    _save_movie_translation_if_not_exist, _save_movie_translations_if_not_exist,
+    _save_movies_details_if_not_exist, require_metrics_token
+)
 
 tmdb_proxy_bp = Blueprint('tmdb_proxy', __name__, url_prefix='/tmdb')
 
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+MAX_BATCH_SIZE = 500
+SEARCH_PAGE_SIZE = 20  # Same as a TMDB results page
 
-@tmdb_proxy_bp.route("/config", methods=["GET"])
-def get_tmdb_config():
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    try:
-        response = requests.get(f"{TMDB_BASE_URL}/configuration?api_key={TMDB_API_KEY}")
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+def _fetch_tmdb_json(route, path, params):
+    """
+    Returns the JSON body of a TMDB GET request, served from the response cache when
+    an entry for the same route, path and normalized params is still fresh.
+    """
+    # Handlers rewrite "results" in place, so callers always get a copy of the cached body
+    data = response_cache.get(route, path, params)
+    if data is not None:
+        return dict(data)
+    data = tmdb.get(path, params)
+    response_cache.set(route, path, params, data)
+    return dict(data)
 
-@tmdb_proxy_bp.route("/popular", methods=["GET"])
-def get_popular_movies():
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    page = request.args.get("page", 1)
-    language = request.args.get("language", "pt-BR")
-    try:
-        url = f"{TMDB_BASE_URL}/discover/movie"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": language,
-            "sort_by": "popularity.desc",
-            "page": page,
-            "include_adult": False,  # Boolean instead of string
-            "certification_country": "BR",
-            "certification.lte": "18"  # Filmes até 14 anos (sem conteúdo adulto)
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
+async def _fetch_tmdb_json_async(route, path, params):
+    """_fetch_tmdb_json for the async views, sharing the same response cache"""
+    data = response_cache.get(route, path, params)
+    if data is not None:
+        return dict(data)
+    data = await tmdb_async.get(path, params)
+    response_cache.set(route, path, params, data)
+    return dict(data)
+
+def _not_adult(movie):
+    return movie.get("adult", False) == False
+
+def _rated_not_adult(movie):
+    # Filmes com rating válido
+    return _not_adult(movie) and movie.get("vote_average", 0) > 0
+
+class ProxyCall(NamedTuple):
+    """A cached TMDB GET made on behalf of a proxy view"""
+    route: str  # Response cache route (picks the TTL)
+    path: str
+    params: dict
+    keep: Callable = None  # Filters data["results"] before answering
+    local: list = None  # Results found in the stored catalog, listed before the TMDB ones
+
+    def response(self, data):
         # Filtragem manual adicional como backup
-        if "results" in data:
-            filtered_results = []
-            for movie in data["results"]:
-                # Filtrar filmes que podem ser adultos baseado em gêneros e ratings
-                if movie.get("adult", False) == False:
-                    # Verificar se não tem gêneros adultos (geralmente não há gênero específico, mas podemos verificar rating)
-                    if movie.get("vote_average", 0) > 0:  # Filmes com rating válido
-                        filtered_results.append(movie)
-            
-            data["results"] = filtered_results
-            data["total_results"] = len(filtered_results)
-        
+        if self.keep is not None and "results" in data:
+            data["results"] = [movie for movie in data["results"] if self.keep(movie)]
+            data["total_results"] = len(data["results"])
+        if self.local and "results" in data:
+            local_ids = {movie["id"] for movie in self.local}
+            data["results"] = self.local + [movie for movie in data["results"] if movie.get("id") not in local_ids]
+            data["total_results"] = len(data["results"])
         return jsonify(data)
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+
+    def unavailable(self, error):
+        """
+        Answer when TMDB failed (or its circuit breaker is open): the last cached response,
+        marked "stale", else the local results if there are any, else a 503
+        """
+        current_app.logger.warning(f"TMDB unavailable for {self.path}: {str(error)}")
+        stale = response_cache.get_stale(self.route, self.path, self.params)
+        if stale is not None:
+            return self.response({**stale, "stale": True})
+        if self.local:
+            return jsonify({"page": 1, "results": self.local, "total_results": len(self.local), "total_pages": 1})
+        return _tmdb_unavailable(getattr(error, "retry_after", 0))
+
+def _tmdb_client_error(error):
+    """
+    None when ``error`` is a TMDB outage (circuit open, network error, timeout, 429 or 5xx);
+    otherwise the answer to TMDB rejecting this request with a 4xx, without the upstream text.
+    The circuit breaker counts the same statuses as successes.
+    """
+    if not isinstance(error, requests.exceptions.HTTPError) or error.response is None:
+        return None
+    status = error.response.status_code
+    if status >= 500 or status in RETRY_STATUSES:
+        return None
+    if status in (401, 403):
+        # Our API key was rejected: a server problem, and a 401 would log the user out
+        current_app.logger.error(f"TMDB rejected the API key ({status})")
+        return jsonify({"error": "TMDB rejected the request"}), 502
+    if status == 404:
+        return jsonify({"error": "Not found on TMDB"}), 404
+    return jsonify({"error": "Invalid request for TMDB"}), status
+
+def _tmdb_unavailable(retry_after=0):
+    """503 for a TMDB outage, without the upstream error text"""
+    response = jsonify({"error": "TMDB is temporarily unavailable, please try again later"})
+    response.status_code = 503
+    if retry_after:
+        response.headers["Retry-After"] = str(math.ceil(retry_after))
+    return response
+
+def _proxy_route(rule):
+    """
+    Registers a GET view that only proxies TMDB. The decorated function validates the request
+    and returns a ProxyCall (or an error response); fetching, caching and error handling are
+    shared by the Flask view and its async twin, which asgi.py serves on the event loop.
+    """
+    def decorator(build):
+        def view(**view_args):
+            if not current_app.config.get("TMDB_API_KEY"):
+                return jsonify({"error": "TMDB API key not configured"}), 500
+            call = build(**view_args)
+            if not isinstance(call, ProxyCall):
+                return call
+            try:
+                return call.response(_fetch_tmdb_json(call.route, call.path, call.params))
+            except requests.exceptions.RequestException as e:
+                return _tmdb_client_error(e) or call.unavailable(e)
+
+        @async_twin(view)
+        async def async_view(**view_args):
+            if not current_app.config.get("TMDB_API_KEY"):
+                return jsonify({"error": "TMDB API key not configured"}), 500
+            call = build(**view_args)
+            if not isinstance(call, ProxyCall):
+                return call
+            try:
+                return call.response(await _fetch_tmdb_json_async(call.route, call.path, call.params))
+            except requests.exceptions.RequestException as e:
+                return _tmdb_client_error(e) or call.unavailable(e)
+
+        view.__name__ = build.__name__
+        view.__doc__ = build.__doc__
+        tmdb_proxy_bp.add_url_rule(rule, view_func=view, methods=["GET"])
+        return view
+    return decorator
+
+@tmdb_proxy_bp.route("/cache/stats", methods=["GET"])
+@require_metrics_token
+def get_cache_stats():
+    """Hit/miss counters of the TMDB response cache for this worker"""
+    return jsonify(response_cache.stats())
+
+@_proxy_route("/config")
+def get_tmdb_config():
+    return ProxyCall("config", "/configuration", {})
+
+@_proxy_route("/popular")
+def get_popular_movies():
+    params = {
+        "language": request.args.get("language", "pt-BR"),
+        "sort_by": "popularity.desc",
+        "page": request.args.get("page", 1),
+        "include_adult": False,  # Boolean instead of string
+        "certification_country": "BR",
+        "certification.lte": "18"  # Filmes até 14 anos (sem conteúdo adulto)
+    }
+    return ProxyCall("popular", "/discover/movie", params, _rated_not_adult)
 
 @tmdb_proxy_bp.route("/movie/<int:tmdb_id>", methods=["GET"])
 def get_movie_details(tmdb_id):
@@ -69,45 +175,33 @@ def get_movie_details(tmdb_id):
         return jsonify({"error": "TMDB API key not configured"}), 500
     
     append_to_response = request.args.get("append_to_response")
-    language = request.args.get("language")
+    language = request.args.get("language") or DEFAULT_LANGUAGE
+    if not LANGUAGE_PATTERN.match(language):
+        return jsonify({"error": "Invalid language, expected a code such as pt-BR or en-US"}), 400
     try:
-        # Se language for diferente de pt-BR, busca direto da TMDB e retorna (não usa banco)
-        if language and language != "pt-BR":
-            url = f"{TMDB_BASE_URL}/movie/{tmdb_id}?api_key={TMDB_API_KEY}&language={language}"
-            if append_to_response:
-                url += f"&append_to_response={append_to_response}"
-            tmdb_response = requests.get(url)
-            if tmdb_response.status_code == 200:
-                return jsonify(tmdb_response.json())
-            else:
-                return jsonify({"error": f"Could not fetch movie from TMDB: {tmdb_response.text}"}), 404
-
-        # Caso padrão: usa banco local e só busca extras da TMDB se solicitado
+        # Usa o banco local para qualquer idioma e só busca da TMDB o que ainda não estiver salvo
         movie_object = _save_movie_details_if_not_exist(tmdb_id)
         if movie_object:
-            movie_dict = {
-                "id": movie_object.tmdb_id,
-                "title": movie_object.title,
-                "overview": movie_object.overview,
-                "poster_path": movie_object.poster_path,
-                "release_date": movie_object.release_date.isoformat() if movie_object.release_date else None,
-                "vote_average": movie_object.rating,
-                "genres": movie_object.genres,
-                "runtime": getattr(movie_object, "runtime", None)
-            }
+            translation = None
+            if language != DEFAULT_LANGUAGE:
+                translation = _save_movie_translation_if_not_exist(tmdb_id, language)
+                if translation is None:
+                    current_app.logger.warning(f"Could not fetch {language} details for TMDB ID {tmdb_id}, serving {DEFAULT_LANGUAGE}")
+            # Serve the stored rows right away; outdated rows are refreshed in the background
+            if movie_refresher.is_stale(movie_object) or (translation and movie_refresher.is_stale(translation)):
+                movie_refresher.enqueue(tmdb_id)
+            extras = {}
             if append_to_response:
-                url = f"{TMDB_BASE_URL}/movie/{tmdb_id}?api_key={TMDB_API_KEY}&language=pt-BR&append_to_response={append_to_response}"
-                tmdb_response = requests.get(url)
-                if tmdb_response.status_code == 200:
-                    tmdb_data = tmdb_response.json()
-                    if "runtime" in tmdb_data:
-                        movie_dict["runtime"] = tmdb_data["runtime"]
-                    for key in append_to_response.split(","):
-                        if key in tmdb_data:
-                            movie_dict[key] = tmdb_data[key]
-                else:
-                    current_app.logger.warning(f"Could not fetch append_to_response for TMDB ID {tmdb_id}: {tmdb_response.text}")
+                sections = [section.strip() for section in append_to_response.split(",") if section.strip()]
+                try:
+                    extras = _get_movie_extras(movie_object, sections, language)
+                except requests.exceptions.RequestException as e:
+                    current_app.logger.warning(f"Could not fetch append_to_response for TMDB ID {tmdb_id}: {str(e)}")
+            movie_dict = _movie_to_dict(movie_object, translation)
+            movie_dict.update(extras)
             return jsonify(movie_dict)
+        elif tmdb.breaker.state == tmdb.breaker.OPEN:
+            return _tmdb_unavailable(tmdb.breaker.retry_after())
         else:
             return jsonify({"error": f"Movie with TMDB ID {tmdb_id} not found or could not be retrieved."}), 404
         
@@ -115,158 +209,106 @@ def get_movie_details(tmdb_id):
         current_app.logger.error(f"Unexpected error in get_movie_details for TMDB ID {tmdb_id}: {str(e)}")
         return jsonify({"error": "An unexpected server error occurred"}), 500
 
-@tmdb_proxy_bp.route("/search", methods=["GET"])
-def search_movies():
+@tmdb_proxy_bp.route("/movies/batch", methods=["POST"])
+def get_movies_details_batch():
+    """Details for many movies in a single call, instead of one /movie/<id> request per entry"""
     TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
     if not TMDB_API_KEY:
         return jsonify({"error": "TMDB API key not configured"}), 500
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    language = data.get("language") or DEFAULT_LANGUAGE
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "ids must be a non-empty list of TMDB IDs"}), 400
+    try:
+        tmdb_ids = list(dict.fromkeys(int(tmdb_id) for tmdb_id in ids))
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be a non-empty list of TMDB IDs"}), 400
+    if len(tmdb_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} IDs can be requested at once"}), 400
+    if not isinstance(language, str) or not LANGUAGE_PATTERN.match(language):
+        return jsonify({"error": "Invalid language, expected a code such as pt-BR or en-US"}), 400
+
+    try:
+        stored = _save_movies_details_if_not_exist(tmdb_ids)
+        translations = {}
+        if language != DEFAULT_LANGUAGE:
+            translations = _save_movie_translations_if_not_exist(list(stored), language)
+        movies = {}
+        for tmdb_id, movie in stored.items():
+            translation = translations.get(tmdb_id)
+            if movie_refresher.is_stale(movie) or (translation and movie_refresher.is_stale(translation)):
+                movie_refresher.enqueue(tmdb_id)
+            movies[tmdb_id] = _movie_to_dict(movie, translation)
+        return jsonify({
+            "movies": [movies[tmdb_id] for tmdb_id in tmdb_ids if tmdb_id in movies],
+            "missing": [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in movies]
+        })
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error in get_movies_details_batch: {str(e)}")
+        return jsonify({"error": "An unexpected server error occurred"}), 500
+
+@_proxy_route("/search")
+def search_movies():
+    """
+    First page answered from the local search index when it has enough matches; otherwise
+    (and for deeper pages) TMDB results are merged after the local ones, without duplicates.
+    """
     query = request.args.get("query")
-    page = request.args.get("page", 1)
-    language = request.args.get("language", "pt-BR")
     if not query:
         return jsonify({"error": "Search query is required"}), 400
-    try:
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": language,
-            "query": query,
-            "page": page,
-            "include_adult": False
-        }
-        response = requests.get(f"{TMDB_BASE_URL}/search/movie", params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Filtragem manual adicional como backup
-        if "results" in data:
-            filtered_results = []
-            for movie in data["results"]:
-                if movie.get("adult", False) == False:
-                    filtered_results.append(movie)
-            
-            data["results"] = filtered_results
-            data["total_results"] = len(filtered_results)
-        
-        return jsonify(data)
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    params = {
+        "language": request.args.get("language", "pt-BR"),
+        "query": query,
+        "page": request.args.get("page", 1),
+        "include_adult": False
+    }
+    local = None
+    if str(params["page"]) == "1" and LANGUAGE_PATTERN.match(params["language"]):
+        hits = search_index.search(query, params["language"], SEARCH_PAGE_SIZE)
+        if hits is not None:
+            local = [movie for movie in hits.results if _not_adult(movie)]
+            if len(local) >= current_app.config.get("SEARCH_LOCAL_MIN_RESULTS", 10):
+                return jsonify({
+                    "page": 1, "results": local, "total_results": hits.total,
+                    "total_pages": -(-hits.total // SEARCH_PAGE_SIZE), "source": "local"
+                })
+    return ProxyCall("search", "/search/movie", params, _not_adult, local)
 
-@tmdb_proxy_bp.route("/movie/<int:tmdb_id>/credits", methods=["GET"])
+@_proxy_route("/movie/<int:tmdb_id>/credits")
 def get_movie_credits(tmdb_id):
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{tmdb_id}/credits?api_key={TMDB_API_KEY}&language=pt-BR"
-        )
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    return ProxyCall("credits", f"/movie/{tmdb_id}/credits", {"language": "pt-BR"})
 
-@tmdb_proxy_bp.route("/movie/<int:tmdb_id>/recommendations", methods=["GET"])
+@_proxy_route("/movie/<int:tmdb_id>/recommendations")
 def get_movie_recommendations(tmdb_id):
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    page = request.args.get("page", 1)
-    language = request.args.get("language", "pt-BR")
-    try:
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": language,
-            "page": page,
-            "include_adult": False
-        }
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{tmdb_id}/recommendations", params=params
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        # Filtragem manual adicional como backup
-        if "results" in data:
-            filtered_results = []
-            for movie in data["results"]:
-                if movie.get("adult", False) == False:
-                    filtered_results.append(movie)
-            
-            data["results"] = filtered_results
-            data["total_results"] = len(filtered_results)
-        
-        return jsonify(data)
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    params = {
+        "language": request.args.get("language", "pt-BR"),
+        "page": request.args.get("page", 1),
+        "include_adult": False
+    }
+    return ProxyCall("recommendations", f"/movie/{tmdb_id}/recommendations", params, _not_adult)
 
-@tmdb_proxy_bp.route("/genres", methods=["GET"])
+@_proxy_route("/genres")
 def get_movie_genres_legacy():
     """Original endpoint for movie genres, kept for backwards compatibility"""
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/genre/movie/list?api_key={TMDB_API_KEY}&language=pt-BR"
-        )
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    return ProxyCall("genres", "/genre/movie/list", {"language": "pt-BR"})
 
-@tmdb_proxy_bp.route("/movie/genres", methods=["GET"])
+@_proxy_route("/movie/genres")
 def get_movie_genres():
     """New endpoint for movie genres to match frontend expectation"""
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    language = request.args.get("language", "pt-BR")
-    try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/genre/movie/list?api_key={TMDB_API_KEY}&language={language}"
-        )
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    return ProxyCall("genres", "/genre/movie/list", {"language": request.args.get("language", "pt-BR")})
 
-@tmdb_proxy_bp.route("/discover/movie", methods=["GET"])
+@_proxy_route("/discover/movie")
 def discover_movies():
     """Endpoint to discover movies by genre, matching the endpoint called from the frontend"""
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    if not TMDB_API_KEY:
-        return jsonify({"error": "TMDB API key not configured"}), 500
-    
-    # Get parameters from request
     genre_id = request.args.get("with_genres")
-    page = request.args.get("page", 1)
-    language = request.args.get("language", "pt-BR")
-    
     if not genre_id:
         return jsonify({"error": "Genre ID (with_genres) is required"}), 400
-    
-    try:
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": language,
-            "with_genres": genre_id,
-            "page": page,
-            "include_adult": False
-        }
-        response = requests.get(f"{TMDB_BASE_URL}/discover/movie", params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Filtragem manual adicional como backup
-        if "results" in data:
-            filtered_results = []
-            for movie in data["results"]:
-                if movie.get("adult", False) == False:
-                    filtered_results.append(movie)
-            
-            data["results"] = filtered_results
-            data["total_results"] = len(filtered_results)
-        
-        return jsonify(data)
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+    params = {
+        "language": request.args.get("language", "pt-BR"),
+        "with_genres": genre_id,
+        "page": request.args.get("page", 1),
+        "include_adult": False
+    }
+    return ProxyCall("discover", "/discover/movie", params, _not_adult)
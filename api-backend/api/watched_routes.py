@@ -1,5 +1,8 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from sqlalchemy import and_, or_
 import datetime
+import io
+import json
 import os
 import sys
 
@@ -7,7 +10,9 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from extensions import db
 from models import List, Watched, MovieList
-from utils import _save_movie_details_if_not_exist, _get_tmdb_movie_details_internal, require_user_match
+from utils import _insert_ignore, _keyset_page, _page_args, _save_movie_details_if_not_exist, require_user_match
+from watched_io import FORMATS, export_watched, guess_format, import_watched, read_records
+from watched_stats import apply_changes, counted_fields, get_stats, movie_fields
 
 watched_bp = Blueprint('watched', __name__, url_prefix='/movie/watched')
 
@@ -31,25 +36,32 @@ def add_watched_movie(auth_user_id):
     except ValueError:
         return jsonify({"msg": "Invalid date format for watched_at. Use YYYY-MM-DD."}), 400
 
-    existing_watched = Watched.query.filter_by(user_id=auth_user_id, tmdb_id=tmdb_id).first()
-    if existing_watched:
-        existing_watched.watched_at = watched_at_dt
-        db.session.commit()
-        watched_obj = existing_watched
-        msg = "Data de assistido atualizada com sucesso"
-    else:
-        watched_obj = Watched(user_id=auth_user_id, tmdb_id=tmdb_id, watched_at=watched_at_dt)
-        db.session.add(watched_obj)
-        db.session.commit()
+    # Upsert: insert, or update the date when the unique (user_id, tmdb_id) row already exists
+    fields = movie_fields(local_movie)
+    row = {"user_id": auth_user_id, "tmdb_id": tmdb_id, "watched_at": watched_at_dt, **fields}
+    inserted = _insert_ignore(Watched, [row])
+    previous = None if inserted else Watched.query.filter_by(user_id=auth_user_id, tmdb_id=tmdb_id).first()
+    if not inserted and previous is None:
+        # Deleted by a concurrent request between the insert and the read: insert it again
+        inserted = _insert_ignore(Watched, [row])
+        if not inserted:
+            return jsonify({"msg": "The watched entry changed concurrently, please try again"}), 409
+    if inserted:
+        apply_changes(auth_user_id, added=[(watched_at_dt, fields)])
         msg = "Filme adicionado com sucesso"
+    else:
+        previous_watched_at, fields = previous.watched_at, counted_fields(previous)
+        previous.watched_at = watched_at_dt
+        # Only the month bucket can change; apply_changes skips the buckets that cancel out
+        apply_changes(auth_user_id, added=[(watched_at_dt, fields)], removed=[(previous_watched_at, fields)])
+        msg = "Data de assistido atualizada com sucesso"
 
     # Adiciona também na lista "Assistidos"
     assistidos_list = List.query.filter_by(user_id=auth_user_id, is_main=True, name="Assistidos").first()
     if assistidos_list:
-        exists = MovieList.query.filter_by(list_id=assistidos_list.id, tmdb_id=tmdb_id).first()
-        if not exists:
-            db.session.add(MovieList(list_id=assistidos_list.id, tmdb_id=tmdb_id))
-            db.session.commit()
+        _insert_ignore(MovieList, [{"list_id": assistidos_list.id, "tmdb_id": tmdb_id}])
+    db.session.commit()
+    watched_obj = Watched.query.filter_by(user_id=auth_user_id, tmdb_id=tmdb_id).first()
 
     return jsonify({
         "id": watched_obj.id,
@@ -57,13 +69,30 @@ def add_watched_movie(auth_user_id):
         "tmdb_id": watched_obj.tmdb_id,
         "watched_at": watched_obj.watched_at.date().isoformat(),
         "msg": msg
-    }), 200 if existing_watched else 201
+    }), 201 if inserted else 200
 
 @watched_bp.route("/", methods=["GET"])
 @require_user_match
 def get_watched_movies(auth_user_id):
-    watched_records = Watched.query.filter_by(user_id=auth_user_id).order_by(Watched.watched_at.desc()).all()
-    
+    limit, cursor, error = _page_args()
+    if error:
+        return jsonify({"msg": error}), 400
+
+    # Newest first; id breaks ties between movies watched on the same date. Only the needed
+    # columns are selected, served by the (user_id, watched_at) index.
+    query = db.session.query(Watched.id, Watched.tmdb_id, Watched.watched_at).filter(Watched.user_id == auth_user_id)
+    if cursor is not None:
+        try:
+            last_watched_at, last_id = datetime.datetime.fromisoformat(cursor[0]), int(cursor[1])
+        except (ValueError, TypeError, IndexError):
+            return jsonify({"msg": "Invalid cursor"}), 400
+        query = query.filter(or_(
+            Watched.watched_at < last_watched_at,
+            and_(Watched.watched_at == last_watched_at, Watched.id < last_id),
+        ))
+    query = query.order_by(Watched.watched_at.desc(), Watched.id.desc())
+    watched_records, next_cursor = _keyset_page(query, limit, lambda w: [w.watched_at.isoformat(), w.id])
+
     # Return a simpler list of watched movies: tmdb_id and watched_at
     # This avoids making N calls to TMDB for movie details.
     simple_watched_movies = []
@@ -73,7 +102,7 @@ def get_watched_movies(auth_user_id):
             "watched_at": w.watched_at.date().isoformat() 
         })
             
-    return jsonify({"user_id": auth_user_id, "watched": simple_watched_movies}), 200
+    return jsonify({"user_id": auth_user_id, "watched": simple_watched_movies, "next_cursor": next_cursor}), 200
 
 @watched_bp.route("/<int:tmdb_id>", methods=["DELETE"])
 @require_user_match
@@ -81,10 +110,17 @@ def delete_watched_movie(auth_user_id, tmdb_id):
     watched_record = Watched.query.filter_by(user_id=auth_user_id, tmdb_id=tmdb_id).first()
     if not watched_record:
         return jsonify({"msg": "Watched record not found"}), 404
+    apply_changes(auth_user_id, removed=[(watched_record.watched_at, counted_fields(watched_record))])
     db.session.delete(watched_record)
     db.session.commit()
     return jsonify({"msg": "Watched record deleted"}), 200
 
+@watched_bp.route("/stats", methods=["GET"])
+@require_user_match
+def get_watched_stats(auth_user_id):
+    # Counts by month, release year and genre plus average rating, read from WatchedSummary
+    return jsonify(get_stats(auth_user_id)), 200
+
 @watched_bp.route("/count", methods=["GET"])
 @require_user_match
 def get_watched_count(auth_user_id):
@@ -105,3 +141,41 @@ def get_watched_count(auth_user_id):
         
     count = query.count()
     return jsonify({"user_id": auth_user_id, "count": count}), 200
+
+@watched_bp.route("/import", methods=["POST"])
+@require_user_match
+def import_watched_movies(auth_user_id):
+    # Accepts a multipart "file" upload or the raw request body (CSV or JSON)
+    upload = request.files.get("file")
+    fmt = request.args.get("format") or guess_format(upload.filename if upload else None, request.mimetype)
+    if fmt not in FORMATS:
+        return jsonify({"msg": "Unknown file format, use ?format=csv or ?format=json"}), 400
+    stream = request.stream
+    if upload:
+        # Flask closes request.files as soon as the view returns, before the response below
+        # is streamed, so take over the spooled upload and close it when the import ends.
+        stream, upload.stream = upload.stream, io.BytesIO()
+    records = read_records(stream, fmt)
+
+    def generate():
+        # One NDJSON progress line per imported chunk
+        try:
+            for progress in import_watched(auth_user_id, records):
+                yield json.dumps(progress) + "\n"
+        finally:
+            if upload:
+                stream.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@watched_bp.route("/export", methods=["GET"])
+@require_user_match
+def export_watched_movies(auth_user_id):
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"msg": "Invalid format, use csv or json"}), 400
+    return Response(
+        stream_with_context(export_watched(auth_user_id, fmt)),
+        mimetype="text/csv" if fmt == "csv" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="watched.{fmt}"'}
+    )
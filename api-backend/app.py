@@ -1,10 +1,12 @@
 import os
-from flask import Flask, jsonify, abort
+from flask import Flask, Response, abort, request
 from flask_swagger_ui import get_swaggerui_blueprint
 import yaml
 
 # Import extensions and Blueprints - using absolute imports from current directory
-from extensions import db, cors, mail
+from extensions import db, cors, mail, response_cache, tmdb, tmdb_async, movie_refresher, auth_tokens, mail_outbox, tmdb_health, openapi_spec, search_index, metrics
+from cache import parse_ttls
+from db_pool import engine_options
 
 def create_app(config_name=None):
     app = Flask(__name__)
@@ -15,9 +17,38 @@ def create_app(config_name=None):
     if not default_db_url:
         default_db_url = 'sqlite:///instance/meus_filmes.db'
     app.config['SQLALCHEMY_DATABASE_URI'] = default_db_url
+    # Connection pool per process (see db_pool.py); pre-ping replaces connections MySQL closed while idle
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'True').lower() in ['true', '1', 'yes']
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(default_db_url, app.config)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(24))
     app.config['TMDB_API_KEY'] = os.environ.get("TMDB_API_KEY")
     app.config['TMDB_BASE_URL'] = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+    app.config['TMDB_MAX_CONCURRENCY'] = int(os.environ.get("TMDB_MAX_CONCURRENCY", 8))  # Parallel TMDB calls for bulk fetches
+    app.config['TMDB_CONNECT_TIMEOUT'] = float(os.environ.get("TMDB_CONNECT_TIMEOUT", 3.05))
+    app.config['TMDB_READ_TIMEOUT'] = float(os.environ.get("TMDB_READ_TIMEOUT", 10))
+    app.config['TMDB_MAX_RETRIES'] = int(os.environ.get("TMDB_MAX_RETRIES", 2))  # Retries on 429/5xx and network errors
+    app.config['TMDB_BACKOFF_BASE'] = float(os.environ.get("TMDB_BACKOFF_BASE", 0.5))
+    app.config['TMDB_BACKOFF_MAX'] = float(os.environ.get("TMDB_BACKOFF_MAX", 8))
+    app.config['TMDB_POOL_SIZE'] = int(os.environ.get("TMDB_POOL_SIZE", 10))  # Keep-alive connections per worker
+    app.config['TMDB_ASYNC_MAX_CONNECTIONS'] = int(os.environ.get("TMDB_ASYNC_MAX_CONNECTIONS", 100))  # ASGI mode (asgi.py)
+    # Circuit breaker (see tmdb_client.py): opens when TMDB_BREAKER_ERROR_RATE of the calls of the last
+    # TMDB_BREAKER_WINDOW seconds failed or took TMDB_BREAKER_SLOW_CALL seconds, then fails fast for
+    # TMDB_BREAKER_OPEN_SECONDS; proxy routes answer from the expired cache entries meanwhile
+    app.config['TMDB_BREAKER_ENABLED'] = os.environ.get("TMDB_BREAKER_ENABLED", "True").lower() in ['true', '1', 'yes']
+    app.config['TMDB_BREAKER_WINDOW'] = float(os.environ.get("TMDB_BREAKER_WINDOW", 30))
+    app.config['TMDB_BREAKER_MIN_CALLS'] = int(os.environ.get("TMDB_BREAKER_MIN_CALLS", 10))
+    app.config['TMDB_BREAKER_ERROR_RATE'] = float(os.environ.get("TMDB_BREAKER_ERROR_RATE", 0.5))
+    app.config['TMDB_BREAKER_SLOW_CALL'] = float(os.environ.get("TMDB_BREAKER_SLOW_CALL", 5))
+    app.config['TMDB_BREAKER_OPEN_SECONDS'] = float(os.environ.get("TMDB_BREAKER_OPEN_SECONDS", 30))
+    app.config['TMDB_BREAKER_HALF_OPEN_CALLS'] = int(os.environ.get("TMDB_BREAKER_HALF_OPEN_CALLS", 2))  # Probes that must succeed to close it
+
+    # Stored movies older than this are served as-is and refreshed from TMDB in the background
+    app.config['MOVIE_MAX_AGE_HOURS'] = float(os.environ.get("MOVIE_MAX_AGE_HOURS", 72))
+    app.config['MOVIE_REFRESH_ENABLED'] = os.environ.get("MOVIE_REFRESH_ENABLED", "True").lower() in ['true', '1', 'yes']
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -29,9 +60,60 @@ def create_app(config_name=None):
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
     app.config['MAIL_TIMEOUT'] = int(os.environ.get('MAIL_TIMEOUT', 30))
     app.config['MAIL_MAX_EMAILS'] = int(os.environ.get('MAIL_MAX_EMAILS', 50))
+    # Outgoing mail is queued in the mail_outbox table and sent by a background thread
+    app.config['MAIL_OUTBOX_ENABLED'] = os.environ.get('MAIL_OUTBOX_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    app.config['MAIL_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+    app.config['MAIL_BACKOFF_BASE'] = float(os.environ.get('MAIL_BACKOFF_BASE', 30))
+    app.config['MAIL_BACKOFF_MAX'] = float(os.environ.get('MAIL_BACKOFF_MAX', 3600))
+    app.config['MAIL_OUTBOX_POLL_INTERVAL'] = float(os.environ.get('MAIL_OUTBOX_POLL_INTERVAL', 30))
+    # Rows claimed by a worker that died mid-send are retried after this many seconds
+    app.config['MAIL_CLAIM_TIMEOUT'] = float(os.environ.get('MAIL_CLAIM_TIMEOUT', 600))
+    # Sent and failed rows are deleted after this many days (their bodies are cleared right away)
+    app.config['MAIL_OUTBOX_RETENTION_DAYS'] = float(os.environ.get('MAIL_OUTBOX_RETENTION_DAYS', 7))
 
     app.config['FRONTEND_URL'] = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
 
+    # Create/upgrade the schema when the app is created; gunicorn.conf.py disables this and
+    # runs the migrations once in the master process instead of in every worker
+    app.config['DB_AUTO_MIGRATE'] = os.environ.get('DB_AUTO_MIGRATE', 'True').lower() in ['true', '1', 'yes']
+
+    # Verified bearer tokens are cached per worker until they expire; token_version changes
+    # (password reset) reach the other workers within AUTH_TOKEN_VERSION_TTL seconds
+    app.config['AUTH_TOKEN_CACHE_SIZE'] = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+    app.config['AUTH_CHECK_TOKEN_VERSION'] = os.environ.get('AUTH_CHECK_TOKEN_VERSION', 'True').lower() in ['true', '1', 'yes']
+    app.config['AUTH_TOKEN_VERSION_TTL'] = float(os.environ.get('AUTH_TOKEN_VERSION_TTL', 30))
+
+    # TMDB response cache: 'memory' (per worker), 'sqlite' (shared between workers) or 'none'
+    app.config['TMDB_CACHE_BACKEND'] = os.environ.get('TMDB_CACHE_BACKEND', 'memory')
+    app.config['TMDB_CACHE_PATH'] = os.environ.get('TMDB_CACHE_PATH')
+    app.config['TMDB_CACHE_MAX_ENTRIES'] = int(os.environ.get('TMDB_CACHE_MAX_ENTRIES', 2048))
+    app.config['TMDB_CACHE_TTLS'] = parse_ttls(os.environ.get('TMDB_CACHE_TTLS'))  # e.g. "popular=1800,search=300"
+    app.config['TMDB_CACHE_STALE_TTL'] = int(os.environ.get('TMDB_CACHE_STALE_TTL', 7 * 24 * 3600))  # Expired entries kept for TMDB outages
+
+    # /tmdb/search answers from an in-memory index of the stored catalog (see search_index.py) when
+    # it finds SEARCH_LOCAL_MIN_RESULTS matches, and only asks TMDB otherwise
+    app.config['SEARCH_INDEX_ENABLED'] = os.environ.get('SEARCH_INDEX_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    app.config['SEARCH_INDEX_REFRESH_INTERVAL'] = float(os.environ.get('SEARCH_INDEX_REFRESH_INTERVAL', 300))
+    app.config['SEARCH_LOCAL_MIN_RESULTS'] = int(os.environ.get('SEARCH_LOCAL_MIN_RESULTS', 10))
+    # Only these languages get an index (each one is kept in memory); others always go to TMDB
+    app.config['SEARCH_INDEX_LANGUAGES'] = [
+        language.strip() for language in os.environ.get('SEARCH_INDEX_LANGUAGES', 'pt-BR,en-US').split(',') if language.strip()
+    ]
+
+    # /api/health/ready reports TMDB from a background check made every HEALTH_TMDB_INTERVAL seconds
+    app.config['HEALTH_TMDB_INTERVAL'] = float(os.environ.get('HEALTH_TMDB_INTERVAL', 60))
+
+    # Resolved spec written by `flask build-openapi`, used while newer than openapi.yaml/docs/*.yaml
+    app.config['OPENAPI_SPEC_ARTIFACT'] = os.environ.get('OPENAPI_SPEC_ARTIFACT')
+    app.config['OPENAPI_SPEC_MAX_AGE'] = int(os.environ.get('OPENAPI_SPEC_MAX_AGE', 300))
+
+    # Prometheus metrics at /metrics (see metrics.py). With several gunicorn workers each one writes
+    # its values to METRICS_DIR and /metrics adds them up; METRICS_TOKEN requires "Bearer <token>"
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
     if not app.config['TMDB_API_KEY']:
         print("ALERT: TMDB_API_KEY is not configured in .env file!")
 
@@ -39,6 +121,16 @@ def create_app(config_name=None):
     mail.init_app(app)
     
     db.init_app(app)
+    response_cache.init_app(app)
+    tmdb.init_app(app)
+    tmdb_async.init_app(app)
+    movie_refresher.init_app(app)
+    auth_tokens.init_app(app)
+    mail_outbox.init_app(app)
+    tmdb_health.init_app(app)
+    openapi_spec.init_app(app)
+    search_index.init_app(app)
+    metrics.init_app(app)
     origins = ["http://localhost:5173", os.environ.get('FRONTEND_URL')]
     origins = [o for o in origins if o is not None]  # Filter out None values
     cors.init_app(app, origins=origins, supports_credentials=True)
@@ -60,34 +152,34 @@ def create_app(config_name=None):
     from api import api_v1_bp, register_blueprints
     app.register_blueprint(register_blueprints(api_v1_bp))
 
-    # Create database tables if they don't exist
-    with app.app_context():
-        try:
-            db.create_all()
-            print("Database tables created successfully")
-        except Exception as e:
-            print(f"Warning: Could not create database tables: {e}")
-            print("Continuing without database initialization...")
+    # CLI commands (python -m flask --app app <command>)
+    from warmer import warm_catalog_command
+    app.cli.add_command(warm_catalog_command)
+    from watched_stats import rebuild_watched_stats_command
+    app.cli.add_command(rebuild_watched_stats_command)
+    from watched_io import export_watched_command, import_watched_command
+    app.cli.add_command(import_watched_command)
+    app.cli.add_command(export_watched_command)
+    from outbox import send_mail_command
+    app.cli.add_command(send_mail_command)
+    from migrations import upgrade_db_command
+    app.cli.add_command(upgrade_db_command)
+    from openapi_spec import build_openapi_command
+    app.cli.add_command(build_openapi_command)
+    from recommender import rebuild_recommendations_command
+    app.cli.add_command(rebuild_recommendations_command)
+
+    # Create database tables if they don't exist and apply pending schema changes
+    if app.config['DB_AUTO_MIGRATE']:
+        upgrade_database(app)
 
-    # Serve openapi.yaml content as JSON from a dedicated route
+    # Serve openapi.yaml content as JSON from a dedicated route, resolved once (see openapi_spec.py)
     @app.route(API_SPEC_ROUTE)
     def serve_openapi_spec():
         try:
-            # Try to use prance to resolve $ref references
-            try:
-                from prance import ResolvingParser
-                spec_path = os.path.join(app.root_path, 'openapi.yaml')
-                parser = ResolvingParser(spec_path)
-                return jsonify(parser.specification)
-            except ImportError:
-                # Fallback to simple YAML loading if prance is not available
-                app.logger.warning("prance not available, serving OpenAPI spec without $ref resolution")
-                spec_path = os.path.join(app.root_path, 'openapi.yaml')
-                with open(spec_path, 'r', encoding='utf-8') as f:
-                    content = yaml.safe_load(f)
-                return jsonify(content)
-        except FileNotFoundError:
-            app.logger.error(f"OpenAPI specification file not found at {spec_path}")
+            return openapi_spec.response(request)
+        except FileNotFoundError as e:
+            app.logger.error(f"OpenAPI specification file not found: {e}")
             abort(404, description="OpenAPI specification file not found.")
         except yaml.YAMLError as e:
             app.logger.error(f"Error parsing OpenAPI specification: {e}")
@@ -95,7 +187,27 @@ def create_app(config_name=None):
         except Exception as e:
             app.logger.error(f"Error serving OpenAPI spec: {e}")
             abort(500, description="Could not load or parse OpenAPI specification.")
+
+    @app.route('/metrics')
+    def serve_metrics():
+        if not metrics.enabled:
+            abort(404)
+        if not metrics.authorized(request):
+            abort(401)
+        return Response(metrics.render(), content_type=metrics.content_type)
     return app
+
+def upgrade_database(app):
+    """Runs the schema migrations, logging instead of failing when the database is unreachable."""
+    with app.app_context():
+        try:
+            from migrations import upgrade
+            upgrade()
+            print("Database tables created successfully")
+        except Exception as e:
+            print(f"Warning: Could not create database tables: {e}")
+            print("Continuing without database initialization...")
+
 # Entry point for running the app with 'flask run' or a WSGI server
 # The 'app' instance is created by Flask CLI by calling create_app()
 # For development with 'python app.py':
@@ -0,0 +1,21 @@
+"""
+ASGI entry point: an alternative serving mode for the I/O-bound TMDB proxy routes.
+
+    pip install -e .[async]
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+The /api/tmdb proxy routes run as coroutines with the aiohttp based
+AsyncTMDBClient, so hundreds of upstream calls can wait on TMDB concurrently in a single
+process instead of each one holding a worker. Every other request goes to the regular Flask
+app on a pool of ASGI_WSGI_THREADS threads (see async_proxy.py).
+"""
+import os
+import sys
+
+# Ensure the current directory is in the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from async_proxy import AsyncProxyApp
+
+app = AsyncProxyApp(create_app(), wsgi_threads=int(os.environ.get("ASGI_WSGI_THREADS", 10)))
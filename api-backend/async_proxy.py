@@ -0,0 +1,102 @@
+"""
+ASGI adapter for the Flask app (see asgi.py).
+
+Requests whose Flask view has an async twin (``api.ASYNC_VIEWS``) run as coroutines on the
+event loop, still inside the Flask app's request context with its before_request/after_request
+hooks (CORS) and error handlers. Every other request is handed to the WSGI app, which runs on
+a thread pool.
+"""
+import io
+import sys
+
+from a2wsgi import WSGIMiddleware
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from api import ASYNC_VIEWS
+from extensions import tmdb_async
+
+
+def _environ(scope):
+    """Minimal WSGI environ for an ASGI HTTP scope without a request body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        key = name.upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsyncProxyApp:
+    """ASGI app serving the async twins natively and delegating the rest to ``flask_app``."""
+
+    def __init__(self, flask_app, wsgi_threads=10):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_threads)
+
+    def async_view(self, scope):
+        """The async twin of the view matching ``scope``, or None to delegate to WSGI."""
+        urls = self.flask_app.url_map.bind("", script_name=scope.get("root_path") or None)
+        try:
+            endpoint, _ = urls.match(scope["path"], scope["method"])
+        except HTTPException:  # 404, 405 and redirects are left to Flask
+            return None
+        return ASYNC_VIEWS.get(self.flask_app.view_functions.get(endpoint))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        view = self.async_view(scope) if scope["type"] == "http" else None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        # Same steps as Flask.full_dispatch_request, awaiting the view
+        app = self.flask_app
+        with app.request_context(_environ(scope)):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+            body = b"" if scope["method"] == "HEAD" else response.get_data()
+            headers = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()
+            ]
+            response.close()
+
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await tmdb_async.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
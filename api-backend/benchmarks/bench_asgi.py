@@ -0,0 +1,146 @@
+"""
+Throughput of the TMDB proxy routes: WSGI (gunicorn) vs ASGI (asgi.py).
+
+Starts the TMDB stub with a fixed latency in its own process, then each server mode in turn,
+and fires ``--requests`` GET /api/tmdb/search calls with ``--concurrency`` in flight. Every
+query is distinct and the response cache is disabled, so each request waits on the stub.
+
+    pip install -e .[async]
+    python -m benchmarks.bench_asgi --concurrency 200 --requests 2000 --latency 0.2
+    python -m benchmarks.bench_asgi --modes wsgi --wsgi-workers 4 --wsgi-worker-class gthread --wsgi-threads 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=5)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def server_command(mode, port, args):
+    if mode == "wsgi":
+        return [
+            sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--workers", str(args.wsgi_workers),
+            "--worker-class", args.wsgi_worker_class, "--threads", str(args.wsgi_threads),
+            "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+            "wsgi:app",
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ]
+
+
+async def load(base_url, total, concurrency):
+    """Returns (elapsed seconds, sorted latencies of successful requests, error count)."""
+    latencies, errors = [], 0
+    queue = iter(range(total))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async def worker():
+            nonlocal errors
+            for i in queue:
+                started = time.perf_counter()
+                try:
+                    async with session.get("/api/tmdb/search", params={"query": f"filme {i}"}) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, sorted(latencies), errors
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="wsgi,asgi", help="Comma separated: wsgi, asgi")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="TMDB stub latency in seconds")
+    parser.add_argument("--wsgi-workers", type=int, default=1, help="gunicorn workers in WSGI mode")
+    parser.add_argument("--wsgi-worker-class", default="sync", help="gunicorn worker class in WSGI mode")
+    parser.add_argument("--wsgi-threads", type=int, default=1, help="threads per gthread worker in WSGI mode")
+    args = parser.parse_args()
+
+    stub_port = _free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.tmdb_stub", "--port", str(stub_port), "--latency", str(args.latency)],
+        cwd=ROOT, stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(f"http://127.0.0.1:{stub_port}/3/configuration", stub)
+        print(f"{args.requests} requests, {args.concurrency} in flight, TMDB latency {args.latency * 1000:.0f} ms")
+        for mode in args.modes.split(","):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    TMDB_BASE_URL=f"http://127.0.0.1:{stub_port}/3",
+                    TMDB_API_KEY="benchmark",
+                    TMDB_CACHE_BACKEND="none",
+                    DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                    MOVIE_REFRESH_ENABLED="false",
+                    MAIL_OUTBOX_ENABLED="false",
+                )
+                port = _free_port()
+                server = subprocess.Popen(
+                    server_command(mode, port, args), cwd=ROOT, env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    _wait_until_up(f"{base_url}/api/tmdb/config", server)
+                    elapsed, latencies, errors = asyncio.run(load(base_url, args.requests, args.concurrency))
+                finally:
+                    server.terminate()
+                    server.wait()
+            print(
+                f"  {mode:<5}{args.requests / elapsed:>9.1f} req/s"
+                f"   p50 {_percentile(latencies, 0.5) * 1000:>7.0f} ms"
+                f"   p95 {_percentile(latencies, 0.95) * 1000:>7.0f} ms"
+                f"   p99 {_percentile(latencies, 0.99) * 1000:>7.0f} ms"
+                f"   errors {errors}"
+            )
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-request cost of bearer token authentication.
+
+Calls a trivial view protected by ``require_user_match`` inside a request context and
+reports the time per call for:
+
+* decode - HMAC-verify and decode the JWT on every request (no revocation possible)
+* decode + user lookup - the same plus a token_version query per request
+* cached - verified-token LRU plus the TTL-cached token_version (the default)
+
+    python -m benchmarks.bench_auth --requests 20000
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-enough-bytes")
+
+        from app import create_app
+        from extensions import auth_tokens, db
+        from models import User
+        from token_auth import TokenCache
+        from utils import require_user_match
+
+        app = create_app()
+        with app.app_context():
+            user = User(name="bench", email="bench@example.com", password="x")
+            db.session.add(user)
+            db.session.commit()
+            token = auth_tokens.issue(user, datetime.timedelta(hours=1))
+
+        @require_user_match
+        def view(auth_user_id):
+            return auth_user_id
+
+        def measure():
+            with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+                view()  # warm up caches and the connection pool
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    view()
+                elapsed = time.perf_counter() - started
+                db.session.remove()
+            return elapsed / args.requests * 1e6
+
+        scenarios = (
+            ("decode", TokenCache(0), False, 0),
+            ("decode + user lookup", TokenCache(0), True, 0),
+            ("cached", TokenCache(10000), True, 30),
+        )
+        print(f"{args.requests} authenticated calls")
+        for label, cache, check_version, version_ttl in scenarios:
+            auth_tokens.tokens = cache
+            auth_tokens.check_version = check_version
+            auth_tokens.version_ttl = version_ttl
+            print(f"  {label:<22}{measure():>8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
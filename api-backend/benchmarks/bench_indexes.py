@@ -0,0 +1,126 @@
+"""
+Lookup latency on large MovieList / Watched / List tables, before and after the index migrations.
+
+Builds a SQLite database with the pre-index schema (PK and FK only), fills it with millions
+of rows, times the lookups the routes run on every add, remove and watched-list sync, then
+runs ``migrations.upgrade()`` through the app and times them again:
+
+    python -m benchmarks.bench_indexes --users 20000 --movies-per-list 50
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+OLD_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, name VARCHAR(150), email VARCHAR(150) NOT NULL UNIQUE,
+                   password VARCHAR(200) NOT NULL);
+CREATE TABLE list (id VARCHAR(10) PRIMARY KEY, name VARCHAR(150) NOT NULL, is_main BOOLEAN,
+                   user_id INTEGER NOT NULL REFERENCES user(id));
+CREATE TABLE movie_list (id INTEGER PRIMARY KEY, tmdb_id INTEGER NOT NULL,
+                         list_id VARCHAR(10) NOT NULL REFERENCES list(id));
+CREATE TABLE watched (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user(id),
+                      tmdb_id INTEGER NOT NULL, watched_at DATETIME NOT NULL);
+"""
+
+QUERIES = {
+    "movie_list by (list_id, tmdb_id)": "SELECT id FROM movie_list WHERE list_id = ? AND tmdb_id = ?",
+    "watched by (user_id, tmdb_id)": "SELECT id FROM watched WHERE user_id = ? AND tmdb_id = ?",
+    "watched by user_id order by watched_at":
+        "SELECT tmdb_id, watched_at FROM watched WHERE user_id = ? ORDER BY watched_at DESC",
+    "list by (user_id, is_main, name)": "SELECT id FROM list WHERE user_id = ? AND is_main = 1 AND name = ?",
+}
+
+
+def populate(path, users, movies_per_list, seed=1):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO user (id, name, email, password) VALUES (?, ?, ?, ?)",
+        ((u, f"user{u}", f"user{u}@example.com", "x") for u in range(1, users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO list (id, name, is_main, user_id) VALUES (?, ?, ?, ?)",
+        ((f"{u:x}-{n}", name, 1, u) for u in range(1, users + 1)
+         for n, name in enumerate(("Assistidos", "Favoritos", "Quero ver"))),
+    )
+
+    def list_rows():
+        for u in range(1, users + 1):
+            for n in range(3):
+                for tmdb_id in rng.sample(range(1, 100000), movies_per_list):
+                    yield tmdb_id, f"{u:x}-{n}"
+
+    def watched_rows():
+        for u in range(1, users + 1):
+            for tmdb_id in rng.sample(range(1, 100000), movies_per_list):
+                yield u, tmdb_id, f"20{rng.randint(10, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    conn.executemany("INSERT INTO movie_list (tmdb_id, list_id) VALUES (?, ?)", list_rows())
+    conn.executemany("INSERT INTO watched (user_id, tmdb_id, watched_at) VALUES (?, ?, ?)", watched_rows())
+    conn.commit()
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("list", "movie_list", "watched")}
+    conn.close()
+    return counts
+
+
+def time_queries(path, users, samples, seed=2):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    results = {}
+    for label, sql in QUERIES.items():
+        args = []
+        for _ in range(samples):
+            u = rng.randint(1, users)
+            if "movie_list" in label:
+                args.append((f"{u:x}-{rng.randint(0, 2)}", rng.randint(1, 100000)))
+            elif "(user_id, tmdb_id)" in label:
+                args.append((u, rng.randint(1, 100000)))
+            elif label.startswith("list"):
+                args.append((u, "Assistidos"))
+            else:
+                args.append((u,))
+        started = time.perf_counter()
+        for a in args:
+            conn.execute(sql, a).fetchall()
+        results[label] = (time.perf_counter() - started) / samples * 1000
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--movies-per-list", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=20, help="Lookups timed per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        counts = populate(path, args.users, args.movies_per_list)
+        print(", ".join(f"{table}: {count:,} rows" for table, count in counts.items()),
+              f"(built in {time.perf_counter() - started:.1f}s)")
+
+        before = time_queries(path, args.users, args.samples)
+
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        from app import create_app
+        started = time.perf_counter()
+        create_app()  # runs migrations.upgrade()
+        print(f"migrations applied in {time.perf_counter() - started:.1f}s")
+
+        after = time_queries(path, args.users, args.samples)
+        print(f"{'query':<42}{'before ms':>12}{'after ms':>12}")
+        for label in QUERIES:
+            print(f"{label:<42}{before[label]:>12.3f}{after[label]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+How many TMDB calls do N concurrent requests for the same uncached movie produce?
+
+Starts the TMDB stub, fires N simultaneous GET /api/tmdb/movie/<id> requests at the app
+(SQLite file database) and reports upstream calls and failed responses, with and without
+request coalescing:
+
+    python -m benchmarks.bench_singleflight --concurrency 50 --latency 0.2
+"""
+import argparse
+import os
+import tempfile
+import threading
+
+from benchmarks.tmdb_stub import TMDBStubServer
+
+
+class _NoCoalescing:
+    """Stand-in for SingleFlight that lets every caller run the fetch."""
+
+    def do(self, key, fn):
+        return fn()
+
+
+def run(app, stub, tmdb_id, concurrency):
+    barrier = threading.Barrier(concurrency)
+    statuses = []
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        status = client.get(f"/api/tmdb/movie/{tmdb_id}").status_code
+        with lock:
+            statuses.append(status)
+
+    before = stub.requests[f"/3/movie/{tmdb_id}"]
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    upstream = stub.requests[f"/3/movie/{tmdb_id}"] - before
+    errors = sum(1 for status in statuses if status != 200)
+    return upstream, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="TMDB stub latency in seconds")
+    args = parser.parse_args()
+
+    with TMDBStubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        os.environ["TMDB_BASE_URL"] = stub.base_url
+        os.environ["TMDB_API_KEY"] = "benchmark"
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+        import utils
+        from app import create_app
+
+        app = create_app()
+        coalescing = utils._movie_fetch_flight
+        print(f"{args.concurrency} concurrent requests for the same uncached movie")
+        for label, flight, tmdb_id in (("without coalescing", _NoCoalescing(), 1), ("with coalescing", coalescing, 2)):
+            utils._movie_fetch_flight = flight
+            upstream, errors = run(app, stub, tmdb_id, args.concurrency)
+            print(f"  {label:<20} upstream calls: {upstream:>4}   failed responses: {errors:>4}")
+        utils._movie_fetch_flight = coalescing
+
+
+if __name__ == "__main__":
+    main()
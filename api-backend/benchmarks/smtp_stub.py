@@ -0,0 +1,141 @@
+"""
+Local stand-in for an SMTP server, used by the tests of the mail outbox.
+
+It accepts every message (no TLS, no auth) and can inject failures. Run it standalone with:
+
+    python -m benchmarks.smtp_stub --port 8025
+
+and point the backend at it with MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_USE_TLS=false.
+"""
+import argparse
+import socketserver
+import threading
+from collections import deque
+
+
+class SMTPStubServer:
+    """
+    Threaded SMTP server that keeps the messages it receives.
+
+    * ``messages`` - list of (mail_from, recipients, data) tuples
+    * ``connections`` - number of connections accepted
+    * ``reject_recipients`` - addresses answered with 550 at RCPT TO
+    * ``queue_replies(*codes)`` - answer the next MAIL FROM commands with these codes; the
+      code ``None`` drops the connection instead
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.messages = []
+        self.connections = 0
+        self.reject_recipients = set()
+        self._forced = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def queue_replies(self, *codes):
+        with self._lock:
+            self._forced.extend(codes)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_reply(self):
+        with self._lock:
+            if self._forced:
+                return self._forced.popleft()
+        return 250
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with stub._lock:
+                    stub.connections += 1
+                self.reply("220 smtp-stub ready")
+                mail_from, recipients = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+                    command = command.upper()
+                    if command in ("EHLO", "HELO"):
+                        self.reply("250 smtp-stub")
+                    elif command == "MAIL":
+                        code = stub._next_reply()
+                        if code is None:
+                            return  # Dropped connection
+                        if code != 250:
+                            self.reply(f"{code} Injected error")
+                            continue
+                        mail_from, recipients = argument.partition(":")[2].strip("<> "), []
+                        self.reply("250 OK")
+                    elif command == "RCPT":
+                        address = argument.partition(":")[2].strip("<> ")
+                        if address in stub.reject_recipients:
+                            self.reply("550 No such user")
+                            continue
+                        recipients.append(address)
+                        self.reply("250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        for data_line in iter(self.rfile.readline, b""):
+                            if data_line in (b".\r\n", b".\n"):
+                                break
+                            data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                        with stub._lock:
+                            stub.messages.append((mail_from, recipients, b"".join(data)))
+                        mail_from, recipients = None, []
+                        self.reply("250 OK")
+                    elif command == "RSET":
+                        mail_from, recipients = None, []
+                        self.reply("250 OK")
+                    elif command == "NOOP":
+                        self.reply("250 OK")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP server stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    server = SMTPStubServer(args.host, args.port)
+    print(f"SMTP stub listening on {args.host}:{server.address[1]}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
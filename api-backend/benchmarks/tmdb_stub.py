@@ -0,0 +1,197 @@
+"""
+Local stand-in for the TMDB API, used by the tests and the benchmarks.
+
+It answers the endpoints the backend calls with small deterministic payloads and can
+inject latency and errors. Run it standalone with:
+
+    python -m benchmarks.tmdb_stub --port 8765 --latency 0.05 --error-rate 0.01
+
+and point the backend at it with TMDB_BASE_URL=http://127.0.0.1:8765/3.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = [
+    {"id": 28, "name": "Ação"},
+    {"id": 12, "name": "Aventura"},
+    {"id": 16, "name": "Animação"},
+    {"id": 35, "name": "Comédia"},
+    {"id": 18, "name": "Drama"},
+    {"id": 27, "name": "Terror"},
+    {"id": 878, "name": "Ficção científica"},
+]
+
+
+def movie_payload(tmdb_id, language="pt-BR"):
+    """Deterministic details payload for a synthetic movie."""
+    rng = random.Random(tmdb_id)
+    return {
+        "id": tmdb_id,
+        "imdb_id": f"tt{tmdb_id:07d}",
+        "title": f"Filme {tmdb_id}" if language.startswith("pt") else f"Movie {tmdb_id}",
+        "original_title": f"Movie {tmdb_id}",
+        "overview": f"Sinopse do filme {tmdb_id} ({language}).",
+        "poster_path": f"/poster{tmdb_id}.jpg",
+        "release_date": f"{1970 + tmdb_id % 55}-{1 + tmdb_id % 12:02d}-{1 + tmdb_id % 28:02d}",
+        "vote_average": round(rng.uniform(1, 10), 1),
+        "runtime": 80 + tmdb_id % 90,
+        "adult": False,
+        "genres": rng.sample(GENRES, 2),
+    }
+
+
+def _page(ids, page, language):
+    return {
+        "page": page,
+        "results": [
+            {key: value for key, value in movie_payload(i, language).items() if key != "genres"}
+            for i in ids
+        ],
+        "total_pages": 500,
+        "total_results": 10000,
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 stalls bursts of concurrent connections (SYN retries)
+    request_queue_size = 1024
+
+
+class TMDBStubServer:
+    """
+    Threaded HTTP server emulating TMDB under the "/3" prefix.
+
+    * ``latency`` - seconds added to every response
+    * ``error_rate`` - probability of answering 503 instead
+    * ``queue_statuses(*codes)`` - force the next responses to use the given statuses
+    * ``requests`` - Counter of the paths served, for asserting on upstream call counts
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._forced = deque()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._thread = None
+        self.httpd = _Server((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    def queue_statuses(self, *statuses):
+        with self._lock:
+            self._forced.extend(statuses)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_status(self):
+        with self._lock:
+            if self._forced:
+                return self._forced.popleft()
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 503
+        return 200
+
+    def respond(self, path, query):
+        """Returns (status, body) for a request; also used directly by in-process benchmarks."""
+        with self._lock:
+            self.requests[path] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        status = self._next_status()
+        if status != 200:
+            return status, {"status_message": "Injected error", "status_code": status}
+
+        language = query.get("language", "pt-BR")
+        page = int(query.get("page", 1) or 1)
+        if path == "/3/configuration":
+            return 200, {"images": {"secure_base_url": "https://image.tmdb.org/t/p/"}}
+        if path == "/3/genre/movie/list":
+            return 200, {"genres": GENRES}
+        if path in ("/3/discover/movie", "/3/movie/popular") or path.startswith("/3/trending/movie"):
+            start = (page - 1) * 20 + 1
+            return 200, _page(range(start, start + 20), page, language)
+        if path == "/3/search/movie":
+            seed = sum(map(ord, query.get("query", "")))
+            return 200, _page([seed * 10 + i for i in range(1, 11)], page, language)
+        match = re.fullmatch(r"/3/find/tt(\d+)", path)
+        if match:
+            return 200, {"movie_results": [movie_payload(int(match.group(1)), language)]}
+        match = re.fullmatch(r"/3/movie/(\d+)(/credits|/recommendations)?", path)
+        if match:
+            tmdb_id = int(match.group(1))
+            if match.group(2) == "/credits":
+                return 200, {"id": tmdb_id, "cast": [{"id": 1, "name": "Ator"}], "crew": []}
+            if match.group(2) == "/recommendations":
+                return 200, _page([tmdb_id + i for i in range(1, 21)], page, language)
+            body = movie_payload(tmdb_id, language)
+            for section in filter(None, query.get("append_to_response", "").split(",")):
+                body[section] = {"results": []}
+            return 200, body
+        return 404, {"status_message": "The resource you requested could not be found."}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                status, body = stub.respond(parsed.path, query)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TMDB API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 503 response")
+    args = parser.parse_args()
+    server = TMDBStubServer(args.host, args.port, args.latency, args.error_rate)
+    print(f"TMDB stub listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Response cache for upstream TMDB calls.
+
+Two interchangeable backends are provided:
+
+* ``MemoryCacheBackend`` - an in-process LRU, fastest but private to each worker.
+* ``SQLiteCacheBackend`` - a file-backed store shared by every gunicorn worker
+  running on the same host.
+
+``ResponseCache`` sits in front of either backend, builds normalized keys from the
+upstream path and parameters, applies per-route TTLs and keeps hit/miss counters.
+
+Expired entries are kept for ``stale_ttl`` more seconds (TMDB_CACHE_STALE_TTL): a regular
+lookup ignores them, but ``get_stale()`` still returns them, so the proxy routes can answer
+with the last good response while TMDB is down.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+# Default time-to-live (seconds) per proxied route
+DEFAULT_TTLS = {
+    "config": 24 * 3600,
+    "genres": 24 * 3600,
+    "popular": 3600,
+    "discover": 3600,
+    "search": 600,
+    "credits": 24 * 3600,
+    "recommendations": 6 * 3600,
+}
+
+# Parameters that never take part in the cache key
+IGNORED_PARAMS = {"api_key"}
+
+
+def parse_ttls(value):
+    """
+    Parses a "route=seconds,route=seconds" string (e.g. from an environment variable)
+    into a dict. Invalid entries are ignored.
+    """
+    ttls = {}
+    if not value:
+        return ttls
+    for item in value.split(","):
+        route, _, seconds = item.partition("=")
+        route = route.strip()
+        try:
+            ttls[route] = int(seconds)
+        except ValueError:
+            continue
+    return ttls
+
+
+def _normalize_param(name, value):
+    if isinstance(value, bool):
+        return str(value).lower()
+    value = str(value).strip()
+    if name == "query":
+        # TMDB search is case-insensitive, so "Matrix" and " matrix" share an entry
+        return " ".join(value.split()).lower()
+    if name == "page":
+        try:
+            return str(int(value))
+        except ValueError:
+            return value
+    return value
+
+
+def make_key(route, path, params=None):
+    """
+    Builds a stable cache key from the route name, the upstream path (which holds the
+    movie id for per-movie routes) and the upstream parameters.
+    """
+    params = params or {}
+    items = sorted(
+        (name, _normalize_param(name, value))
+        for name, value in params.items()
+        if name not in IGNORED_PARAMS and value is not None
+    )
+    return f"{route}:{path}?{urlencode(items)}"
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU cache with per-entry expiration."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=2048, stale_ttl=0):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stale=False):
+        """The value of ``key``; with ``stale``, also when it expired less than stale_ttl ago."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            now = time.time()
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                return None
+            if expires_at <= now and not stale:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    File-backed cache shared between processes. Each thread keeps its own connection;
+    WAL mode lets readers in other workers proceed while one of them writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=2048, stale_ttl=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at "
+            "ON response_cache (accessed_at)"
+        )
+
+    def _connection(self):
+        # A forked worker keeps the thread-local of the thread that forked it, but SQLite
+        # connections must not be used across fork: open a new one in the child
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, stale=False):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at + self.stale_ttl <= now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        if expires_at <= now and not stale:
+            return None
+        conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now),
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM response_cache")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Flask extension wrapping a cache backend with per-route TTLs and hit/miss counters.
+
+    Counters are kept per process; with the SQLite backend the stored entries are
+    shared but each worker reports its own hits and misses.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttls = dict(DEFAULT_TTLS)
+        self._counters = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_name = app.config.get("TMDB_CACHE_BACKEND", "memory")
+        max_entries = app.config.get("TMDB_CACHE_MAX_ENTRIES", 2048)
+        stale_ttl = app.config.get("TMDB_CACHE_STALE_TTL", 7 * 24 * 3600)
+        if backend_name == "sqlite":
+            path = app.config.get("TMDB_CACHE_PATH") or os.path.join(
+                app.instance_path, "tmdb_cache.sqlite3"
+            )
+            self.backend = SQLiteCacheBackend(path, max_entries=max_entries, stale_ttl=stale_ttl)
+        elif backend_name == "none":
+            self.backend = None
+        else:
+            self.backend = MemoryCacheBackend(max_entries=max_entries, stale_ttl=stale_ttl)
+        self.ttls = {**DEFAULT_TTLS, **app.config.get("TMDB_CACHE_TTLS", {})}
+        app.extensions["response_cache"] = self
+
+    def _count(self, route, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(route, {"hits": 0, "misses": 0, "stale": 0})
+            counters[outcome] += 1
+
+    def get(self, route, path, params=None):
+        if self.backend is None or self.ttls.get(route, 0) <= 0:
+            return None
+        value = self.backend.get(make_key(route, path, params))
+        self._count(route, "hits" if value is not None else "misses")
+        return value
+
+    def get_stale(self, route, path, params=None):
+        """The cached value even if it expired (within the stale TTL), for when TMDB cannot be reached."""
+        if self.backend is None or self.ttls.get(route, 0) <= 0:
+            return None
+        value = self.backend.get(make_key(route, path, params), stale=True)
+        if value is not None:
+            self._count(route, "stale")
+        return value
+
+    def set(self, route, path, params, value):
+        ttl = self.ttls.get(route, 0)
+        if self.backend is None or ttl <= 0:
+            return
+        self.backend.set(make_key(route, path, params), value, ttl)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self):
+        with self._lock:
+            per_route = {route: dict(counters) for route, counters in self._counters.items()}
+        hits = sum(c["hits"] for c in per_route.values())
+        misses = sum(c["misses"] for c in per_route.values())
+        stale = sum(c["stale"] for c in per_route.values())
+        total = hits + misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "none",
+            "size": len(self.backend) if self.backend is not None else 0,
+            "hits": hits,
+            "misses": misses,
+            "stale": stale,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "routes": per_route,
+        }
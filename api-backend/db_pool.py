@@ -0,0 +1,109 @@
+"""
+Database connection pool settings and statistics.
+
+``engine_options()`` turns the DB_POOL_* settings into SQLALCHEMY_ENGINE_OPTIONS:
+
+* pool_pre_ping - test each connection on checkout, so connections MySQL closed while
+  idle (wait_timeout) are replaced transparently instead of failing the request
+* pool_recycle - replace connections older than DB_POOL_RECYCLE seconds
+* pool_size / max_overflow / pool_timeout - per-process pool bounds; keep
+  workers x (size + overflow) below MySQL's max_connections
+
+The pool is a ``TimedQueuePool``, a QueuePool that also counts checkouts, new connections,
+timeouts and the time requests spent waiting for a free connection (``pool_stats()``).
+"""
+import threading
+import time
+
+from sqlalchemy import exc, make_url, text
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._connects = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                # Checkouts served by an idle connection take microseconds
+                if waited >= 0.001:
+                    self._waits += 1
+
+    def _create_connection(self):
+        with self._stats_lock:
+            self._connects += 1
+        return super()._create_connection()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "timeouts": self._timeouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_max * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            }
+
+
+def engine_options(url, config):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``url`` from the DB_POOL_* values in ``config``."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # Flask-SQLAlchemy uses a StaticPool: one shared in-memory connection
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config.get("DB_POOL_SIZE", 5),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+    }
+
+
+def pool_stats(engine):
+    """Current occupancy of ``engine``'s pool plus the TimedQueuePool counters, for this process."""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.stats())
+    return stats
+
+
+def ping(engine):
+    """Runs SELECT 1 on a pooled connection. Returns (reachable, error message, milliseconds)."""
+    started = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except exc.SQLAlchemyError as e:
+        return False, str(e.__cause__ or e), round((time.perf_counter() - started) * 1000, 3)
+    return True, None, round((time.perf_counter() - started) * 1000, 3)
@@ -1,7 +1,26 @@
 from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from cache import ResponseCache
+from tmdb_client import AsyncTMDBClient, TMDBClient
+from refresher import MovieRefresher
+from token_auth import TokenVerifier
+from outbox import MailOutboxWorker
+from health import TMDBHealthProbe
+from openapi_spec import OpenAPISpec
+from search_index import MovieSearchIndex
+from metrics import Metrics
 
 db = SQLAlchemy()
 cors = CORS()
 mail = Mail()
+response_cache = ResponseCache()
+tmdb = TMDBClient()
+tmdb_async = AsyncTMDBClient()
+movie_refresher = MovieRefresher()
+auth_tokens = TokenVerifier()
+mail_outbox = MailOutboxWorker()
+tmdb_health = TMDBHealthProbe()
+openapi_spec = OpenAPISpec()
+search_index = MovieSearchIndex()
+metrics = Metrics()
@@ -0,0 +1,107 @@
+"""
+Production gunicorn settings, picked up with:
+
+    gunicorn --config gunicorn.conf.py
+
+Every setting can be overridden through the environment:
+
+* WEB_CONCURRENCY - worker processes (default: 2 x usable CPUs + 1)
+* GUNICORN_WORKER_CLASS - "gthread" (default), "sync" or "uvicorn" (ASGI mode, see asgi.py)
+* GUNICORN_THREADS - threads per gthread worker (default 4)
+* GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER - recycle a worker after that many
+  requests, staggered so workers do not all restart at once (0 disables)
+* GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_KEEPALIVE, GUNICORN_LOG_LEVEL, PORT
+
+The app is preloaded in the master, so workers share its memory copy-on-write and a broken
+app fails at startup rather than in every worker. The schema migrations run once in the
+master before any worker starts, and each worker replaces the database pools inherited
+from the master with fresh ones (post_fork). The OpenAPI spec served at /api/spec.json is
+also resolved in the master.
+
+Workers write their /metrics values to METRICS_DIR (default: a directory under the system
+temp dir), emptied when the master starts, so a scrape reaching any worker reports them all.
+"""
+import multiprocessing
+import os
+import tempfile
+
+
+def _usable_cpus():
+    """CPUs this container may actually use: cgroup quota, then CPU affinity, then the host count."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2, e.g. "150000 100000"
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, int(int(quota) / int(period) + 0.5))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "uvicorn": "uvicorn.workers.UvicornWorker",
+}
+
+_worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+worker_class = WORKER_CLASSES.get(_worker_class, _worker_class)
+wsgi_app = "asgi:app" if "uvicorn" in worker_class.lower() else "wsgi:app"
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", _usable_cpus() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = True
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+accesslog = "-"
+errorlog = "-"
+
+# Migrations run once in on_starting, not in create_app() in every process
+os.environ.setdefault("DB_AUTO_MIGRATE", "false")
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "meus_filmes_metrics"))
+
+
+def _flask_app(server):
+    # In ASGI mode the loaded app wraps the Flask one (async_proxy.AsyncProxyApp)
+    app = server.app.wsgi()
+    return getattr(app, "flask_app", app)
+
+
+def on_starting(server):
+    from app import upgrade_database
+    app = _flask_app(server)
+    upgrade_database(app)
+    app.extensions["metrics"].reset()
+    # Workers inherit the resolved OpenAPI spec instead of each building it
+    try:
+        app.extensions["openapi_spec"].get()
+    except Exception as e:
+        server.log.warning(f"Could not preload the OpenAPI spec: {e}")
+
+
+def post_fork(server, worker):
+    # Pooled connections opened by the master (migrations) must not be shared between
+    # processes; close=False leaves the master's sockets alone and gives this worker new pools
+    from extensions import db
+    app = _flask_app(worker)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Recycled workers (max_requests) fold their counters into one file instead of leaving theirs
+    try:
+        _flask_app(worker).extensions["metrics"].retire()
+    except Exception as e:
+        server.log.warning(f"Could not save the metrics of worker {worker.pid}: {e}")
@@ -0,0 +1,90 @@
+"""
+Dependency checks for the /health routes.
+
+Health probes run every few seconds (docker-compose, nginx, load balancers), so they must not
+call TMDB themselves: that spends API quota and makes the backend look down whenever TMDB is
+slow. ``TMDBHealthProbe`` instead keeps the outcome of a small TMDB request (/configuration),
+refreshed every HEALTH_TMDB_INTERVAL seconds by a daemon thread per worker (started lazily,
+so it is created after a gunicorn fork), and the routes only read it.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class TMDBHealthProbe:
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 60.0
+        self._result = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get("HEALTH_TMDB_INTERVAL", 60.0)
+        app.extensions["tmdb_health"] = self
+
+    def probe(self):
+        """Calls TMDB now, stores and returns the outcome."""
+        from extensions import tmdb
+        started = time.perf_counter()
+        error = None
+        try:
+            tmdb.get("/configuration")
+        except requests.exceptions.RequestException as e:
+            # The message quotes the request URL, api_key included
+            error = str(e).replace(tmdb.api_key, "***") if tmdb.api_key else str(e)
+        result = {
+            "reachable": error is None,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "checked_at": datetime.datetime.now(datetime.timezone.utc),
+            "error": error,
+        }
+        with self._lock:
+            self._result = result
+        return result
+
+    def result(self):
+        """
+        The last probe outcome (reachable, latency_ms, checked_at, error), or None until the
+        first probe of this worker completes. Never blocks on TMDB.
+        """
+        self._ensure_thread()
+        with self._lock:
+            return self._result
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+                return
+            self._thread = threading.Thread(target=self._run, name="tmdb-health", daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                result = self.probe()
+                if not result["reachable"]:
+                    logger.warning(f"TMDB health probe failed: {result['error']}")
+            except Exception as e:
+                logger.error(f"Error in the TMDB health probe: {str(e)}")
+            time.sleep(self.interval)
+
+
+def pool_exhausted(stats):
+    """True when every connection the pool may open is checked out (a ping would wait)."""
+    if "size" not in stats:
+        return False
+    return stats["checked_out"] >= stats["size"] + stats["max_overflow"]
@@ -0,0 +1,392 @@
+"""
+Request, database and TMDB metrics, served in the Prometheus text format at /metrics.
+
+Recorded for every request, labelled with its Flask endpoint (e.g. "api_v1.lists.get_list"):
+
+* http_requests_total / http_request_duration_seconds - count by status and latency
+* http_request_db_queries / http_request_db_duration_seconds - SQL statements run by the
+  request and the time spent in them; a high query count per request points at an N+1
+* tmdb_requests_total / tmdb_request_duration_seconds - every TMDB HTTP attempt (retries
+  included) by route template ("/movie/{id}") and status
+* tmdb_circuit_rejections_total - calls refused by the open circuit breaker (tmdb_client.py)
+* movie_store_lookups_total - _save_movie_details_if_not_exist outcomes (hit, fetched, failed)
+
+The values live in the memory of each process. With several gunicorn workers, set METRICS_DIR:
+a daemon thread in every worker then writes its values there every METRICS_FLUSH_INTERVAL
+seconds, and /metrics adds up the files of all the workers. A worker that exits merges its
+file into ``retired.json`` so recycled workers do not pile up files.
+"""
+import bisect
+import fcntl
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_template(path):
+    """TMDB path with its ids replaced, so every movie shares one label: /movie/550 -> /movie/{id}."""
+    return NUMERIC_SEGMENT.sub("/{id}", path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> total
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for labels, value in samples:
+            key = tuple(labels)
+            total[key] = total.get(key, 0) + value
+
+    def render(self, total):
+        for labels, value in sorted(total.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)  # First bucket with value <= bound
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total] for labels, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for labels, counts, value_sum in samples:
+            key = tuple(labels)
+            series = total.setdefault(key, [[0] * len(counts), 0.0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += value_sum
+
+    def render(self, total):
+        bounds = [*self.buckets, float("inf")]
+        for labels, (counts, value_sum) in sorted(total.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(value_sum)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def merge(self, snapshots):
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                if name in self.metrics:
+                    self.metrics[name].merge(totals[name], samples)
+        return totals
+
+    def render(self, totals):
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(totals.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "Requests handled, by Flask endpoint, method and status.", ("endpoint", "method", "status")
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ("endpoint", "method")
+)
+HTTP_REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries", "SQL statements run by a request.", ("endpoint",), QUERY_COUNT_BUCKETS
+)
+HTTP_REQUEST_DB_DURATION = REGISTRY.histogram(
+    "http_request_db_duration_seconds", "Time a request spent running SQL statements.", ("endpoint",)
+)
+TMDB_REQUESTS = REGISTRY.counter(
+    "tmdb_requests_total", "TMDB HTTP attempts (retries included), by route template and status.", ("route", "status")
+)
+TMDB_REQUEST_DURATION = REGISTRY.histogram(
+    "tmdb_request_duration_seconds", "Duration of a TMDB HTTP attempt.", ("route",)
+)
+TMDB_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "tmdb_circuit_rejections_total", "TMDB calls failed at once because the circuit breaker was open.", ("route",)
+)
+MOVIE_STORE_LOOKUPS = REGISTRY.counter(
+    "movie_store_lookups_total",
+    "Movies looked up by _save_movie_details_if_not_exist: hit (stored), fetched (from TMDB) or failed.",
+    ("result",),
+)
+
+
+def observe_tmdb(path, status, started):
+    """Records a TMDB attempt to ``path`` that started at ``started`` (time.perf_counter())."""
+    route = route_template(path)
+    TMDB_REQUESTS.inc(route, str(status))
+    TMDB_REQUEST_DURATION.observe(time.perf_counter() - started, route)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _query_done(conn)
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        _query_done(context.connection)
+
+
+def _query_done(conn):
+    started = conn.info.get("metrics_query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    # Queries of background threads (refresher, outbox...) have no request to be charged to
+    state = g.get("metrics") if has_request_context() else None
+    if state is not None:
+        state[1] += 1
+        state[2] += elapsed
+
+
+class Metrics:
+    content_type = CONTENT_TYPE
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.token = None
+        self.directory = None
+        self.flush_interval = 5.0
+        self._file = None
+        self._file_pid = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._retired = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.token = app.config.get("METRICS_TOKEN")
+        self.directory = app.config.get("METRICS_DIR")
+        self.flush_interval = app.config.get("METRICS_FLUSH_INTERVAL", 5.0)
+        app.extensions["metrics"] = self
+        if not self.enabled:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+    def _before_request(self):
+        g.metrics = [time.perf_counter(), 0, 0.0]  # Start, SQL statements, time spent in them
+
+    def _after_request(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # Unhandled exceptions skip after_request
+        self._record(500)
+
+    def _record(self, status):
+        state = g.pop("metrics", None)
+        if state is None:
+            return
+        started, queries, query_time = state
+        endpoint = request.endpoint or "unmatched"  # 404s share a label instead of one per URL
+        HTTP_REQUESTS.inc(endpoint, request.method, str(status))
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint, request.method)
+        HTTP_REQUEST_DB_QUERIES.observe(queries, endpoint)
+        HTTP_REQUEST_DB_DURATION.observe(query_time, endpoint)
+        if self.directory:
+            self._ensure_thread()
+
+    def _path(self):
+        # One file per process lifetime: a pid reused by a later worker must not overwrite it
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file = os.path.join(self.directory, f"worker-{pid}-{time.time_ns()}.json")
+            self._file_pid = pid
+        return self._file
+
+    def _locked(self, mode):
+        lock = open(os.path.join(self.directory, ".lock"), "a")
+        fcntl.flock(lock, mode)
+        return lock
+
+    def flush(self):
+        """Writes the values of this process to METRICS_DIR."""
+        if not self.directory or self._retired:
+            return
+        with self._lock:
+            path = self._path()
+            temporary = f"{path}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(REGISTRY.snapshot(), f)
+            os.replace(temporary, path)
+
+    def retire(self):
+        """Merges the values of this exiting process into retired.json (gunicorn worker_exit)."""
+        if not self.directory or not self.enabled:
+            return
+        retired = os.path.join(self.directory, "retired.json")
+        self._retired = True
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            snapshots = [REGISTRY.snapshot()]
+            if os.path.exists(retired):
+                with open(retired) as f:
+                    snapshots.append(json.load(f))
+            totals = REGISTRY.merge(snapshots)
+            with open(f"{retired}.tmp", "w") as f:
+                json.dump({name: _as_samples(total) for name, total in totals.items()}, f)
+            os.replace(f"{retired}.tmp", retired)
+            if self._file_pid == os.getpid() and os.path.exists(self._file):
+                os.remove(self._file)
+        REGISTRY.clear()
+
+    def reset(self):
+        """Removes the files of a previous run (gunicorn on_starting, before any worker starts)."""
+        REGISTRY.clear()
+        if not self.directory:
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") or name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+                return
+            self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error(f"Error writing metrics to {self.directory}: {str(e)}")
+
+    def render(self):
+        if not self.directory:
+            return REGISTRY.render(REGISTRY.merge([REGISTRY.snapshot()]))
+        self.flush()
+        snapshots = []
+        with self._locked(fcntl.LOCK_SH):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Removed by an exiting worker meanwhile
+        return REGISTRY.render(REGISTRY.merge(snapshots))
+
+    def authorized(self, request):
+        if not self.token:
+            return True
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), self.token.encode())
+
+
+def _as_samples(total):
+    """Merged totals back in snapshot form."""
+    return [[list(labels), *value] if isinstance(value, list) else [list(labels), value] for labels, value in total.items()]
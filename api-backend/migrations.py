@@ -0,0 +1,100 @@
+"""
+Lightweight schema migrations.
+
+db.create_all() creates missing tables but never changes existing ones. Each step below
+inspects the live schema and only applies its change when it is missing, so ``upgrade()``
+can run on every deploy against both fresh and existing databases (SQLite or MySQL).
+
+It runs from create_app() unless DB_AUTO_MIGRATE is false; gunicorn.conf.py turns that off
+and runs it once in the master instead. It can also be run on its own:
+
+    python -m flask --app app upgrade-db
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+from extensions import db
+
+
+def _add_column(conn, table, column, ddl):
+    """Adds the column if it is missing; returns True when it did."""
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column in columns:
+        return False
+    quoted = conn.dialect.identifier_preparer.quote(table) # "user" is a reserved word in some databases
+    conn.execute(text(f"ALTER TABLE {quoted} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _create_index(conn, table, name, columns, unique=False):
+    inspector = inspect(conn)
+    existing = {i["name"] for i in inspector.get_indexes(table)}
+    existing |= {c["name"] for c in inspector.get_unique_constraints(table)}
+    if name in existing:
+        return
+    if unique:
+        # Keep the oldest row of each duplicate group, otherwise the unique index cannot be built.
+        # The derived table is required by MySQL, which refuses to select from the table being deleted from.
+        conn.execute(text(
+            f"DELETE FROM {table} WHERE id NOT IN ("
+            f"SELECT id FROM (SELECT MIN(id) AS id FROM {table} GROUP BY {', '.join(columns)}) AS keep_rows)"
+        ))
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def _add_watched_movie_fields(conn):
+    # Summaries built before these columns existed were counted from the Movie rows: copy the
+    # current Movie fields into every entry and recount, so later removals subtract the same values.
+    from watched_stats import rebuild
+    columns = (("movie_rating", "FLOAT NULL"), ("movie_release_date", "DATE NULL"), ("movie_genres", "JSON NULL"))
+    added = [_add_column(conn, "watched", column, ddl) for column, ddl in columns]
+    if any(added) and conn.execute(text("SELECT 1 FROM watched LIMIT 1")).first() is not None:
+        rebuild(conn)
+
+
+def _backfill_watched_summary(conn):
+    # Summary rows only exist for users with watched movies, so an empty summary next to a
+    # non-empty watched table means the table was just created.
+    from watched_stats import rebuild
+    if conn.execute(text("SELECT 1 FROM watched_summary LIMIT 1")).first() is None \
+            and conn.execute(text("SELECT 1 FROM watched LIMIT 1")).first() is not None:
+        rebuild(conn)
+
+
+# (description, step) pairs, applied in order
+MIGRATIONS = [
+    ("movie.fetched_at", lambda conn: _add_column(conn, "movie", "fetched_at", "DATETIME NULL")),
+    ("movie.runtime", lambda conn: _add_column(conn, "movie", "runtime", "INTEGER NULL")),
+    ("movie.original_title", lambda conn: _add_column(conn, "movie", "original_title", "VARCHAR(255) NULL")),
+    ("movie.adult", lambda conn: _add_column(conn, "movie", "adult", "BOOLEAN NULL")),
+    ("movie_list unique (list_id, tmdb_id)",
+     lambda conn: _create_index(conn, "movie_list", "uq_movie_list_list_tmdb", ["list_id", "tmdb_id"], unique=True)),
+    ("watched unique (user_id, tmdb_id)",
+     lambda conn: _create_index(conn, "watched", "uq_watched_user_tmdb", ["user_id", "tmdb_id"], unique=True)),
+    ("watched index (user_id, watched_at)",
+     lambda conn: _create_index(conn, "watched", "ix_watched_user_watched_at", ["user_id", "watched_at"])),
+    ("list index (user_id, is_main, name)",
+     lambda conn: _create_index(conn, "list", "ix_list_user_main_name", ["user_id", "is_main", "name"])),
+    ("watched.movie_rating, movie_release_date, movie_genres", _add_watched_movie_fields),
+    ("watched_summary backfill", _backfill_watched_summary),
+    ("user.token_version", lambda conn: _add_column(conn, "user", "token_version", "INTEGER NOT NULL DEFAULT 0")),
+]
+
+
+def upgrade():
+    """Creates missing tables and applies every pending migration step."""
+    db.create_all()
+    with db.engine.begin() as conn:
+        for description, step in MIGRATIONS:
+            step(conn)
+
+
+@click.command("upgrade-db")
+@with_appcontext
+def upgrade_db_command():
+    """Create missing tables and apply pending schema changes."""
+    upgrade()
+    click.echo("Database schema is up to date.")
@@ -4,16 +4,22 @@ import secrets
 import string
 
 LIST_ID_LENGTH = 10
+DEFAULT_LANGUAGE = "pt-BR" # Language of the title/overview/genres stored on Movie itself
 
 def generate_random_list_id():
     alphabet = string.ascii_lowercase + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(LIST_ID_LENGTH))
 
+def utcnow():
+    """Naive UTC timestamp, matching what SQLite and MySQL DATETIME columns give back."""
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150))
     email = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0") # Bumped to revoke every issued token
 
 class List(db.Model):
     id = db.Column(db.String(LIST_ID_LENGTH), primary_key=True, default=generate_random_list_id)
@@ -22,19 +28,49 @@ class List(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User', backref=db.backref('lists', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_list_user_main_name', 'user_id', 'is_main', 'name'),
+    )
+
 class MovieList(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tmdb_id = db.Column(db.Integer, nullable=False)
     list_id = db.Column(db.String(LIST_ID_LENGTH), db.ForeignKey('list.id'), nullable=False)
     lista = db.relationship('List', backref=db.backref('movies', lazy=True))
 
+    __table_args__ = (
+        db.Index('uq_movie_list_list_tmdb', 'list_id', 'tmdb_id', unique=True),
+    )
+
 class Watched(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     tmdb_id = db.Column(db.Integer, nullable=False)
     watched_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now(datetime.UTC))
+    # Movie fields this entry was counted with in WatchedSummary, so removing it subtracts the same values
+    movie_rating = db.Column(db.Float, nullable=True)
+    movie_release_date = db.Column(db.Date, nullable=True)
+    movie_genres = db.Column(db.JSON, nullable=True)
     user = db.relationship('User', backref=db.backref('watched', lazy=True))
 
+    __table_args__ = (
+        db.Index('uq_watched_user_tmdb', 'user_id', 'tmdb_id', unique=True),
+        db.Index('ix_watched_user_watched_at', 'user_id', 'watched_at'),
+    )
+
+class WatchedSummary(db.Model):
+    """
+    Per-user watched counters, maintained incrementally on every Watched insert/delete so
+    /movie/watched/stats does not aggregate the whole history. ``dimension`` is one of
+    "total", "month" (bucket "YYYY-MM" of watched_at), "release_year" or "genre" (TMDB genre id).
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0) # Sum of Movie.rating over the rated movies
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
 class Movie(db.Model):
     tmdb_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -43,6 +79,65 @@ class Movie(db.Model):
     release_date = db.Column(db.Date, nullable=True)
     rating = db.Column(db.Float, nullable=True) # TMDB vote_average
     genres = db.Column(db.JSON, nullable=True) # Store as a list of genre objects or IDs
+    runtime = db.Column(db.Integer, nullable=True) # Minutes
+    original_title = db.Column(db.String(255), nullable=True)
+    adult = db.Column(db.Boolean, nullable=True) # NULL on rows stored before it was kept, until refreshed
+    fetched_at = db.Column(db.DateTime, nullable=True, default=utcnow) # Last time the row was loaded from TMDB
 
     def __repr__(self):
         return f'<Movie {self.tmdb_id} - {self.title}>'
+
+class MovieTranslation(db.Model):
+    """Localized fields of a Movie for languages other than DEFAULT_LANGUAGE."""
+    tmdb_id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(db.String(10), primary_key=True)
+    title = db.Column(db.String(255), nullable=False)
+    overview = db.Column(db.Text, nullable=True)
+    poster_path = db.Column(db.String(255), nullable=True)
+    genres = db.Column(db.JSON, nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+
+class MovieExtra(db.Model):
+    """A TMDB append_to_response section (videos, credits, release_dates...) stored per language."""
+    tmdb_id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(db.String(10), primary_key=True)
+    section = db.Column(db.String(50), primary_key=True)
+    payload = db.Column(db.JSON, nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+class MovieNeighbor(db.Model):
+    """Top-K most similar movies of a movie, precomputed by recommender.py from lists and watched history."""
+    tmdb_id = db.Column(db.Integer, primary_key=True)
+    neighbor_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_movie_neighbor_neighbor', 'neighbor_id'),
+    )
+
+class MovieNeighborState(db.Model):
+    """Fingerprint of the users that watched or listed a movie when its neighbors were last computed."""
+    tmdb_id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.BigInteger, nullable=False)
+    interactions = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+class MailOutbox(db.Model):
+    """Outgoing e-mail, stored durably and delivered by the background worker in outbox.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=True) # MAIL_DEFAULT_SENDER when empty
+    recipients = db.Column(db.JSON, nullable=False)
+    body = db.Column(db.Text, nullable=False) # Emptied once sent or given up on
+    status = db.Column(db.String(10), nullable=False, default="pending") # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    claimed_by = db.Column(db.String(32), nullable=True) # Worker that is sending it
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
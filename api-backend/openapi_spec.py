@@ -0,0 +1,132 @@
+"""
+The OpenAPI document served at /api/spec.json, resolved once instead of on every request.
+
+openapi.yaml and docs/*.yaml are resolved into a single document (prance, or plain YAML
+without $ref resolution when prance is not installed) the first time the spec is requested,
+then kept as a compact JSON body, its gzip encoding and an ETag. It is only rebuilt when the
+mtime of one of those files changes.
+
+``flask --app app build-openapi`` writes the resolved document to OPENAPI_SPEC_ARTIFACT
+(openapi.json by default); when that file is newer than every source it is loaded instead,
+so the workers skip the YAML parsing and $ref resolution entirely.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+import click
+import yaml
+from flask import Response
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedSpec(NamedTuple):
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+def resolve(spec_path):
+    """Loads ``spec_path`` with its $ref references resolved."""
+    try:
+        from prance import ResolvingParser
+    except ImportError:
+        logger.warning("prance not available, serving OpenAPI spec without $ref resolution")
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    return ResolvingParser(spec_path).specification
+
+
+class OpenAPISpec:
+    def __init__(self, app=None):
+        self.spec_path = None
+        self.artifact_path = None
+        self.max_age = 300
+        self._rendered = None
+        self._signature = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.spec_path = os.path.join(app.root_path, "openapi.yaml")
+        self.artifact_path = app.config.get("OPENAPI_SPEC_ARTIFACT") or os.path.join(app.root_path, "openapi.json")
+        self.max_age = app.config.get("OPENAPI_SPEC_MAX_AGE", 300)
+        self._rendered = None
+        self._signature = None
+        app.extensions["openapi_spec"] = self
+
+    def sources(self):
+        docs = glob.glob(os.path.join(os.path.dirname(self.spec_path), "docs", "*.yaml"))
+        return [self.spec_path, *sorted(docs)]
+
+    def _source_signature(self):
+        return tuple((path, os.stat(path).st_mtime_ns) for path in self.sources())
+
+    def get(self):
+        """The rendered spec, rebuilt only when a source file was added, removed or modified."""
+        signature = self._source_signature()
+        with self._lock:
+            if self._rendered is None or self._signature != signature:
+                self._rendered = self._render(self._load(signature))
+                self._signature = signature
+            return self._rendered
+
+    def _load(self, signature):
+        try:
+            if os.stat(self.artifact_path).st_mtime_ns >= max(mtime for _, mtime in signature):
+                with open(self.artifact_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            logger.warning(f"{self.artifact_path} is older than the OpenAPI sources, resolving them instead")
+        except FileNotFoundError:
+            pass
+        return resolve(self.spec_path)
+
+    @staticmethod
+    def _render(spec):
+        body = json.dumps(spec, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return RenderedSpec(
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=hashlib.sha256(body).hexdigest()[:32],
+        )
+
+    def response(self, request):
+        """The spec as a conditional (304 on a matching If-None-Match), optionally gzipped response."""
+        rendered = self.get()
+        gzipped = request.accept_encodings["gzip"] > 0
+        response = Response(rendered.gzipped if gzipped else rendered.body, mimetype="application/json")
+        if gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
+        response.set_etag(f"{rendered.etag}-gzip" if gzipped else rendered.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+    def build(self, path=None):
+        """Writes the resolved spec to ``path`` (default: the artifact path) and returns the path."""
+        path = path or self.artifact_path
+        spec = resolve(self.spec_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return path
+
+
+@click.command("build-openapi")
+@click.option("--output", default=None, help="Destination file (default: OPENAPI_SPEC_ARTIFACT).")
+@with_appcontext
+def build_openapi_command(output):
+    """Resolve openapi.yaml into the JSON artifact served at /api/spec.json."""
+    from extensions import openapi_spec
+    path = openapi_spec.build(output)
+    click.echo(f"OpenAPI spec written to {path}.")
@@ -0,0 +1,271 @@
+"""
+Durable outgoing mail.
+
+Requests only ``enqueue()`` a MailOutbox row and return. A daemon thread per worker (started
+lazily, so it is created after a gunicorn fork) claims due rows in batches of MAIL_MAX_EMAILS,
+sends each batch over a single SMTP connection and retries failures with exponential
+backoff, giving up after MAIL_MAX_ATTEMPTS. Rows are claimed with a conditional UPDATE, so
+several workers can drain the same table; rows left "sending" by a crashed worker are picked
+up again after MAIL_CLAIM_TIMEOUT seconds.
+
+Bodies may hold secrets such as password-reset links, so a row's body is cleared as soon
+as it is sent or given up on, and sent and failed rows are deleted after
+MAIL_OUTBOX_RETENTION_DAYS.
+
+It can also be drained from the CLI, e.g. by a dedicated container:
+
+    python -m flask --app app send-mail
+    python -m flask --app app send-mail --interval 30
+"""
+import copy
+import datetime
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+
+import click
+from flask.cli import with_appcontext
+from flask_mail import BadHeaderError, Connection, Message
+from sqlalchemy import and_, or_
+
+logger = logging.getLogger(__name__)
+
+# Errors that concern a single message. Anything else (SMTPServerDisconnected, timeouts,
+# refused connections) fails the rest of the batch, which is retried on a new connection.
+REJECTED_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError, BadHeaderError, AssertionError
+)
+
+
+class _TimeoutConnection(Connection):
+    """Flask-Mail connection that honours MAIL_TIMEOUT (Flask-Mail opens sockets without one)."""
+
+    def __init__(self, mail, timeout):
+        # Batches are already capped at MAIL_MAX_EMAILS: without this Flask-Mail would also
+        # reconnect after the last message of every batch
+        mail = copy.copy(mail)
+        mail.max_emails = None
+        super().__init__(mail)
+        self.timeout = timeout
+
+    def configure_host(self):
+        if self.mail.use_ssl:
+            host = smtplib.SMTP_SSL(self.mail.server, self.mail.port, timeout=self.timeout)
+        else:
+            host = smtplib.SMTP(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            super().__exit__(exc_type, exc_value, tb)
+        except (smtplib.SMTPException, OSError):
+            pass  # The server already dropped the connection
+
+
+class MailOutboxWorker:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 50
+        self.max_attempts = 5
+        self.backoff_base = 30.0
+        self.backoff_max = 3600.0
+        self.poll_interval = 30.0
+        self.claim_timeout = datetime.timedelta(seconds=600)
+        self.retention = datetime.timedelta(days=7)
+        self.timeout = 30
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("MAIL_OUTBOX_ENABLED", True)
+        self.batch_size = app.config.get("MAIL_MAX_EMAILS") or 50
+        self.max_attempts = app.config.get("MAIL_MAX_ATTEMPTS", 5)
+        self.backoff_base = app.config.get("MAIL_BACKOFF_BASE", 30.0)
+        self.backoff_max = app.config.get("MAIL_BACKOFF_MAX", 3600.0)
+        self.poll_interval = app.config.get("MAIL_OUTBOX_POLL_INTERVAL", 30.0)
+        self.claim_timeout = datetime.timedelta(seconds=app.config.get("MAIL_CLAIM_TIMEOUT", 600))
+        self.retention = datetime.timedelta(days=app.config.get("MAIL_OUTBOX_RETENTION_DAYS", 7))
+        self.timeout = app.config.get("MAIL_TIMEOUT", 30)
+        app.extensions["mail_outbox"] = self
+        if self.enabled:
+            # Also picks up retries and mail left over by a previous process
+            app.before_request(self._ensure_thread)
+
+    def enqueue(self, subject, recipients, body, sender=None):
+        """Stores an e-mail for delivery, commits and wakes the sender thread. Returns the row id."""
+        from extensions import db
+        from models import MailOutbox
+        row = MailOutbox(subject=subject, recipients=list(recipients), body=body, sender=sender)
+        db.session.add(row)
+        db.session.commit()
+        if self.enabled:
+            self._ensure_thread()
+            self._wakeup.set()
+        return row.id
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+                    self.purge()
+            except Exception as e:
+                logger.error(f"Error draining the mail outbox: {str(e)}")
+
+    def drain(self):
+        """Sends every due e-mail, batch by batch. Returns a dict with counters."""
+        stats = {"sent": 0, "retrying": 0, "failed": 0}
+        while True:
+            batch = self.claim_batch()
+            if not batch:
+                return stats
+            for key, value in self.send_batch(batch).items():
+                stats[key] += value
+
+    def purge(self):
+        """Deletes sent and failed rows older than the retention period. Returns how many."""
+        from extensions import db
+        from models import MailOutbox, utcnow
+        cutoff = utcnow() - self.retention
+        try:
+            purged = MailOutbox.query.filter(or_(
+                and_(MailOutbox.status == "sent", MailOutbox.sent_at < cutoff),
+                and_(MailOutbox.status == "failed", MailOutbox.claimed_at < cutoff),
+            )).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return purged
+
+    def claim_batch(self):
+        """
+        Marks up to batch_size due rows as "sending" for this worker and returns them. The
+        conditional UPDATE makes concurrent claimers skip rows another worker already took.
+        """
+        from extensions import db
+        from models import MailOutbox, utcnow
+        now = utcnow()
+        due = or_(
+            and_(MailOutbox.status == "pending", MailOutbox.next_attempt_at <= now),
+            and_(MailOutbox.status == "sending", MailOutbox.claimed_at < now - self.claim_timeout),
+        )
+        try:
+            candidates = [
+                row_id for (row_id,) in db.session.query(MailOutbox.id).filter(due)
+                .order_by(MailOutbox.next_attempt_at).limit(self.batch_size)
+            ]
+            if not candidates:
+                db.session.commit()
+                return []
+            token = uuid.uuid4().hex
+            MailOutbox.query.filter(MailOutbox.id.in_(candidates), due).update(
+                {"status": "sending", "claimed_by": token, "claimed_at": now}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return MailOutbox.query.filter_by(claimed_by=token).order_by(MailOutbox.id).all()
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return datetime.timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def _failed(self, row, error):
+        from models import utcnow
+        row.attempts += 1
+        row.last_error = str(error)[:1000]
+        row.claimed_by = None
+        if row.attempts >= self.max_attempts:
+            row.status = "failed"
+            row.body = ""
+            logger.error(f"Giving up on e-mail {row.id} after {row.attempts} attempts: {row.last_error}")
+            return "failed"
+        row.status = "pending"
+        row.next_attempt_at = utcnow() + self._backoff(row.attempts)
+        return "retrying"
+
+    def send_batch(self, rows):
+        """Sends claimed rows over one SMTP connection and records the outcome of each."""
+        from extensions import db
+        from models import utcnow
+        stats = {"sent": 0, "retrying": 0, "failed": 0}
+        state = self.app.extensions["mail"]
+        pending = list(rows)
+        try:
+            with _TimeoutConnection(state, self.timeout) as connection:
+                while pending:
+                    row = pending[0]
+                    message = Message(
+                        subject=row.subject,
+                        recipients=row.recipients,
+                        body=row.body,
+                        sender=row.sender or self.app.config.get("MAIL_DEFAULT_SENDER"),
+                    )
+                    try:
+                        connection.send(message)
+                    except REJECTED_MESSAGE_ERRORS as e:
+                        # The server refused this message; the connection is still usable
+                        stats[self._failed(row, e)] += 1
+                    else:
+                        row.status = "sent"
+                        row.sent_at = utcnow()
+                        row.body = ""
+                        row.claimed_by = None
+                        stats["sent"] += 1
+                    pending.pop(0)
+                    db.session.commit()
+        except Exception as e:
+            logger.warning(f"SMTP connection failed, retrying {len(pending)} e-mails later: {str(e)}")
+            for row in pending:
+                stats[self._failed(row, e)] += 1
+            db.session.commit()
+        return stats
+
+
+@click.command("send-mail")
+@click.option("--interval", default=0, show_default=True, help="Keep draining every N seconds (0 drains once).")
+@with_appcontext
+def send_mail_command(interval):
+    """Send the e-mails waiting in the mail outbox."""
+    from extensions import db, mail_outbox
+    while True:
+        stats = mail_outbox.drain()
+        purged = mail_outbox.purge()
+        click.echo(
+            f"Mail outbox: {stats['sent']} sent, {stats['retrying']} retrying, {stats['failed']} failed, "
+            f"{purged} old rows deleted."
+        )
+        if not interval:
+            break
+        db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,306 @@
+"""
+Item-to-item recommendations from list and watched co-occurrence.
+
+Every (user, movie) pair in Watched or in one of the user's lists is an interaction. Two movies
+are similar when the same users hold both: a pair scores the cosine of their user sets
+(co-occurrences / sqrt(users of a x users of b)) plus ``genre_weight`` times the cosine of their
+Movie.genres. The ``top_k`` best neighbors of every movie are stored in MovieNeighbor, so
+/api/recommendations reads the neighbors of a user's movies with one indexed query.
+
+    python -m flask --app app rebuild-recommendations
+    python -m flask --app app rebuild-recommendations --interval 600
+
+Runs are incremental: MovieNeighborState keeps a fingerprint of each movie's user set, and only
+the movies whose set changed, the movies co-occurring with them and the movies that had them as
+a neighbor are recomputed. ``--full`` recomputes every movie. The matrix products use NumPy and
+SciPy sparse matrices when they are installed (pip install -e .[recommender]), plain Python
+otherwise.
+"""
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select, union
+
+from extensions import db
+from models import DEFAULT_LANGUAGE, List, Movie, MovieList, MovieNeighbor, MovieNeighborState, MovieTranslation, Watched, utcnow
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+
+neighbor_table = MovieNeighbor.__table__
+state_table = MovieNeighborState.__table__
+
+MASK_63 = (1 << 63) - 1
+MASK_64 = (1 << 64) - 1
+
+
+def _user_hash(user_id):
+    # splitmix64: a movie's fingerprint is the sum of its users' hashes, so equal sums mean equal sets
+    z = (user_id + 0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
+
+def _genre_ids(genres):
+    return frozenset(genre.get("id") if isinstance(genre, dict) else genre for genre in genres or [])
+
+
+def _genre_cosine(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def _top(scored, top_k):
+    """Best ``top_k`` (tmdb_id, score) pairs, ties broken by the lower tmdb_id."""
+    return heapq.nsmallest(top_k, scored, key=lambda pair: (-pair[1], pair[0]))
+
+
+class _PythonInteractions:
+    def __init__(self, pairs):
+        self.users_of = defaultdict(set)
+        self.items_of = defaultdict(set)
+        for user_id, tmdb_id in pairs:
+            self.users_of[tmdb_id].add(user_id)
+            self.items_of[user_id].add(tmdb_id)
+
+    def fingerprints(self):
+        return {
+            tmdb_id: (sum(_user_hash(user_id) for user_id in users) & MASK_63, len(users))
+            for tmdb_id, users in self.users_of.items()
+        }
+
+    def cooccurring(self, tmdb_ids):
+        return {
+            other for tmdb_id in tmdb_ids for user_id in self.users_of.get(tmdb_id, ())
+            for other in self.items_of[user_id]
+        }
+
+    def neighbors(self, tmdb_ids, genres, top_k, genre_weight, min_cooccurrence):
+        for tmdb_id in tmdb_ids:
+            counts = Counter(
+                other for user_id in self.users_of[tmdb_id] for other in self.items_of[user_id] if other != tmdb_id
+            )
+            degree = len(self.users_of[tmdb_id])
+            scored = [
+                (other, count / math.sqrt(degree * len(self.users_of[other]))
+                 + genre_weight * _genre_cosine(genres.get(tmdb_id), genres.get(other)))
+                for other, count in counts.items() if count >= min_cooccurrence
+            ]
+            yield tmdb_id, _top(scored, top_k)
+
+
+class _SparseInteractions:
+    def __init__(self, pairs):
+        pairs = np.array([(user_id, tmdb_id) for user_id, tmdb_id in pairs], dtype=np.int64).reshape(-1, 2)
+        user_ids, users = np.unique(pairs[:, 0], return_inverse=True)
+        self.item_ids, items = np.unique(pairs[:, 1], return_inverse=True)
+        ones = np.ones(len(pairs), dtype=np.float64)
+        self.matrix = sparse.csr_matrix((ones, (users, items)), shape=(len(user_ids), len(self.item_ids)))
+        self.by_item = self.matrix.T.tocsr()
+        self.degree = np.diff(self.by_item.indptr)
+
+        z = user_ids.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        hashes = z ^ (z >> np.uint64(31))
+        fingerprints = np.zeros(len(self.item_ids), dtype=np.uint64)
+        np.add.at(fingerprints, items, hashes[users])
+        self._fingerprints = fingerprints & np.uint64(MASK_63)
+
+    def _positions(self, tmdb_ids):
+        tmdb_ids = np.fromiter(tmdb_ids, dtype=np.int64)
+        positions = np.searchsorted(self.item_ids, tmdb_ids)
+        found = positions < len(self.item_ids)
+        found[found] = self.item_ids[positions[found]] == tmdb_ids[found]
+        return positions[found]
+
+    def fingerprints(self):
+        return {
+            int(tmdb_id): (int(fingerprint), int(degree))
+            for tmdb_id, fingerprint, degree in zip(self.item_ids, self._fingerprints, self.degree)
+        }
+
+    def cooccurring(self, tmdb_ids):
+        users = np.unique(self.by_item[self._positions(tmdb_ids)].indices)
+        return set(self.item_ids[np.unique(self.matrix[users].indices)].tolist())
+
+    def neighbors(self, tmdb_ids, genres, top_k, genre_weight, min_cooccurrence):
+        positions = self._positions(tmdb_ids)
+        counts = (self.by_item[positions] @ self.matrix).tocsr()  # co-occurrences, one row per movie
+
+        if genre_weight:
+            # Unit genre vectors of every movie involved, so a dot product is the genre cosine
+            involved = np.union1d(positions, counts.indices)
+            row_of = np.full(len(self.item_ids), -1)
+            row_of[involved] = np.arange(len(involved))
+            movie_genres = [genres.get(int(tmdb_id)) or () for tmdb_id in self.item_ids[involved]]
+            columns = {genre_id: column for column, genre_id in enumerate(set().union(*movie_genres))}
+            genre_vectors = np.zeros((len(involved), max(len(columns), 1)))
+            for row, ids in enumerate(movie_genres):
+                for genre_id in ids:
+                    genre_vectors[row, columns[genre_id]] = 1.0 / math.sqrt(len(ids))
+
+        for row, position in enumerate(positions):
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            others, together = counts.indices[start:end], counts.data[start:end]
+            keep = (others != position) & (together >= min_cooccurrence)
+            others, together = others[keep], together[keep]
+            scores = together / np.sqrt(self.degree[position] * self.degree[others])
+            if genre_weight:
+                scores = scores + genre_weight * (genre_vectors[row_of[others]] @ genre_vectors[row_of[position]])
+            if len(scores) > top_k:
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+                best = scores >= threshold
+                others, scores = others[best], scores[best]
+            order = np.lexsort((self.item_ids[others], -scores))[:top_k]
+            yield int(self.item_ids[position]), [
+                (int(tmdb_id), float(score)) for tmdb_id, score in zip(self.item_ids[others[order]], scores[order])
+            ]
+
+
+def interactions():
+    """Distinct (user_id, tmdb_id) pairs from the watched history and every list."""
+    watched = select(Watched.user_id, Watched.tmdb_id)
+    listed = select(List.user_id, MovieList.tmdb_id).join(List, List.id == MovieList.list_id)
+    return db.session.execute(union(watched, listed))
+
+
+def _batches(values, size):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _genres(tmdb_ids, batch_size=1000):
+    genres = {}
+    for batch in _batches(tmdb_ids, batch_size):
+        for tmdb_id, movie_genres in db.session.query(Movie.tmdb_id, Movie.genres).filter(Movie.tmdb_id.in_(batch)):
+            genres[tmdb_id] = _genre_ids(movie_genres)
+    return genres
+
+
+def rebuild(full=False, top_k=20, genre_weight=0.25, min_cooccurrence=1, batch_size=500, use_numpy=None):
+    """
+    Recomputes the MovieNeighbor rows that the interactions added or removed since the last run
+    (every row with ``full``) and commits them batch by batch. Returns counters of the run.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    pairs = interactions()
+    matrix = _SparseInteractions(pairs) if use_numpy else _PythonInteractions(pairs)
+    current = matrix.fingerprints()
+
+    stored = {
+        tmdb_id: (fingerprint, count) for tmdb_id, fingerprint, count in db.session.query(
+            MovieNeighborState.tmdb_id, MovieNeighborState.fingerprint, MovieNeighborState.interactions
+        )
+    }
+    if full:
+        changed = set(current)
+        computed = set(stored) | {tmdb_id for (tmdb_id,) in db.session.query(MovieNeighbor.tmdb_id).distinct()}
+        gone = computed - set(current)
+    else:
+        changed = {tmdb_id for tmdb_id, state in current.items() if stored.get(tmdb_id) != state}
+        gone = set(stored) - set(current)
+
+    affected = changed | matrix.cooccurring(changed)
+    # Movies whose stored neighbors include a changed or removed movie
+    for batch in _batches(changed | gone, batch_size):
+        affected.update(
+            tmdb_id for (tmdb_id,) in
+            db.session.query(MovieNeighbor.tmdb_id).filter(MovieNeighbor.neighbor_id.in_(batch)).distinct()
+        )
+    removed = gone | (affected - set(current))
+    affected &= set(current)
+
+    genres = _genres(affected | matrix.cooccurring(affected)) if genre_weight else {}
+    written = 0
+    for batch in _batches(removed, batch_size):
+        db.session.execute(delete(neighbor_table).where(neighbor_table.c.tmdb_id.in_(batch)))
+    db.session.commit()
+    for batch in _batches(affected, batch_size):
+        rows = [
+            {"tmdb_id": tmdb_id, "neighbor_id": neighbor_id, "score": score}
+            for tmdb_id, neighbors in matrix.neighbors(batch, genres, top_k, genre_weight, min_cooccurrence)
+            for neighbor_id, score in neighbors
+        ]
+        db.session.execute(delete(neighbor_table).where(neighbor_table.c.tmdb_id.in_(batch)))
+        if rows:
+            db.session.execute(insert(neighbor_table), rows)
+        db.session.commit()
+        written += len(rows)
+
+    # Fingerprints are saved last: a run that fails halfway is redone in full by the next one
+    now = utcnow()
+    for batch in _batches(changed | gone, batch_size):
+        db.session.execute(delete(state_table).where(state_table.c.tmdb_id.in_(batch)))
+        states = [
+            {"tmdb_id": tmdb_id, "fingerprint": current[tmdb_id][0], "interactions": current[tmdb_id][1], "computed_at": now}
+            for tmdb_id in batch if tmdb_id in current
+        ]
+        if states:
+            db.session.execute(insert(state_table), states)
+    db.session.commit()
+    return {
+        "movies": len(current), "changed": len(changed), "recomputed": len(affected),
+        "removed": len(gone), "neighbors": written,
+    }
+
+
+def recommend(user_id, limit=20, language=DEFAULT_LANGUAGE):
+    """
+    Movies closest to everything the user watched or listed, excluding those movies (already
+    seen or already saved): the MovieNeighbor scores of the user's movies summed per neighbor,
+    in one query. Returns (score, Movie, MovieTranslation or None) tuples, best first.
+    """
+    watched = select(Watched.tmdb_id).where(Watched.user_id == user_id)
+    seeds = union(watched, select(MovieList.tmdb_id).join(List, List.id == MovieList.list_id).where(List.user_id == user_id))
+    score = func.sum(MovieNeighbor.score).label("score")
+    best = (
+        select(MovieNeighbor.neighbor_id, score)
+        .where(MovieNeighbor.tmdb_id.in_(seeds), MovieNeighbor.neighbor_id.not_in(seeds))
+        .group_by(MovieNeighbor.neighbor_id)
+        .order_by(score.desc(), MovieNeighbor.neighbor_id)
+        .limit(limit)
+        .subquery()
+    )
+    query = (
+        select(best.c.score, Movie, MovieTranslation)
+        .join(Movie, Movie.tmdb_id == best.c.neighbor_id)
+        .outerjoin(MovieTranslation, (MovieTranslation.tmdb_id == Movie.tmdb_id) & (MovieTranslation.language == language))
+        .order_by(best.c.score.desc(), Movie.tmdb_id)
+    )
+    return db.session.execute(query).all()
+
+
+@click.command("rebuild-recommendations")
+@click.option("--full", is_flag=True, help="Recompute every movie instead of only the changed ones.")
+@click.option("--top-k", default=20, show_default=True, help="Neighbors stored per movie.")
+@click.option("--genre-weight", default=0.25, show_default=True, help="Weight of the genre similarity.")
+@click.option("--min-cooccurrence", default=1, show_default=True, help="Users that must hold both movies.")
+@click.option("--interval", default=0, show_default=True, help="Repeat every N seconds (0 runs once).")
+@with_appcontext
+def rebuild_recommendations_command(full, top_k, genre_weight, min_cooccurrence, interval):
+    """Precompute the MovieNeighbor table from lists and watched history."""
+    while True:
+        started = time.perf_counter()
+        stats = rebuild(full, top_k, genre_weight, min_cooccurrence)
+        click.echo(
+            f"Recommendations: {stats['recomputed']} of {stats['movies']} movies recomputed "
+            f"({stats['changed']} changed, {stats['removed']} removed), {stats['neighbors']} neighbors "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
+        if not interval:
+            break
+        full = False
+        db.session.remove()
+        time.sleep(interval)
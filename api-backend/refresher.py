@@ -0,0 +1,147 @@
+"""
+Stale-while-revalidate refresh of stored Movie rows.
+
+Requests keep serving the stored row; when it is older than MOVIE_MAX_AGE_HOURS they only
+``enqueue()`` its id. A daemon thread per worker (started lazily, so it is created after a
+gunicorn fork) drains the queue in batches, deduplicating ids that are already pending or
+being refreshed, and updates the rows (with their translations and stored extras) using
+bulk UPDATEs.
+"""
+import datetime
+import logging
+import os
+import threading
+
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+
+class MovieRefresher:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.max_age = datetime.timedelta(hours=72)
+        self.batch_size = 50
+        self._pending = set()
+        self._in_progress = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("MOVIE_REFRESH_ENABLED", True)
+        self.max_age = datetime.timedelta(hours=app.config.get("MOVIE_MAX_AGE_HOURS", 72))
+        self.batch_size = app.config.get("MOVIE_REFRESH_BATCH_SIZE", 50)
+        app.extensions["movie_refresher"] = self
+
+    def is_stale(self, movie):
+        from models import utcnow
+        return movie.fetched_at is None or utcnow() - movie.fetched_at > self.max_age
+
+    def enqueue(self, tmdb_id):
+        """Schedules a background refresh; cheap and non-blocking, safe to call per request."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if tmdb_id in self._pending or tmdb_id in self._in_progress:
+                return
+            self._pending.add(tmdb_id)
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending) + len(self._in_progress)
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+                return
+            self._thread = threading.Thread(target=self._run, name="movie-refresher", daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _take_batch(self):
+        with self._lock:
+            batch = [self._pending.pop() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_progress.update(batch)
+            if not self._pending:
+                self._wakeup.clear()
+            return batch
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                with self.app.app_context():
+                    self.refresh(batch)
+            except Exception as e:
+                logger.error(f"Error refreshing movies {batch}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._in_progress.difference_update(batch)
+
+    def refresh(self, tmdb_ids):
+        """
+        Re-fetches the given movies from TMDB in every language stored for them, together with
+        their stored append_to_response sections, and updates the rows. Returns the number of
+        movies updated.
+        """
+        from extensions import db, tmdb
+        from models import DEFAULT_LANGUAGE, Movie, MovieExtra, MovieTranslation
+        from utils import (
+            _movie_extra_rows, _movie_values_from_tmdb_details, _translation_values_from_tmdb_details
+        )
+
+        languages = {tmdb_id: {DEFAULT_LANGUAGE} for tmdb_id in tmdb_ids}
+        translated = set(
+            db.session.query(MovieTranslation.tmdb_id, MovieTranslation.language)
+            .filter(MovieTranslation.tmdb_id.in_(tmdb_ids))
+        )
+        sections = {}
+        stored_extras = db.session.query(MovieExtra.tmdb_id, MovieExtra.language, MovieExtra.section).filter(
+            MovieExtra.tmdb_id.in_(tmdb_ids)
+        )
+        for tmdb_id, language, section in stored_extras:
+            sections.setdefault((tmdb_id, language), []).append(section)
+        for tmdb_id, language in translated | set(sections):
+            languages[tmdb_id].add(language)
+
+        keys = [(tmdb_id, language) for tmdb_id in tmdb_ids for language in sorted(languages[tmdb_id])]
+        calls = []
+        for tmdb_id, language in keys:
+            params = {"language": language}
+            if sections.get((tmdb_id, language)):
+                params["append_to_response"] = ",".join(sections[(tmdb_id, language)])
+            calls.append((f"/movie/{tmdb_id}", params))
+        results = tmdb.get_many(calls)
+
+        movie_rows, translation_rows, extra_rows = [], [], []
+        for (tmdb_id, language), details in zip(keys, results):
+            if not details:
+                continue
+            if language == DEFAULT_LANGUAGE:
+                movie_rows.append(_movie_values_from_tmdb_details(details))
+            elif (tmdb_id, language) in translated:
+                translation_rows.append(_translation_values_from_tmdb_details(details, language))
+            extra_rows += _movie_extra_rows(tmdb_id, language, sections.get((tmdb_id, language), []), details)
+        try:
+            for model, rows in ((Movie, movie_rows), (MovieTranslation, translation_rows), (MovieExtra, extra_rows)):
+                if rows:
+                    db.session.execute(update(model), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+        return len(movie_rows)
@@ -0,0 +1,230 @@
+"""
+In-process full-text index over the stored movie catalog, used by /tmdb/search.
+
+Titles are folded to lowercase ASCII ("Ação" -> "acao") and split into words; every word of
+the query must match a title word, and the last one may be a prefix of it, so type-ahead
+queries ("cidade de d") already match. Hits are ranked by exact title, title prefix, then
+rating.
+
+There is one index per language of SEARCH_INDEX_LANGUAGES: Movie titles for DEFAULT_LANGUAGE,
+MovieTranslation titles for the others; other languages are left to TMDB, so user input cannot
+make a worker build and keep an index per code it sees. An index is built the first time its
+language is searched, by a daemon thread per worker (started lazily, so it is created after a
+gunicorn fork) that then rebuilds it every SEARCH_INDEX_REFRESH_INTERVAL seconds when the row
+count or the newest fetched_at changed. Until it is ready ``search()`` returns None and the
+caller falls back to TMDB. Adult titles are not indexed. The index keeps every field of a
+TMDB search result, so searches do not touch the database and stay safe inside the async view.
+"""
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import NamedTuple
+
+from sqlalchemy import func, null
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# A single shorter word only matches whole words: a one letter prefix matches most of the catalog
+MIN_PREFIX_LENGTH = 2
+
+
+def fold(text):
+    """Lowercase, accent-free form of ``text``."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(fold(text))
+
+
+class SearchHits(NamedTuple):
+    results: list  # Best first, shaped like TMDB /search/movie results
+    total: int
+
+
+class _Movie(NamedTuple):
+    title: str
+    original_title: str
+    overview: str
+    poster_path: str
+    release_date: str  # ISO date
+    rating: float
+    genre_ids: tuple
+
+
+class _Index:
+    def __init__(self, rows, signature):
+        self.signature = signature
+        self.titles = {}  # tmdb_id -> folded title, for ranking
+        self.movies = {}  # tmdb_id -> _Movie, to answer without the database
+        self.postings = {}  # word -> set of tmdb_ids
+        for row in rows:
+            tmdb_id, title, poster_path, release_date, rating, adult, original_title, overview, genres, default_genres = row
+            if adult:
+                continue
+            self.titles[tmdb_id] = " ".join(tokenize(title))
+            self.movies[tmdb_id] = _Movie(
+                title, original_title or title, overview or "", poster_path,
+                release_date.isoformat() if release_date else None, rating,
+                tuple(genre["id"] if isinstance(genre, dict) else genre for genre in genres or default_genres or ()),
+            )
+            for word in set(self.titles[tmdb_id].split()):
+                self.postings.setdefault(word, set()).add(tmdb_id)
+        self.vocabulary = sorted(self.postings)
+
+    def _prefixed(self, prefix):
+        ids = set()
+        for word in self.vocabulary[bisect.bisect_left(self.vocabulary, prefix):]:
+            if not word.startswith(prefix):
+                break
+            ids |= self.postings[word]
+        return ids
+
+    def search(self, words, limit):
+        *complete, last = words
+        if complete:
+            # Checking the few titles that contain the other words is cheaper than expanding the prefix
+            matches = sorted((self.postings.get(word, set()) for word in complete), key=len)
+            candidates = set(matches[0]).intersection(*matches[1:])
+            candidates = {
+                tmdb_id for tmdb_id in candidates
+                if any(word.startswith(last) for word in self.titles[tmdb_id].split())
+            }
+        elif len(last) >= MIN_PREFIX_LENGTH:
+            candidates = self._prefixed(last)
+        else:
+            candidates = set(self.postings.get(last, ()))
+        phrase = " ".join(words)
+
+        def rank(tmdb_id):
+            title = self.titles[tmdb_id]
+            return (title == phrase, title.startswith(phrase), self.movies[tmdb_id].rating or 0.0)
+
+        results = []
+        for tmdb_id in heapq.nlargest(limit, candidates, key=rank):
+            movie = self.movies[tmdb_id]
+            results.append({
+                "id": tmdb_id, "title": movie.title, "original_title": movie.original_title,
+                "overview": movie.overview, "poster_path": movie.poster_path, "release_date": movie.release_date,
+                "vote_average": movie.rating, "genre_ids": list(movie.genre_ids), "adult": False,
+            })
+        return SearchHits(results, len(candidates))
+
+
+class MovieSearchIndex:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.refresh_interval = 300.0
+        self.languages = frozenset()  # Languages that may be indexed
+        self._indexes = {}  # language -> _Index
+        self._languages = set()  # Of those, the ones searched in this worker
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("SEARCH_INDEX_ENABLED", True)
+        self.refresh_interval = app.config.get("SEARCH_INDEX_REFRESH_INTERVAL", 300.0)
+        from models import DEFAULT_LANGUAGE
+        self.languages = frozenset(app.config.get("SEARCH_INDEX_LANGUAGES") or (DEFAULT_LANGUAGE,))
+        app.extensions["search_index"] = self
+
+    def search(self, query, language, limit=20):
+        """
+        Returns SearchHits for ``query`` in the stored catalog of ``language``, or None when
+        the index is disabled, ``language`` is not in SEARCH_INDEX_LANGUAGES or its index is
+        not built yet in this worker.
+        """
+        if not self.enabled or language not in self.languages:
+            return None
+        index = self._indexes.get(language)
+        if index is None:
+            with self._lock:
+                self._languages.add(language)
+            self._ensure_thread()
+            self._wakeup.set()
+            return None
+        words = tokenize(query)
+        if not words:
+            return SearchHits([], 0)
+        return index.search(words, limit)
+
+    def _rows(self, language):
+        from extensions import db
+        from models import DEFAULT_LANGUAGE, Movie, MovieTranslation
+        if language == DEFAULT_LANGUAGE:
+            query = db.session.query(
+                Movie.tmdb_id, Movie.title, Movie.poster_path, Movie.release_date, Movie.rating, Movie.adult,
+                Movie.original_title, Movie.overview, Movie.genres, null(),
+            )
+        else:
+            query = (
+                db.session.query(
+                    MovieTranslation.tmdb_id, MovieTranslation.title,
+                    func.coalesce(MovieTranslation.poster_path, Movie.poster_path), Movie.release_date, Movie.rating,
+                    Movie.adult, Movie.original_title, func.coalesce(MovieTranslation.overview, Movie.overview),
+                    MovieTranslation.genres, Movie.genres,
+                )
+                .join(Movie, Movie.tmdb_id == MovieTranslation.tmdb_id)
+                .filter(MovieTranslation.language == language)
+            )
+        return query.yield_per(10000)
+
+    def _signature(self, language):
+        from extensions import db
+        from models import DEFAULT_LANGUAGE, Movie, MovieTranslation
+        model = Movie if language == DEFAULT_LANGUAGE else MovieTranslation
+        query = db.session.query(func.count(), func.max(model.fetched_at))
+        if model is MovieTranslation:
+            query = query.filter(MovieTranslation.language == language)
+        return tuple(query.one())
+
+    def build(self, language):
+        """(Re)builds the index of ``language`` if the stored catalog changed. Returns True if it was rebuilt."""
+        signature = self._signature(language)
+        current = self._indexes.get(language)
+        if current is not None and current.signature == signature:
+            return False
+        started = time.perf_counter()
+        index = _Index(self._rows(language), signature)
+        self._indexes[language] = index
+        logger.info(
+            f"Search index for {language}: {len(index.titles)} titles, {len(index.vocabulary)} words "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return True
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+                return
+            self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+            with self._lock:
+                languages = sorted(self._languages)
+            for language in languages:
+                try:
+                    with self.app.app_context():
+                        self.build(language)
+                except Exception as e:
+                    logger.error(f"Error building the {language} search index: {str(e)}")
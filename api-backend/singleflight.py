@@ -0,0 +1,51 @@
+"""
+In-flight call deduplication ("singleflight").
+
+When several threads ask for the same key at the same time, only the first one runs the
+function; the others wait for it and receive the same result (or exception). Deduplication
+is per process: separate gunicorn workers may still run the function once each, so the
+function itself must be idempotent.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Runs ``fn()`` unless a call for ``key`` is already in flight, then returns its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the api-backend modules (app, extensions, utils, ...) importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+
+import pytest
+import requests
+from flask import Flask
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("a2wsgi")
+
+from api.health_check_routes import health_check_bp
+from api.tmdb_proxy_routes import tmdb_proxy_bp
+from async_proxy import AsyncProxyApp
+from benchmarks.tmdb_stub import TMDBStubServer
+from extensions import db, response_cache, tmdb, tmdb_async
+from tmdb_client import AsyncTMDBClient
+
+
+@pytest.fixture
+def stub():
+    with TMDBStubServer() as server:
+        yield server
+
+
+def test_async_client_multiplexes_calls_and_raises_requests_errors(stub):
+    client = AsyncTMDBClient()
+    client.configure(api_key="test", base_url=stub.base_url, backoff_base=0.001, backoff_max=0.01)
+    stub.latency = 0.2
+
+    async def run():
+        try:
+            started = time.perf_counter()
+            results = await client.get_many([(f"/movie/{i}", {"language": "pt-BR"}) for i in range(1, 41)])
+            elapsed = time.perf_counter() - started
+            stub.queue_statuses(503, 503, 503)
+            with pytest.raises(requests.exceptions.HTTPError):
+                await client.get("/movie/1")
+            return results, elapsed
+        finally:
+            await client.aclose()
+
+    results, elapsed = asyncio.run(run())
+    assert [movie["id"] for movie in results] == list(range(1, 41))
+    # 40 calls of 200 ms, 8 at a time
+    assert elapsed < 1.5
+    assert stub.requests["/3/movie/1"] == 4
+
+
+async def _call(app, path, query_string=b""):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query_string, "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+    }
+    await app(scope, receive, send)
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return messages[0]["status"], json.loads(body)
+
+
+def test_proxy_routes_are_served_natively_and_the_rest_through_wsgi(stub, monkeypatch):
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://", TMDB_API_KEY="test", TMDB_BASE_URL=stub.base_url, TMDB_CACHE_BACKEND="none"
+    )
+    db.init_app(flask_app)
+    flask_app.register_blueprint(tmdb_proxy_bp)
+    flask_app.register_blueprint(health_check_bp)
+    response_cache.init_app(flask_app)
+    tmdb.init_app(flask_app)
+    tmdb_async.init_app(flask_app)
+    # The sync client must not be used by the async views
+    monkeypatch.setattr(tmdb, "get", None)
+    app = AsyncProxyApp(flask_app, wsgi_threads=2)
+
+    async def run():
+        try:
+            return (
+                await _call(app, "/tmdb/search", b"query=matrix"),
+                await _call(app, "/tmdb/search"),
+                await _call(app, "/health/live"),
+                await _call(app, "/tmdb/cache/stats"),
+            )
+        finally:
+            await tmdb_async.aclose()
+
+    search, missing_query, health, stats = asyncio.run(run())
+    assert search[0] == 200 and len(search[1]["results"]) == 10
+    assert missing_query == (400, {"error": "Search query is required"})
+    assert health == (200, {"status": "ok"})
+    assert stats[0] == 200 and stats[1]["backend"] == "none"
+    assert stub.requests["/3/search/movie"] == 1
+
+
+def test_async_proxy_passes_tmdb_404_through(stub):
+    flask_app = Flask(__name__)
+    flask_app.config.update(TMDB_API_KEY="test", TMDB_BASE_URL=stub.base_url, TMDB_CACHE_BACKEND="none", TMDB_MAX_RETRIES=0)
+    flask_app.register_blueprint(tmdb_proxy_bp)
+    response_cache.init_app(flask_app)
+    tmdb_async.init_app(flask_app)
+    app = AsyncProxyApp(flask_app, wsgi_threads=1)
+
+    async def run():
+        try:
+            return await _call(app, "/tmdb/movie/999999/credits")
+        finally:
+            await tmdb_async.aclose()
+
+    stub.queue_statuses(404)
+    assert asyncio.run(run()) == (404, {"error": "Not found on TMDB"})
+    assert tmdb_async.breaker.state == tmdb_async.breaker.CLOSED
@@ -0,0 +1,91 @@
+import os
+import time
+
+from flask import Flask
+
+from api.tmdb_proxy_routes import tmdb_proxy_bp
+from benchmarks.tmdb_stub import TMDBStubServer
+from cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, make_key, parse_ttls
+from extensions import response_cache, tmdb
+
+
+def test_make_key_normalizes_params():
+    a = make_key("search", "/search/movie", {"query": " The  Matrix ", "page": "1", "api_key": "secret"})
+    b = make_key("search", "/search/movie", {"page": 1, "query": "the matrix"})
+    assert a == b
+    assert "secret" not in a
+    assert make_key("credits", "/movie/550/credits") != make_key("credits", "/movie/13/credits")
+
+
+def test_parse_ttls_ignores_invalid_entries():
+    assert parse_ttls("popular=60, search=abc,genres=10") == {"popular": 60, "genres": 10}
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    backend.get("a")
+    backend.set("c", 3, 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+
+
+def test_memory_backend_expires_entries():
+    backend = MemoryCacheBackend()
+    backend.set("a", 1, 0.01)
+    time.sleep(0.02)
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_is_shared_and_bounded(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = SQLiteCacheBackend(path, max_entries=2)
+    reader = SQLiteCacheBackend(path, max_entries=2)
+    writer.set("a", {"results": [1]}, 60)
+    writer.set("b", {"results": [2]}, 60)
+    assert reader.get("a") == {"results": [1]}
+    writer.set("c", {"results": [3]}, 60)
+    assert len(reader) == 2
+    assert reader.get("b") is None
+
+
+def test_sqlite_backend_reconnects_after_fork(tmp_path, monkeypatch):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    backend.set("a", 1, 60)
+    parent_connection = backend._connection()
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert backend._connection() is not parent_connection
+    assert backend.get("a") == 1
+
+
+def test_response_cache_counts_hits_and_misses():
+    cache = ResponseCache()
+    cache.backend = MemoryCacheBackend()
+    params = {"language": "pt-BR", "page": 1}
+    assert cache.get("popular", "/discover/movie", params) is None
+    cache.set("popular", "/discover/movie", params, {"results": []})
+    assert cache.get("popular", "/discover/movie", params) == {"results": []}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["routes"]["popular"] == {"hits": 1, "misses": 1, "stale": 0}
+
+
+def test_per_movie_routes_are_cached_per_movie():
+    app = Flask(__name__)
+    app.register_blueprint(tmdb_proxy_bp)
+    with TMDBStubServer() as stub:
+        app.config.update(TMDB_API_KEY="test", TMDB_BASE_URL=stub.base_url)
+        response_cache.init_app(app)
+        tmdb.init_app(app)
+        client = app.test_client()
+        try:
+            assert client.get("/tmdb/movie/550/credits").get_json()["id"] == 550
+            assert client.get("/tmdb/movie/13/credits").get_json()["id"] == 13
+            assert client.get("/tmdb/movie/550/credits").get_json()["id"] == 550
+            assert stub.requests["/3/movie/550/credits"] == 1
+            assert stub.requests["/3/movie/13/credits"] == 1
+        finally:
+            response_cache.clear()
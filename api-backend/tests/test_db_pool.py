@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from db_pool import TimedQueuePool, engine_options, ping, pool_stats
+
+
+def test_engine_options_skip_in_memory_sqlite():
+    assert engine_options("sqlite://", {}) == {}
+    options = engine_options("mysql+pymysql://u:p@db/meus_filmes", {"DB_POOL_SIZE": 3})
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_size"] == 3
+    assert options["pool_pre_ping"] is True
+
+
+def test_pool_stats_count_checkouts_and_timeouts(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **engine_options(url, {"DB_POOL_SIZE": 1, "DB_MAX_OVERFLOW": 0, "DB_POOL_TIMEOUT": 0.05}))
+    assert ping(engine)[0] is True
+    with engine.connect():
+        assert pool_stats(engine)["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    stats = pool_stats(engine)
+    assert stats["pool_class"] == "TimedQueuePool"
+    assert (stats["checkouts"], stats["connects"], stats["timeouts"], stats["checked_out"]) == (3, 1, 1, 0)
+    assert stats["wait_time_max_ms"] >= 50
+
+
+def test_ping_reports_unreachable_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'db.sqlite'}")
+    reachable, error, _ = ping(engine)
+    assert reachable is False
+    assert "unable to open database file" in error
@@ -0,0 +1,127 @@
+import pytest
+import requests
+from flask import Flask
+
+from api.health_check_routes import health_check_bp
+from db_pool import engine_options
+from extensions import db, metrics, tmdb, tmdb_health
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'health.db'}"
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=url, TMDB_API_KEY="test",
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options(url, {"DB_POOL_SIZE": 1, "DB_MAX_OVERFLOW": 0, "DB_POOL_TIMEOUT": 5}),
+    )
+    db.init_app(app)
+    tmdb_health.init_app(app)
+    app.register_blueprint(health_check_bp)
+    # No background thread: the tests run the TMDB checks themselves
+    monkeypatch.setattr(tmdb_health, "_ensure_thread", lambda: None)
+    monkeypatch.setattr(tmdb_health, "_result", None)
+    return app
+
+
+def _tmdb_calls(monkeypatch, error=None):
+    calls = []
+
+    def get(path, params=None):
+        calls.append(path)
+        if error:
+            raise error
+        return {}
+
+    monkeypatch.setattr(tmdb, "get", get)
+    return calls
+
+
+def test_ready_reports_the_last_tmdb_check_without_calling_tmdb(app, monkeypatch):
+    calls = _tmdb_calls(monkeypatch)
+    client = app.test_client()
+    assert client.get("/health/live").get_json() == {"status": "ok"}
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.get_json()["tmdb_reachable"] is None
+
+    tmdb_health.probe()
+    assert client.get("/health").get_json() == {
+        "status": "ok", "message": "API is healthy", "database_reachable": True, "tmdb_reachable": True,
+    }
+    assert calls == ["/configuration"]
+
+    _tmdb_calls(monkeypatch, requests.exceptions.ConnectionError("down"))
+    tmdb_health.probe()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "degraded"
+    assert response.get_json()["tmdb_reachable"] is False
+
+
+def test_ready_fails_fast_when_the_pool_is_exhausted(app, monkeypatch):
+    _tmdb_calls(monkeypatch)
+    client = app.test_client()
+    with app.app_context(), db.engine.connect():
+        response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.get_json()["message"] == "Database connection pool is exhausted"
+    assert client.get("/health/ready").status_code == 200
+
+
+def test_details_report_latency_of_each_dependency(app, monkeypatch):
+    calls = _tmdb_calls(monkeypatch)
+    client = app.test_client()
+    body = client.get("/health/details").get_json()
+    assert body["database"]["reachable"] is True and body["database"]["ping_ms"] >= 0
+    assert body["database"]["pool"]["size"] == 1
+    assert body["tmdb"]["reachable"] is None and calls == []
+
+    body = client.get("/health/details?refresh=true").get_json()
+    assert body["tmdb"]["reachable"] is True and body["tmdb"]["latency_ms"] >= 0
+    assert body["tmdb"]["age_seconds"] >= 0
+    assert calls == ["/configuration"]
+
+
+def test_database_health_requires_the_metrics_token_and_hides_driver_errors(app, monkeypatch):
+    monkeypatch.setattr(metrics, "token", "secret")
+    client = app.test_client()
+    assert client.get("/health/db").status_code == 401
+    assert client.get("/health/db", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/health/db", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200 and response.get_json()["database_reachable"] is True
+
+    monkeypatch.setattr("api.health_check_routes.ping", lambda engine: (False, "access denied for user 'root'@'db'", None))
+    response = client.get("/health/db", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 503
+    assert response.get_json()["error"] == "Database is not reachable"
+    ready = client.get("/health/ready").get_json()
+    assert ready["message"] == "Database is not reachable"
+
+
+def test_details_and_cache_stats_require_the_metrics_token(app, monkeypatch):
+    from api.tmdb_proxy_routes import tmdb_proxy_bp
+    from extensions import response_cache
+
+    app.config["TMDB_CACHE_BACKEND"] = "none"
+    response_cache.init_app(app)
+    app.register_blueprint(tmdb_proxy_bp)
+    _tmdb_calls(monkeypatch)
+    monkeypatch.setattr(metrics, "token", "secret")
+    client = app.test_client()
+    for path in ("/health/details", "/tmdb/cache/stats"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers={"Authorization": "Bearer secret"}).status_code == 200
+    # The public probes stay open
+    assert client.get("/health/ready").status_code == 200
+
+
+def test_tmdb_errors_do_not_leak_the_api_key(app, monkeypatch):
+    monkeypatch.setattr(tmdb, "api_key", "k3y")
+    _tmdb_calls(monkeypatch, requests.exceptions.HTTPError("503 Server Error for url: /3/configuration?api_key=k3y"))
+    tmdb_health.probe()
+    client = app.test_client()
+    assert client.get("/health/ready").get_json()["message"] == "TMDB API is not reachable"
+    error = client.get("/health/details").get_json()["tmdb"]["error"]
+    assert "k3y" not in error and "api_key=***" in error
@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+from flask import Flask
+
+from api.list_routes import MAX_BULK_CHANGES, lists_bp
+from extensions import auth_tokens, db, tmdb
+from models import List, Movie, MovieList, User
+
+UNAVAILABLE_ID = 99  # TMDB cannot return it
+SHAPE_ERROR = "add and remove must be lists of TMDB IDs, move a list of {tmdb_id, to_list_id}"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SECRET_KEY="test-secret-key-with-enough-bytes!")
+    db.init_app(app)
+    auth_tokens.init_app(app)
+    app.register_blueprint(lists_bp)
+    monkeypatch.setattr(tmdb, "api_key", "test")
+    monkeypatch.setattr(tmdb, "get_many", lambda calls: [
+        None if path == f"/movie/{UNAVAILABLE_ID}" else {"id": int(path.rsplit("/", 1)[1]), "title": path}
+        for path, params in calls
+    ])
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            User(id=1, name="a", email="a@example.com", password="x"),
+            User(id=2, name="b", email="b@example.com", password="x"),
+            List(id="main", name="Main", user_id=1),
+            List(id="other", name="Other", user_id=1),
+            List(id="foreign", name="Foreign", user_id=2),
+            Movie(tmdb_id=1, title="One"),
+            Movie(tmdb_id=2, title="Two"),
+        ])
+        db.session.add_all(MovieList(list_id="main", tmdb_id=tmdb_id) for tmdb_id in (1, 2, 3))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    token = auth_tokens.issue(db.session.get(User, 1), datetime.timedelta(hours=1))
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def movies(list_id):
+    return sorted(tmdb_id for (tmdb_id,) in db.session.query(MovieList.tmdb_id).filter_by(list_id=list_id))
+
+
+def test_add_remove_and_move_in_one_request(client):
+    response = client.patch("/lists/main/movies", json={
+        "add": [4, 1, 4, UNAVAILABLE_ID],
+        "remove": [2, 5],
+        "move": [{"tmdb_id": 3, "to_list_id": "other"}, {"tmdb_id": 6, "to_list_id": "other"}],
+    })
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "msg": "List updated",
+        "added": [4],
+        "already_in_list": [1],
+        "unavailable": [UNAVAILABLE_ID],
+        "removed": [2],
+        "moved": [{"tmdb_id": 3, "to_list_id": "other"}],
+        "not_in_list": [5, 6],
+    }
+    assert movies("main") == [1, 4]
+    assert movies("other") == [3]
+    assert db.session.get(Movie, 4) is not None
+
+
+def test_lists_of_other_users_are_not_touched(client):
+    for list_id, move_to in (("foreign", "other"), ("main", "foreign"), ("main", "missing")):
+        response = client.patch(f"/lists/{list_id}/movies", json={"move": [{"tmdb_id": 1, "to_list_id": move_to}]})
+        assert response.status_code == 404
+    assert movies("main") == [1, 2, 3]
+
+
+@pytest.mark.parametrize("payload, error", [
+    ([1, 2], "Expected a JSON object with add, remove and/or move"),
+    ({}, "Nothing to change"),
+    ({"add": "1"}, SHAPE_ERROR),
+    ({"remove": ["x"]}, SHAPE_ERROR),
+    ({"move": [{"tmdb_id": 1}]}, SHAPE_ERROR),
+    ({"move": [{"tmdb_id": 1, "to_list_id": 7}]}, SHAPE_ERROR),
+    ({"add": [1], "remove": [1]}, "A movie can only appear in one of add, remove or move"),
+    ({"move": [{"tmdb_id": 1, "to_list_id": "main"}]}, "A movie cannot be moved to the list it is already in"),
+    ({"move": [{"tmdb_id": 1, "to_list_id": "other"}, {"tmdb_id": 1, "to_list_id": "foreign"}]},
+     "A movie can only be moved to one list"),
+    ({"add": list(range(MAX_BULK_CHANGES + 1))}, f"At most {MAX_BULK_CHANGES} changes can be sent at once"),
+])
+def test_malformed_payloads_are_rejected(client, payload, error):
+    response = client.patch("/lists/main/movies", json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {"msg": error}
+    assert movies("main") == [1, 2, 3]
+
+
+def test_repeated_moves_to_the_same_list_count_once(client):
+    response = client.patch("/lists/main/movies", json={"move": [
+        {"tmdb_id": 1, "to_list_id": "other"}, {"tmdb_id": 1, "to_list_id": "other"}
+    ]})
+    assert response.get_json()["moved"] == [{"tmdb_id": 1, "to_list_id": "other"}]
+    assert (movies("main"), movies("other")) == ([2, 3], [1])
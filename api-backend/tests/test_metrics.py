@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import requests
+from flask import Flask
+
+from extensions import db
+from metrics import REGISTRY, Metrics, route_template
+from models import Movie
+from tmdb_client import TMDBClient
+from utils import _save_movie_details_if_not_exist
+
+
+@pytest.fixture
+def app(tmp_path):
+    REGISTRY.clear()
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", METRICS_DIR=str(tmp_path / "metrics"))
+    db.init_app(app)
+    app.extensions["metrics"] = Metrics(app)
+
+    @app.route("/movies/<int:tmdb_id>")
+    def movie(tmdb_id):
+        # One query per id: the N+1 the per-request query count should reveal
+        return {"titles": [db.session.get(Movie, i) and db.session.get(Movie, i).title for i in range(tmdb_id)]}
+
+    @app.route("/metrics")
+    def serve_metrics():
+        return app.extensions["metrics"].render()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Movie(tmdb_id=1, title="A"))
+        db.session.commit()
+    yield app
+    REGISTRY.clear()
+
+
+def sample(text, line):
+    return next(float(row.rsplit(" ", 1)[1]) for row in text.splitlines() if row.startswith(line + " "))
+
+
+def test_requests_are_timed_per_endpoint_with_their_query_counts(app):
+    client = app.test_client()
+    client.get("/movies/3")
+    client.get("/movies/3")
+    client.get("/nope")
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert sample(text, 'http_requests_total{endpoint="movie",method="GET",status="200"}') == 2
+    assert sample(text, 'http_requests_total{endpoint="unmatched",method="GET",status="404"}') == 1
+    assert sample(text, 'http_request_duration_seconds_count{endpoint="movie",method="GET"}') == 2
+    # 3 lookups, the stored one twice: 4 statements per request, 8 in total
+    assert sample(text, 'http_request_db_queries_sum{endpoint="movie"}') == 8
+    assert sample(text, 'http_request_db_queries_bucket{endpoint="movie",le="3.0"}') == 0
+    assert sample(text, 'http_request_db_queries_bucket{endpoint="movie",le="5.0"}') == 2
+    assert "# TYPE http_request_duration_seconds histogram" in text
+
+
+def test_tmdb_attempts_and_stored_movie_lookups(app, monkeypatch):
+    assert route_template("/movie/550/credits") == "/movie/{id}/credits"
+    client = TMDBClient()
+    client.configure(api_key="test", max_retries=1, backoff_base=0)
+    responses = iter([requests.exceptions.ConnectTimeout("slow"), _response(200, {"id": 2, "title": "B"})])
+
+    def get(url, **kwargs):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(client.session, "get", get)
+    monkeypatch.setattr("utils.tmdb", client)
+    with app.app_context():
+        assert _save_movie_details_if_not_exist(1).title == "A"
+        assert _save_movie_details_if_not_exist(2).title == "B"
+    text = app.test_client().get("/metrics").get_data(as_text=True)
+
+    assert sample(text, 'tmdb_requests_total{route="/movie/{id}",status="timeout"}') == 1
+    assert sample(text, 'tmdb_requests_total{route="/movie/{id}",status="200"}') == 1
+    assert sample(text, 'tmdb_request_duration_seconds_count{route="/movie/{id}"}') == 2
+    assert sample(text, 'movie_store_lookups_total{result="hit"}') == 1
+    assert sample(text, 'movie_store_lookups_total{result="fetched"}') == 1
+
+
+def test_worker_files_are_added_up_and_retired(app, tmp_path):
+    worker = app.extensions["metrics"]
+    app.test_client().get("/movies/1")
+    worker.flush()
+    # Another worker's file
+    (tmp_path / "metrics" / "worker-1-1.json").write_text(
+        '{"http_requests_total": [[["movie", "GET", "200"], 4]]}'
+    )
+    assert sample(worker.render(), 'http_requests_total{endpoint="movie",method="GET",status="200"}') == 5
+
+    worker.retire()
+    assert sorted(path.name for path in (tmp_path / "metrics").glob("*.json")) == ["retired.json", "worker-1-1.json"]
+    assert sample(worker.render(), 'http_requests_total{endpoint="movie",method="GET",status="200"}') == 5
+
+
+def _response(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    return response
@@ -0,0 +1,104 @@
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from extensions import db
+from migrations import upgrade
+from models import Movie, MovieList, Watched, WatchedSummary
+from utils import _insert_ignore
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'legacy.sqlite3'}")
+    db.init_app(app)
+    with app.app_context():
+        yield app
+
+
+def _legacy_database_with_duplicates():
+    """The current schema minus the unique indexes, as databases created before them look"""
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_movie_list_list_tmdb"))
+        conn.execute(text("DROP INDEX uq_watched_user_tmdb"))
+        conn.execute(text(
+            "INSERT INTO movie_list (id, list_id, tmdb_id) VALUES (1, 'a', 10), (2, 'a', 10), (3, 'a', 11), (4, 'b', 10)"
+        ))
+        conn.execute(text(
+            "INSERT INTO watched (id, user_id, tmdb_id, watched_at) VALUES "
+            "(1, 1, 10, '2024-01-05 00:00:00'), (2, 1, 10, '2024-02-05 00:00:00'), (3, 1, 11, '2024-02-06 00:00:00')"
+        ))
+
+
+def test_upgrade_drops_duplicates_before_building_unique_indexes(app):
+    _legacy_database_with_duplicates()
+    upgrade()
+    upgrade()  # Idempotent
+
+    assert sorted((row.id, row.list_id, row.tmdb_id) for row in MovieList.query) == [
+        (1, "a", 10), (3, "a", 11), (4, "b", 10)
+    ]
+    # The oldest watched entry of a duplicated movie is kept
+    assert [(row.id, row.watched_at.month) for row in Watched.query.order_by(Watched.id)] == [(1, 1), (3, 2)]
+    indexes = {index["name"]: index["unique"] for index in inspect(db.engine).get_indexes("watched")}
+    assert indexes["uq_watched_user_tmdb"]
+    assert "uq_movie_list_list_tmdb" in {index["name"] for index in inspect(db.engine).get_indexes("movie_list")}
+    # The summary backfill runs after the cleanup
+    assert db.session.get(WatchedSummary, (1, "total", "")).count == 2
+
+
+def test_insert_ignore_skips_existing_rows(app):
+    db.create_all()
+    db.session.add(Movie(tmdb_id=1, title="Stored"))
+    db.session.commit()
+    rows = [{"tmdb_id": 1, "title": "Duplicate"}, {"tmdb_id": 2, "title": "New"}]
+    assert _insert_ignore(Movie, rows) == 1
+    assert _insert_ignore(Movie, [{"tmdb_id": 2, "title": "Again"}]) == 0
+    db.session.commit()
+    assert [(movie.tmdb_id, movie.title) for movie in Movie.query.order_by(Movie.tmdb_id)] == [(1, "Stored"), (2, "New")]
+
+
+def test_insert_ignore_falls_back_to_savepoints_on_other_dialects(app, monkeypatch):
+    db.create_all()
+    db.session.add(Movie(tmdb_id=1, title="Stored"))
+    db.session.commit()
+    monkeypatch.setattr(db.engine.dialect, "name", "oracle")
+    rows = [{"tmdb_id": 1, "title": "Duplicate"}, {"tmdb_id": 2, "title": "New"}, {"tmdb_id": 3, "title": "Newer"}]
+    assert _insert_ignore(Movie, rows) == 2
+    db.session.commit()
+    assert [movie.title for movie in Movie.query.order_by(Movie.tmdb_id)] == ["Stored", "New", "Newer"]
+
+
+def test_insert_ignore_uses_insert_ignore_on_mysql(app, monkeypatch):
+    from sqlalchemy.dialects import mysql
+
+    db.create_all()
+    executed = []
+
+    class Result:
+        rowcount = 2
+
+    monkeypatch.setattr(db.engine.dialect, "name", "mysql")
+    monkeypatch.setattr(db.session, "execute", lambda stmt, rows: executed.append((stmt, rows)) or Result())
+    rows = [{"tmdb_id": 1, "title": "A"}, {"tmdb_id": 2, "title": "B"}]
+    assert _insert_ignore(Movie, rows) == 2
+    stmt, executed_rows = executed[0]
+    assert str(stmt.compile(dialect=mysql.dialect())).startswith("INSERT IGNORE INTO movie")
+    assert executed_rows == rows
+
+
+def test_upgrade_adds_the_counted_movie_fields_to_watched(app):
+    db.create_all()
+    db.session.add(Movie(tmdb_id=10, title="A", rating=7.0, genres=[{"id": 18, "name": "Drama"}]))
+    db.session.commit()
+    with db.engine.begin() as conn:
+        for column in ("movie_rating", "movie_release_date", "movie_genres"):
+            conn.execute(text(f"ALTER TABLE watched DROP COLUMN {column}"))
+        conn.execute(text("INSERT INTO watched (id, user_id, tmdb_id, watched_at) VALUES (1, 1, 10, '2024-01-05 00:00:00')"))
+    upgrade()
+
+    watched = db.session.get(Watched, 1)
+    assert (watched.movie_rating, watched.movie_genres) == (7.0, [{"id": 18, "name": "Drama"}])
+    assert db.session.get(WatchedSummary, (1, "genre", "18")).rating_sum == 7.0
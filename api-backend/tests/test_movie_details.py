@@ -0,0 +1,120 @@
+import pytest
+import requests
+from flask import Flask
+
+from api.tmdb_proxy_routes import MAX_BATCH_SIZE, tmdb_proxy_bp
+from benchmarks.tmdb_stub import movie_payload
+from extensions import db, movie_refresher, response_cache, tmdb
+from models import Movie, MovieExtra, MovieTranslation, utcnow
+
+MISSING_ID = 9  # TMDB answers 404 for it
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", TMDB_API_KEY="test", TMDB_CACHE_BACKEND="none")
+    db.init_app(app)
+    response_cache.init_app(app)
+    movie_refresher.init_app(app)
+    app.register_blueprint(tmdb_proxy_bp)
+    monkeypatch.setattr(tmdb, "api_key", "test")
+    monkeypatch.setattr(movie_refresher, "_ensure_thread", lambda: None)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Movie(tmdb_id=1, title="Stored", fetched_at=utcnow()))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def tmdb_calls(monkeypatch):
+    """Answers TMDB GETs with stub payloads and records (path, language, append_to_response)"""
+    calls = []
+
+    def get(path, params=None):
+        calls.append((path, (params or {}).get("language"), (params or {}).get("append_to_response")))
+        tmdb_id = int(path.rsplit("/", 1)[1])
+        if tmdb_id == MISSING_ID:
+            raise requests.exceptions.HTTPError(f"404 for {path}")
+        body = movie_payload(tmdb_id, (params or {}).get("language", "pt-BR"))
+        for section in filter(None, (params or {}).get("append_to_response", "").split(",")):
+            body[section] = {"results": [section]}
+        return body
+
+    monkeypatch.setattr(tmdb, "get", get)
+    return calls
+
+
+def test_batch_fills_misses_from_tmdb_in_request_order(app, tmdb_calls):
+    response = app.test_client().post("/tmdb/movies/batch", json={"ids": [2, 1, MISSING_ID, "2", 1]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [movie["id"] for movie in body["movies"]] == [2, 1]
+    assert body["movies"][1]["title"] == "Stored"
+    assert body["missing"] == [MISSING_ID]
+    # Stored and duplicated ids are not fetched again
+    assert sorted(tmdb_calls) == [("/movie/2", "pt-BR", None), ("/movie/9", "pt-BR", None)]
+    assert db.session.get(Movie, 2).title == "Filme 2"
+
+
+def test_batch_rejects_invalid_payloads(app, tmdb_calls):
+    client = app.test_client()
+    for payload in ({}, {"ids": []}, {"ids": "1,2"}, {"ids": [1, "x"]}, {"ids": [1, None]}):
+        response = client.post("/tmdb/movies/batch", json=payload)
+        assert response.status_code == 400, payload
+    response = client.post("/tmdb/movies/batch", json={"ids": [1], "language": "portuguese"})
+    assert response.status_code == 400
+    assert tmdb_calls == []
+
+
+def test_batch_size_limit_counts_distinct_ids(app, tmdb_calls):
+    client = app.test_client()
+    too_many = client.post("/tmdb/movies/batch", json={"ids": list(range(1, MAX_BATCH_SIZE + 2))})
+    assert too_many.status_code == 400
+    assert tmdb_calls == []
+    duplicated = client.post("/tmdb/movies/batch", json={"ids": [1] * (MAX_BATCH_SIZE + 1)})
+    assert duplicated.status_code == 200
+    assert [movie["id"] for movie in duplicated.get_json()["movies"]] == [1]
+
+
+def test_append_to_response_fetches_only_sections_not_stored(app, tmdb_calls):
+    client = app.test_client()
+    first = client.get("/tmdb/movie/1?append_to_response=videos").get_json()
+    assert (first["title"], first["videos"]) == ("Stored", {"results": ["videos"]})
+    assert db.session.get(MovieExtra, (1, "pt-BR", "videos")).payload == {"results": ["videos"]}
+
+    both = client.get("/tmdb/movie/1?append_to_response=videos,credits").get_json()
+    assert (both["videos"], both["credits"]) == ({"results": ["videos"]}, {"results": ["credits"]})
+    client.get("/tmdb/movie/1?append_to_response=credits,videos")
+    assert tmdb_calls == [("/movie/1", "pt-BR", "videos"), ("/movie/1", "pt-BR", "credits")]
+
+
+def test_translations_are_stored_and_fall_back_to_the_default_language(app, tmdb_calls, monkeypatch):
+    client = app.test_client()
+    english = client.get("/tmdb/movie/2?language=en-US").get_json()
+    assert (english["title"], english["overview"]) == ("Movie 2", "Sinopse do filme 2 (en-US).")
+    client.get("/tmdb/movie/2?language=en-US")
+    assert [call[:2] for call in tmdb_calls] == [("/movie/2", "pt-BR"), ("/movie/2", "en-US")]
+    assert db.session.get(MovieTranslation, (2, "en-US")).title == "Movie 2"
+
+    # TMDB cannot provide the translation: the stored default-language fields are served
+    def unreachable(path, params=None):
+        raise requests.exceptions.ConnectionError("down")
+
+    monkeypatch.setattr(tmdb, "get", unreachable)
+    german = client.get("/tmdb/movie/1?language=de-DE")
+    assert german.status_code == 200
+    assert german.get_json()["title"] == "Stored"
+    assert db.session.get(MovieTranslation, (1, "de-DE")) is None
+
+
+def test_batch_serves_translations_with_default_fields_as_fallback(app, tmdb_calls):
+    db.session.add(MovieTranslation(tmdb_id=1, language="en-US", title="Stored in English"))
+    db.session.get(Movie, 1).poster_path = "/stored.jpg"
+    db.session.commit()
+    movies = app.test_client().post("/tmdb/movies/batch", json={"ids": [1, 2], "language": "en-US"}).get_json()["movies"]
+    assert [movie["title"] for movie in movies] == ["Stored in English", "Movie 2"]
+    # No localized poster: the default-language one
+    assert [movie["poster_path"] for movie in movies] == ["/stored.jpg", "/poster2.jpg"]
+    assert ("/movie/1", "en-US", None) not in tmdb_calls
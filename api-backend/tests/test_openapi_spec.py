@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+
+import pytest
+from flask import Flask, request
+
+import openapi_spec
+from openapi_spec import OpenAPISpec
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "openapi.yaml").write_text("openapi: 3.0.0\ninfo:\n  title: Meus Filmes\n")
+    (tmp_path / "docs" / "health.yaml").write_text("health_check: {}\n")
+    app = Flask(__name__, root_path=str(tmp_path))
+    spec = OpenAPISpec(app)
+    app.add_url_rule("/spec.json", "spec", lambda: spec.response(request))
+    resolved = []
+    real_resolve = openapi_spec.resolve
+    monkeypatch.setattr(openapi_spec, "resolve", lambda path: resolved.append(path) or real_resolve(path))
+    app.resolved = resolved
+    return app
+
+
+def _touch_later(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+def test_spec_is_resolved_once_and_rebuilt_when_a_source_changes(app, tmp_path):
+    client = app.test_client()
+    first = client.get("/spec.json")
+    assert first.status_code == 200
+    assert first.get_json()["info"]["title"] == "Meus Filmes"
+    assert first.headers["Cache-Control"] == "public, max-age=300"
+    assert client.get("/spec.json").get_data() == first.get_data()
+    assert len(app.resolved) == 1
+
+    (tmp_path / "openapi.yaml").write_text("openapi: 3.0.0\ninfo:\n  title: Changed\n")
+    _touch_later(tmp_path / "openapi.yaml")
+    changed = client.get("/spec.json")
+    assert changed.get_json()["info"]["title"] == "Changed"
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert len(app.resolved) == 2
+
+
+def test_etag_revalidation_and_gzip(app):
+    client = app.test_client()
+    plain = client.get("/spec.json")
+    assert client.get("/spec.json", headers={"If-None-Match": plain.headers["ETag"]}).status_code == 304
+
+    gzipped = client.get("/spec.json", headers={"Accept-Encoding": "gzip, deflate"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(gzipped.get_data())) == plain.get_json()
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+
+
+def test_fresh_artifact_is_served_without_resolving_the_sources(app, tmp_path):
+    spec = app.extensions["openapi_spec"]
+    assert spec.build() == str(tmp_path / "openapi.json")
+    app.resolved.clear()
+    spec.init_app(app)
+    assert app.test_client().get("/spec.json").get_json()["info"]["title"] == "Meus Filmes"
+    assert app.resolved == []
+
+    # A source edited after the build makes the artifact stale
+    _touch_later(tmp_path / "docs" / "health.yaml")
+    app.test_client().get("/spec.json")
+    assert len(app.resolved) == 1
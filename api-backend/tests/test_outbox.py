@@ -0,0 +1,112 @@
+import datetime
+import time
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+from benchmarks.smtp_stub import SMTPStubServer
+from extensions import db
+from models import MailOutbox, utcnow
+from outbox import MailOutboxWorker
+
+
+@pytest.fixture
+def smtp():
+    with SMTPStubServer() as server:
+        yield server
+
+
+def make_app(smtp, **config):
+    app = Flask(__name__)
+    host, port = smtp.address
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        MAIL_SERVER=host,
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_DEFAULT_SENDER="noreply@example.com",
+        MAIL_MAX_EMAILS=2,
+        MAIL_OUTBOX_ENABLED=False,
+        MAIL_BACKOFF_BASE=60,
+        MAIL_MAX_ATTEMPTS=2,
+        MAIL_TIMEOUT=5,
+    )
+    app.config.update(config)
+    db.init_app(app)
+    Mail().init_app(app)
+    return app, MailOutboxWorker(app)
+
+
+@pytest.fixture
+def outbox(smtp):
+    app, worker = make_app(smtp)
+    with app.app_context():
+        db.create_all()
+        yield worker
+
+
+def test_drain_sends_each_batch_over_one_connection(smtp, outbox):
+    for i in range(5):
+        outbox.enqueue(f"Assunto {i}", [f"user{i}@example.com"], "Corpo")
+    assert outbox.drain() == {"sent": 5, "retrying": 0, "failed": 0}
+    assert [recipients for _, recipients, _ in smtp.messages] == [[f"user{i}@example.com"] for i in range(5)]
+    assert smtp.connections == 3
+    assert {(row.status, row.body) for row in MailOutbox.query} == {("sent", "")}
+
+
+def test_rejected_message_only_fails_its_own_row(smtp, outbox):
+    smtp.reject_recipients.add("bad@example.com")
+    bad = outbox.enqueue("Assunto", ["bad@example.com"], "Corpo")
+    good = outbox.enqueue("Assunto", ["good@example.com"], "Corpo")
+    assert outbox.drain() == {"sent": 1, "retrying": 1, "failed": 0}
+    assert smtp.connections == 1
+
+    row = db.session.get(MailOutbox, bad)
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.next_attempt_at > utcnow()
+    assert db.session.get(MailOutbox, good).status == "sent"
+    # Not due yet
+    assert outbox.drain() == {"sent": 0, "retrying": 0, "failed": 0}
+
+
+def test_connection_errors_are_retried_then_given_up(smtp, outbox):
+    row_id = outbox.enqueue("Assunto", ["user@example.com"], "Corpo")
+    smtp.queue_replies(None)
+    assert outbox.drain() == {"sent": 0, "retrying": 1, "failed": 0}
+
+    MailOutbox.query.update({"next_attempt_at": utcnow()})
+    db.session.commit()
+    smtp.queue_replies(None)
+    assert outbox.drain() == {"sent": 0, "retrying": 0, "failed": 1}
+    row = db.session.get(MailOutbox, row_id)
+    assert (row.status, row.attempts, row.body) == ("failed", 2, "")
+    assert smtp.messages == []
+
+
+def test_purge_deletes_old_sent_and_failed_rows(smtp, outbox):
+    old = utcnow() - datetime.timedelta(days=8)
+    sent = outbox.enqueue("Assunto", ["a@example.com"], "Link de redefinição")
+    failed = outbox.enqueue("Assunto", ["b@example.com"], "Link de redefinição")
+    recent = outbox.enqueue("Assunto", ["c@example.com"], "Corpo")
+    pending = outbox.enqueue("Assunto", ["d@example.com"], "Corpo")
+    MailOutbox.query.filter(MailOutbox.id == sent).update({"status": "sent", "sent_at": old})
+    MailOutbox.query.filter(MailOutbox.id == failed).update({"status": "failed", "claimed_at": old})
+    MailOutbox.query.filter(MailOutbox.id == recent).update({"status": "sent", "sent_at": utcnow()})
+    MailOutbox.query.filter(MailOutbox.id == pending).update({"created_at": old})
+    db.session.commit()
+
+    assert outbox.purge() == 2
+    assert sorted(row.id for row in MailOutbox.query) == [recent, pending]
+    assert outbox.purge() == 0
+
+
+def test_enqueue_wakes_the_background_sender(smtp):
+    app, worker = make_app(smtp, MAIL_OUTBOX_ENABLED=True)
+    with app.app_context():
+        db.create_all()
+        worker.enqueue("Assunto", ["user@example.com"], "Corpo")
+    deadline = time.monotonic() + 5
+    while not smtp.messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(smtp.messages) == 1
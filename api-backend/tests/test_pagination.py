@@ -0,0 +1,101 @@
+import base64
+import datetime
+
+import pytest
+from flask import Flask
+
+from api.list_routes import lists_bp
+from api.watched_routes import watched_bp
+from extensions import auth_tokens, db
+from models import List, MovieList, User, Watched
+from utils import MAX_PAGE_SIZE, _decode_cursor, _encode_cursor
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SECRET_KEY="test-secret-key-with-enough-bytes!")
+    db.init_app(app)
+    auth_tokens.init_app(app)
+    app.register_blueprint(lists_bp)
+    app.register_blueprint(watched_bp)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@example.com", password="x"))
+        db.session.add(List(id="main", name="Main", is_main=True, user_id=1))
+        db.session.add_all(MovieList(list_id="main", tmdb_id=tmdb_id) for tmdb_id in [30, 10, 20, 50, 40, 70, 60])
+        # Several movies watched on the same day: ties on the sort key
+        days = [3, 1, 3, 2, 3, 1, 3]
+        db.session.add_all(
+            Watched(user_id=1, tmdb_id=100 + i, watched_at=datetime.datetime(2024, 1, day)) for i, day in enumerate(days)
+        )
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    token = auth_tokens.issue(db.session.get(User, 1), datetime.timedelta(hours=1))
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def _walk(client, url, key, limit):
+    """Follows next_cursor from the first page; returns the items and the page sizes"""
+    items, sizes, cursor = [], [], None
+    while True:
+        query = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get(url, query_string=query).get_json()
+        items += body[key]
+        sizes.append(len(body[key]))
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items, sizes
+
+
+def test_list_pages_follow_insertion_order(client):
+    unpaginated = client.get("/lists/main").get_json()
+    assert unpaginated["next_cursor"] is None
+    movies, sizes = _walk(client, "/lists/main", "movies", 3)
+    assert movies == unpaginated["movies"] == [{"tmdb_id": tmdb_id} for tmdb_id in [30, 10, 20, 50, 40, 70, 60]]
+    assert sizes == [3, 3, 1]
+
+
+def test_watched_pages_break_date_ties_without_gaps_or_duplicates(client):
+    unpaginated = client.get("/movie/watched/").get_json()["watched"]
+    for limit in (1, 2, 3, 7):
+        watched, _ = _walk(client, "/movie/watched/", "watched", limit)
+        assert watched == unpaginated
+    # Newest first, most recently added first within a day
+    assert [entry["tmdb_id"] for entry in unpaginated] == [106, 104, 102, 100, 103, 105, 101]
+    _, sizes = _walk(client, "/movie/watched/", "watched", 7)
+    assert sizes == [7]
+
+
+@pytest.mark.parametrize("url", ["/lists/main", "/movie/watched/"])
+@pytest.mark.parametrize("cursor", [
+    "not base64!", _encode_cursor({"id": 1})[:-2], _encode_cursor({"id": 1}), _encode_cursor([]),
+    _encode_cursor(["x", "y"]), base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_or_tampered_cursor_is_rejected(client, url, cursor):
+    response = client.get(url, query_string={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.get_json()["msg"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", str(MAX_PAGE_SIZE + 1), "ten"])
+def test_limit_must_be_within_bounds(client, limit):
+    for url in ("/lists/main", "/movie/watched/"):
+        response = client.get(url, query_string={"limit": limit})
+        assert response.status_code == 400
+        assert "limit must be" in response.get_json()["msg"]
+
+
+def test_cursor_alone_pages_by_the_maximum_size(client):
+    assert client.get("/lists/main", query_string={"limit": MAX_PAGE_SIZE}).status_code == 200
+    cursor = _encode_cursor([0])
+    assert _decode_cursor(cursor) == [0]
+    body = client.get("/lists/main", query_string={"cursor": cursor}).get_json()
+    assert len(body["movies"]) == 7 and body["next_cursor"] is None
+
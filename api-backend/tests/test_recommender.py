@@ -0,0 +1,96 @@
+import datetime
+import random
+
+import pytest
+from flask import Flask
+
+import recommender
+from extensions import db
+from models import List, Movie, MovieList, MovieNeighbor, MovieTranslation, User, Watched
+from recommender import rebuild, recommend
+
+DRAMA, ACTION, COMEDY = {"id": 18, "name": "Drama"}, {"id": 28, "name": "Ação"}, {"id": 35, "name": "Comédia"}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=str(i), email=f"{i}@example.com", password="x") for i in (1, 2, 3)])
+        db.session.add_all([
+            Movie(tmdb_id=1, title="A", genres=[DRAMA]),
+            Movie(tmdb_id=2, title="B", genres=[DRAMA, ACTION]),
+            Movie(tmdb_id=3, title="C", genres=[COMEDY]),
+            Movie(tmdb_id=4, title="D", genres=[ACTION]),
+            MovieTranslation(tmdb_id=2, language="en-US", title="B (en)"),
+        ])
+        db.session.add(List(id="list3", name="Quero ver", user_id=3))
+        for user_id, tmdb_id in [(1, 1), (1, 2), (2, 1), (2, 2), (2, 3), (3, 3)]:
+            watch(user_id, tmdb_id)
+        db.session.add(MovieList(list_id="list3", tmdb_id=4))
+        db.session.commit()
+        yield app
+
+
+def watch(user_id, tmdb_id):
+    db.session.add(Watched(user_id=user_id, tmdb_id=tmdb_id, watched_at=datetime.datetime(2024, 1, 1)))
+
+
+def neighbors():
+    rows = db.session.query(MovieNeighbor.tmdb_id, MovieNeighbor.neighbor_id, MovieNeighbor.score)
+    return {(tmdb_id, neighbor_id): round(score, 6) for tmdb_id, neighbor_id, score in rows}
+
+
+def test_cosine_and_genre_scores(app):
+    stats = rebuild(use_numpy=False)
+    assert stats == {"movies": 4, "changed": 4, "recomputed": 4, "removed": 0, "neighbors": 8}
+    scores = neighbors()
+    # 1 and 2 share both of their users and the Drama genre: cos 1.0 + 0.25 * 1/sqrt(2)
+    assert scores[(1, 2)] == pytest.approx(1 + 0.25 / 2 ** 0.5, abs=1e-6)
+    # 3 and 4 share user 3 (a list) but no genre
+    assert scores[(3, 4)] == pytest.approx(1 / 2 ** 0.5, abs=1e-6)
+
+    assert [(round(score, 4), movie.tmdb_id) for score, movie, _ in recommend(1)] == [(1.0, 3)]  # 0.5 from each of 1 and 2
+    # User 3 watched 3 and listed 4, which are each other's neighbors: neither is recommended
+    results = recommend(3, language="en-US")
+    assert [(movie.tmdb_id, translation and translation.title) for _, movie, translation in results] == [(1, None), (2, "B (en)")]
+
+
+def test_incremental_runs_match_a_full_rebuild(app):
+    rebuild(use_numpy=False)
+    assert rebuild(use_numpy=False)["recomputed"] == 0
+
+    watch(3, 1)
+    Watched.query.filter_by(user_id=2, tmdb_id=3).delete()
+    db.session.commit()
+    stats = rebuild(use_numpy=False)
+    assert (stats["changed"], stats["recomputed"]) == (2, 4)
+    incremental = neighbors()
+    rebuild(full=True, use_numpy=False)
+    assert neighbors() == incremental
+
+    # Movie 4 leaves every list: its rows and the rows pointing at it go away
+    MovieList.query.filter_by(tmdb_id=4).delete()
+    db.session.commit()
+    assert rebuild(use_numpy=False)["removed"] == 1
+    assert not [pair for pair in neighbors() if 4 in pair]
+
+
+def test_sparse_backend_matches_python_backend(app):
+    pytest.importorskip("scipy")
+    rng = random.Random(7)
+    db.session.add_all([Movie(tmdb_id=i, title=str(i), genres=[rng.choice([DRAMA, ACTION, COMEDY])]) for i in range(10, 60)])
+    db.session.add_all([User(id=i, name=str(i), email=f"{i}@example.com", password="x") for i in range(10, 40)])
+    for user_id in range(10, 40):
+        for tmdb_id in rng.sample(range(10, 60), 8):
+            watch(user_id, tmdb_id)
+    db.session.commit()
+
+    rebuild(top_k=5, min_cooccurrence=2, use_numpy=False)
+    expected = neighbors()
+    assert rebuild(full=True, top_k=5, min_cooccurrence=2, use_numpy=True)["recomputed"] == 54
+    assert neighbors() == expected
+    assert recommender.np is not None
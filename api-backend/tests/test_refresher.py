@@ -0,0 +1,96 @@
+import datetime
+import threading
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import update
+
+from api.tmdb_proxy_routes import tmdb_proxy_bp
+from benchmarks.tmdb_stub import movie_payload
+from extensions import db, response_cache, tmdb
+from models import Movie, MovieExtra, MovieTranslation, utcnow
+from refresher import MovieRefresher
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", TMDB_API_KEY="test", MOVIE_MAX_AGE_HOURS=24)
+    db.init_app(app)
+    response_cache.init_app(app)
+    app.register_blueprint(tmdb_proxy_bp)
+    monkeypatch.setattr(tmdb, "api_key", "test")
+    monkeypatch.setattr(tmdb, "get", lambda path, params=None: {
+        **movie_payload(int(path.split("/")[2]), params["language"]),
+        **{section: {"results": ["new"]} for section in params.get("append_to_response", "").split(",") if section},
+    })
+    old = utcnow() - datetime.timedelta(hours=25)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Movie(tmdb_id=1, title="Old", fetched_at=old),
+            Movie(tmdb_id=2, title="Fresh", fetched_at=utcnow()),
+            Movie(tmdb_id=3, title="Never dated"),
+            MovieTranslation(tmdb_id=1, language="en-US", title="Old", fetched_at=old),
+            MovieExtra(tmdb_id=1, language="en-US", section="videos", payload={"results": []}, fetched_at=old),
+        ])
+        db.session.commit()
+        # Rows stored before fetched_at existed
+        db.session.execute(update(Movie).where(Movie.tmdb_id == 3).values(fetched_at=None))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def refresher(app, monkeypatch):
+    refresher = MovieRefresher(app)
+    monkeypatch.setattr("api.tmdb_proxy_routes.movie_refresher", refresher)
+    return refresher
+
+
+def test_only_movies_older_than_max_age_are_enqueued(app, refresher, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(refresher, "enqueue", enqueued.append)
+    assert not refresher.is_stale(db.session.get(Movie, 2))
+    app.test_client().post("/tmdb/movies/batch", json={"ids": [1, 2, 3]})
+    app.test_client().get("/tmdb/movie/2")
+    assert enqueued == [1, 3]
+
+
+def test_refresh_updates_movie_translation_and_extras(app, refresher):
+    before = utcnow()
+    assert refresher.refresh([1]) == 1
+    movie = db.session.get(Movie, 1)
+    assert movie.title == "Filme 1"
+    assert movie.fetched_at >= before
+    translation = db.session.get(MovieTranslation, (1, "en-US"))
+    assert (translation.title, translation.fetched_at >= before) == ("Movie 1", True)
+    assert db.session.get(MovieExtra, (1, "en-US", "videos")).payload == {"results": ["new"]}
+    assert db.session.get(Movie, 2).title == "Fresh"
+
+
+def test_thread_starts_lazily_once_per_process(app, refresher, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(refresher, "_run", lambda: release.wait(5))
+    assert refresher._thread is None
+    refresher.enqueue(1)
+    first = refresher._thread
+    refresher.enqueue(2)
+    assert refresher._thread is first and first.is_alive()
+
+    # A forked worker inherits the attributes but not the thread
+    monkeypatch.setattr("refresher.os.getpid", lambda: -1)
+    refresher.enqueue(3)
+    assert refresher._thread is not first and refresher._thread_pid == -1
+    release.set()
+
+
+def test_enqueued_movies_are_refreshed_in_the_background(app, refresher):
+    refresher.enqueue(1)
+    refresher.enqueue(1)
+    deadline = time.monotonic() + 5
+    while refresher.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    db.session.expire_all()
+    assert db.session.get(Movie, 1).title == "Filme 1"
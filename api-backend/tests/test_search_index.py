@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+
+import pytest
+import requests
+from flask import Flask
+from sqlalchemy import event
+
+from api import ASYNC_VIEWS
+from api.tmdb_proxy_routes import tmdb_proxy_bp
+from extensions import db, response_cache, search_index, tmdb
+from models import Movie, MovieTranslation
+from search_index import fold
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://", TMDB_API_KEY="test", TMDB_CACHE_BACKEND="none", SEARCH_LOCAL_MIN_RESULTS=2,
+        SEARCH_INDEX_LANGUAGES=["pt-BR", "en-US", "es-ES"],
+    )
+    db.init_app(app)
+    response_cache.init_app(app)
+    search_index.init_app(app)
+    app.register_blueprint(tmdb_proxy_bp)
+    monkeypatch.setattr(search_index, "_indexes", {})
+    monkeypatch.setattr(search_index, "_languages", set())
+    monkeypatch.setattr(search_index, "_ensure_thread", lambda: None)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Movie(
+                tmdb_id=1, title="Cidade de Deus", original_title="Cidade de Deus", overview="Dois garotos...",
+                release_date=datetime.date(2002, 8, 30), rating=8.4, genres=[{"id": 18, "name": "Drama"}], adult=False,
+            ),
+            Movie(tmdb_id=2, title="A Cidade Perdida", rating=6.1),
+            Movie(tmdb_id=3, title="Ação Mutante", rating=5.0),
+            Movie(tmdb_id=4, title="Cidade", rating=5.5),
+            Movie(tmdb_id=6, title="Cidade Proibida", rating=9.0, adult=True),
+            MovieTranslation(tmdb_id=1, language="en-US", title="City of God", overview="Two boys..."),
+        ])
+        db.session.commit()
+        search_index.build("pt-BR")
+        search_index.build("en-US")
+        yield app
+
+
+def _tmdb_results(monkeypatch, results=None, error=None):
+    calls = []
+
+    def get(path, params=None):
+        calls.append(params["query"])
+        if error:
+            raise error
+        return {"page": 1, "results": results or [], "total_results": len(results or []), "total_pages": 1}
+
+    monkeypatch.setattr(tmdb, "get", get)
+    return calls
+
+
+def test_accent_insensitive_prefix_search_ranked_by_title_and_rating(app):
+    assert fold("Ação") == "acao"
+    assert [movie["id"] for movie in search_index.search("cidade", "pt-BR").results] == [4, 1, 2]
+    hits = search_index.search("cidade de d", "pt-BR")
+    assert hits.total == 1
+    # Same fields as a TMDB /search/movie result
+    assert hits.results == [{
+        "id": 1, "title": "Cidade de Deus", "original_title": "Cidade de Deus", "overview": "Dois garotos...",
+        "poster_path": None, "release_date": "2002-08-30", "vote_average": 8.4, "genre_ids": [18], "adult": False,
+    }]
+    assert [movie["id"] for movie in search_index.search("ACAO mut", "pt-BR").results] == [3]
+    english = search_index.search("city", "en-US").results
+    assert [(movie["id"], movie["overview"], movie["original_title"]) for movie in english] == [
+        (1, "Two boys...", "Cidade de Deus")
+    ]
+    assert search_index.search("cidade", "es-ES") is None  # not built yet
+
+
+def test_index_is_rebuilt_only_when_the_catalog_changes(app):
+    assert search_index.build("pt-BR") is False
+    db.session.add(Movie(tmdb_id=5, title="Central do Brasil", rating=8.0))
+    db.session.commit()
+    assert search_index.build("pt-BR") is True
+    assert search_index.search("centr", "pt-BR").total == 1
+
+
+def test_search_route_answers_locally_or_merges_tmdb_results(app, monkeypatch):
+    calls = _tmdb_results(monkeypatch, [{"id": 3, "title": "Ação Mutante"}, {"id": 99, "title": "Ação X", "adult": False}])
+    client = app.test_client()
+
+    local = client.get("/tmdb/search?query=cida").get_json()
+    assert local["source"] == "local" and [movie["id"] for movie in local["results"]] == [1, 4, 2]
+    assert calls == []
+
+    merged = client.get("/tmdb/search?query=acao").get_json()
+    assert [movie["id"] for movie in merged["results"]] == [3, 99]
+    assert calls == ["acao"]
+
+    client.get("/tmdb/search?query=cida&page=2")
+    assert calls == ["acao", "cida"]
+
+
+def test_search_route_serves_local_results_when_tmdb_fails(app, monkeypatch):
+    _tmdb_results(monkeypatch, error=requests.exceptions.ConnectionError("down"))
+    client = app.test_client()
+    response = client.get("/tmdb/search?query=acao")
+    assert response.status_code == 200
+    assert [movie["id"] for movie in response.get_json()["results"]] == [3]
+    assert client.get("/tmdb/search?query=nada").status_code == 503
+
+
+def test_only_configured_languages_are_indexed(app, monkeypatch):
+    monkeypatch.setattr(search_index, "_indexes", {})
+    for language in ("xx-XX", "yy-YY", "en-US"):
+        assert search_index.search("cidade", language) is None
+    assert search_index._languages == {"en-US"}
+
+
+def test_adult_titles_are_not_answered_locally(app, monkeypatch):
+    calls = _tmdb_results(monkeypatch, [{"id": 7, "title": "Cidade Adulta", "adult": True}])
+    assert 6 not in [movie["id"] for movie in search_index.search("cidade", "pt-BR").results]
+    body = app.test_client().get("/tmdb/search?query=proibida").get_json()
+    assert body["results"] == [] and calls == ["proibida"]
+
+
+def test_async_search_twin_answers_without_database_queries(app, monkeypatch):
+    calls = _tmdb_results(monkeypatch)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async_view = ASYNC_VIEWS[app.view_functions["tmdb_proxy.search_movies"]]
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        with app.test_request_context("/tmdb/search?query=cida"):
+            body = asyncio.run(async_view()).get_json()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert body["source"] == "local" and [movie["id"] for movie in body["results"]] == [1, 4, 2]
+    assert body["results"][0]["overview"] == "Dois garotos..." and body["results"][0]["genre_ids"] == [18]
+    assert statements == [] and calls == []
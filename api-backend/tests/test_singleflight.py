@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    results = []
+    barrier = threading.Barrier(10)
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return "movie"
+
+    def worker():
+        barrier.wait()
+        results.append(flight.do(550, fetch))
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ["movie"] * 10
+    assert flight.in_flight() == 0
+
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("TMDB down")
+
+    with pytest.raises(ValueError):
+        flight.do(1, fail)
+    assert flight.do(1, lambda: "ok") == "ok"
@@ -0,0 +1,212 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from flask import Flask
+
+from api.tmdb_proxy_routes import tmdb_proxy_bp
+from benchmarks.tmdb_stub import TMDBStubServer
+from extensions import response_cache, tmdb
+from tmdb_client import AsyncTMDBClient, CircuitBreaker, CircuitOpenError, TMDBClient
+
+
+@pytest.fixture
+def stub():
+    with TMDBStubServer() as server:
+        yield server
+
+
+@pytest.fixture
+def client(stub):
+    return _client(stub)
+
+
+def _client(stub, **options):
+    client = TMDBClient()
+    client.configure(
+        api_key="test", base_url=stub.base_url, backoff_base=0.001, backoff_max=0.01, **options
+    )
+    return client
+
+
+def test_get_returns_json(stub, client):
+    data = client.get("/movie/550", {"language": "pt-BR"})
+    assert data["id"] == 550
+    assert stub.requests["/3/movie/550"] == 1
+
+
+def test_get_retries_429_and_5xx(stub, client):
+    stub.queue_statuses(429, 503)
+    assert client.get("/movie/1")["id"] == 1
+    assert stub.requests["/3/movie/1"] == 3
+
+
+def test_get_raises_after_exhausting_retries(stub):
+    client = _client(stub, max_retries=1)
+    stub.queue_statuses(500, 500)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("/movie/1")
+    assert stub.requests["/3/movie/1"] == 2
+
+
+def test_get_does_not_retry_client_errors(stub, client):
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("/unknown")
+    assert stub.requests["/3/unknown"] == 1
+
+
+def test_read_timeout(stub):
+    stub.latency = 0.2
+    client = _client(stub, read_timeout=0.05, max_retries=0)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get("/movie/1")
+
+
+def test_get_many_is_concurrent_and_ordered(stub):
+    stub.latency = 0.05
+    client = _client(stub, max_concurrency=10)
+    started = time.perf_counter()
+    results = client.get_many([("/unknown", None)] + [(f"/movie/{i}", None) for i in range(2, 11)])
+    elapsed = time.perf_counter() - started
+    assert elapsed < 0.05 * 10 / 2
+    assert results[0] is None
+    assert [r["id"] for r in results[1:]] == list(range(2, 11))
+
+
+def test_circuit_opens_on_errors_and_closes_after_probes(stub):
+    client = _client(stub, max_retries=0)
+    client.breaker.configure(min_calls=4, error_rate=0.5, open_seconds=0.05, half_open_calls=2)
+    client.get("/movie/1")
+    client.get("/movie/2")
+    stub.queue_statuses(503, 503)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get("/movie/3")
+    assert client.breaker.state == client.breaker.OPEN
+
+    # Rejected without calling TMDB
+    with pytest.raises(CircuitOpenError) as rejected:
+        client.get("/movie/4")
+    assert 0 < rejected.value.retry_after <= 0.05
+    assert stub.requests["/3/movie/4"] == 0
+
+    time.sleep(0.06)
+    client.get("/movie/4")
+    assert client.breaker.state == client.breaker.HALF_OPEN
+    client.get("/movie/5")
+    assert client.breaker.stats() == {"state": "closed", "calls": 0, "failures": 0, "error_rate": 0.0}
+
+
+def test_half_open_slots_are_freed_only_by_their_own_probes():
+    breaker = CircuitBreaker()
+    breaker.configure(min_calls=2, error_rate=0.5, open_seconds=0.01, half_open_calls=2)
+    before_opening = breaker.allow()
+    for _ in range(2):
+        breaker.record(breaker.allow(), False, 0)
+    assert breaker.state == breaker.OPEN and breaker.allow() is None
+
+    time.sleep(0.02)
+    first, second = breaker.allow(), breaker.allow()
+    assert first.probe and second.probe and breaker.allow() is None
+    # A call started while closed ends during the probes: it neither frees a slot nor counts as one
+    breaker.record(before_opening, False, 0)
+    assert breaker.state == breaker.HALF_OPEN and breaker.allow() is None
+    breaker.release(second)
+    third = breaker.allow()
+    assert third.probe and breaker.allow() is None
+    breaker.record(first, True, 0)
+    breaker.record(third, True, 0)
+    assert breaker.state == breaker.CLOSED
+    # Probes of an earlier half-open period are not counted again
+    breaker.record(second, True, 0)
+    assert breaker.stats()["calls"] == 1
+
+
+def test_async_body_errors_are_recorded_once_per_attempt(monkeypatch):
+    aiohttp = pytest.importorskip("aiohttp")
+    client = AsyncTMDBClient()
+    client.configure(api_key="test", base_url="http://tmdb.invalid", max_retries=1, backoff_base=0)
+    recorded = []
+    monkeypatch.setattr(client.breaker, "record", lambda permit, ok, elapsed: recorded.append(ok))
+
+    class Response:
+        status = 200
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+        async def json(self, content_type=None):
+            raise aiohttp.ContentTypeError(None, (), message="Attempt to decode JSON with unexpected mimetype")
+
+    class Session:
+        def get(self, url, params=None):
+            return Response()
+
+    async def run():
+        client._client, client._client_loop = Session(), asyncio.get_running_loop()
+        with pytest.raises(requests.exceptions.ConnectionError):
+            await client.get("/movie/1")
+
+    asyncio.run(run())
+    assert recorded == [False, False]
+
+
+def test_proxy_serves_stale_cache_then_503_while_circuit_is_open(stub):
+    app = Flask(__name__)
+    app.config.update(
+        TMDB_API_KEY="test", TMDB_BASE_URL=stub.base_url, TMDB_MAX_RETRIES=0, TMDB_BACKOFF_BASE=0,
+        TMDB_BREAKER_MIN_CALLS=2, TMDB_CACHE_TTLS={"popular": 0.01},
+    )
+    app.register_blueprint(tmdb_proxy_bp)
+    response_cache.init_app(app)
+    tmdb.init_app(app)
+    client = app.test_client()
+    try:
+        fresh = client.get("/tmdb/popular").get_json()
+        time.sleep(0.02)
+        stub.queue_statuses(503)
+        stale = client.get("/tmdb/popular")
+        assert stale.status_code == 200
+        assert stale.get_json() == {**fresh, "stale": True}
+        assert tmdb.breaker.state == tmdb.breaker.OPEN
+
+        unavailable = client.get("/tmdb/popular?page=2")
+        assert unavailable.status_code == 503
+        assert unavailable.get_json() == {"error": "TMDB is temporarily unavailable, please try again later"}
+        assert unavailable.headers["Retry-After"] == "30"
+        assert stub.requests["/3/discover/movie"] == 2
+        assert response_cache.stats()["stale"] == 1
+    finally:
+        tmdb.breaker.reset()
+        response_cache.clear()
+
+
+def test_proxy_passes_tmdb_client_errors_through_without_tripping_the_breaker(stub):
+    app = Flask(__name__)
+    app.config.update(
+        TMDB_API_KEY="test", TMDB_BASE_URL=stub.base_url, TMDB_MAX_RETRIES=0, TMDB_CACHE_BACKEND="none",
+        TMDB_BREAKER_MIN_CALLS=2,
+    )
+    app.register_blueprint(tmdb_proxy_bp)
+    response_cache.init_app(app)
+    tmdb.init_app(app)
+    client = app.test_client()
+    try:
+        stub.queue_statuses(404, 404)
+        for path in ("/tmdb/movie/999999/credits", "/tmdb/movie/999999/recommendations"):
+            response = client.get(path)
+            assert response.status_code == 404
+            assert response.get_json() == {"error": "Not found on TMDB"}
+            assert "Retry-After" not in response.headers
+        stub.queue_statuses(422)
+        assert client.get("/tmdb/popular?page=0").status_code == 422
+        # A rejected API key is our problem, not the user's session
+        stub.queue_statuses(401)
+        assert client.get("/tmdb/genres").status_code == 502
+        assert tmdb.breaker.state == tmdb.breaker.CLOSED
+    finally:
+        tmdb.breaker.reset()
@@ -0,0 +1,63 @@
+import datetime
+import time
+
+import jwt
+import pytest
+from flask import Flask
+
+from extensions import db
+from models import User
+from token_auth import TokenCache, TokenVerifier
+
+
+def test_token_cache_evicts_least_recently_used_and_expired():
+    cache = TokenCache(max_entries=2)
+    future = time.time() + 60
+    cache.set("a", {"user_id": 1, "exp": future})
+    cache.set("b", {"user_id": 2, "exp": future})
+    assert cache.get("a")["user_id"] == 1
+    cache.set("c", {"user_id": 3, "exp": future})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    cache.set("old", {"user_id": 4, "exp": time.time() - 1})
+    assert cache.get("old") is None
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SECRET_KEY="test-secret-key-with-enough-bytes!")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@example.com", password="x"))
+        db.session.commit()
+        yield app
+
+
+def test_verify_caches_tokens_and_rejects_revoked_ones(app, monkeypatch):
+    verifier = TokenVerifier(app)
+    token = verifier.issue(db.session.get(User, 1), datetime.timedelta(hours=1))
+    assert verifier.verify(token)["user_id"] == 1
+
+    # Served from the cache: no second signature check
+    decode = jwt.decode
+    calls = []
+    monkeypatch.setattr(jwt, "decode", lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+    assert verifier.verify(token)["user_id"] == 1
+    assert calls == []
+
+    verifier.revoke_all(1)
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(token)
+    assert verifier.verify(verifier.issue(db.session.get(User, 1), datetime.timedelta(hours=1)))["tv"] == 1
+
+
+def test_verify_rejects_tampered_and_expired_tokens(app):
+    verifier = TokenVerifier(app)
+    user = db.session.get(User, 1)
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(verifier.issue(user, datetime.timedelta(hours=1)) + "x")
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(verifier.issue(user, datetime.timedelta(seconds=-1)))
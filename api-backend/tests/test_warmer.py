@@ -0,0 +1,55 @@
+import pytest
+from flask import Flask
+
+from benchmarks.tmdb_stub import movie_payload
+from extensions import db, tmdb
+from models import Movie, MovieList, MovieTranslation
+from warmer import warm_catalog_command
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://")
+    db.init_app(app)
+    app.cli.add_command(warm_catalog_command)
+    monkeypatch.setattr(tmdb, "api_key", "test")
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+@pytest.fixture
+def tmdb_calls(monkeypatch):
+    calls = []
+
+    def get(path, params=None):
+        calls.append((path, params["language"]))
+        if path.startswith("/movie/"):
+            return movie_payload(int(path.rsplit("/", 1)[1]), params["language"])
+        # Listings: the same two movies on every page, one of them adult
+        return {"results": [{"id": 10, "adult": False}, {"id": 11, "adult": True}]}
+
+    monkeypatch.setattr(tmdb, "get", get)
+    return calls
+
+
+def test_warm_catalog_stores_referenced_and_listed_movies(app, tmdb_calls):
+    db.session.add(MovieList(list_id="list", tmdb_id=5))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(
+        args=["warm-catalog", "--pages", "1", "--rate", "0", "--languages", "pt-BR, en-US"]
+    )
+    assert result.exit_code == 0, result.output
+    assert sorted(movie.tmdb_id for movie in Movie.query) == [5, 10]
+    assert sorted(t.tmdb_id for t in MovieTranslation.query.filter_by(language="en-US")) == [5, 10]
+    assert ("/movie/11", "pt-BR") not in tmdb_calls
+
+
+@pytest.mark.parametrize("languages", ["portuguese", "pt-BR,en_us", ","])
+def test_warm_catalog_rejects_invalid_languages(app, tmdb_calls, languages):
+    result = app.test_cli_runner().invoke(args=["warm-catalog", "--languages", languages])
+    assert result.exit_code == 2
+    assert "Invalid value for '--languages'" in result.output
+    assert tmdb_calls == []
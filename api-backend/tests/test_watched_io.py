@@ -0,0 +1,138 @@
+import datetime
+import io
+
+import pytest
+from flask import Flask
+
+from benchmarks.tmdb_stub import movie_payload
+from extensions import db, tmdb
+from models import List, MovieList, User, Watched, WatchedSummary
+from watched_io import export_watched, import_watched, normalize_record, read_csv, read_json
+
+# TMDB lookups answered by the fake below
+FIND_RESULTS = {"tt0133093": 603}
+SEARCH_RESULTS = {("Central do Brasil", 1998): 666}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    monkeypatch.setattr(tmdb, "api_key", "test")
+
+    def get(path, params=None):
+        if path.startswith("/find/"):
+            tmdb_id = FIND_RESULTS.get(path.rsplit("/", 1)[1])
+            return {"movie_results": [{"id": tmdb_id}] if tmdb_id else []}
+        if path == "/search/movie":
+            tmdb_id = SEARCH_RESULTS.get((params["query"], params.get("year")))
+            return {"results": [{"id": tmdb_id}] if tmdb_id else []}
+        return movie_payload(int(path.rsplit("/", 1)[1]))
+
+    monkeypatch.setattr(tmdb, "get_many", lambda calls: [get(path, params) for path, params in calls])
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@example.com", password="x"))
+        db.session.add(User(id=2, name="b", email="b@example.com", password="x"))
+        for user_id in (1, 2):
+            db.session.add(List(id=f"assistidos{user_id}", name="Assistidos", is_main=True, user_id=user_id))
+        db.session.commit()
+        yield app
+
+
+def _import(user_id, data, fmt="csv"):
+    *_, final = import_watched(user_id, read_csv(io.BytesIO(data)) if fmt == "csv" else read_json(io.BytesIO(data)))
+    return final
+
+
+def test_read_json_decodes_arrays_and_ndjson_across_chunks():
+    array = b'[\n  {"tmdb_id": 1, "title": "Caf\xc3\xa9"},\n  {"tmdb_id": 2}\n]\n'
+    ndjson = b'{"tmdb_id": 1, "title": "Caf\xc3\xa9"}\n{"tmdb_id": 2}\n'
+    expected = [{"tmdb_id": 1, "title": "Café"}, {"tmdb_id": 2}]
+    assert list(read_json(io.BytesIO(array), chunk_size=5)) == expected
+    assert list(read_json(io.BytesIO(ndjson), chunk_size=5)) == expected
+
+
+def test_read_json_rejects_malformed_input_after_valid_objects():
+    records = read_json(io.BytesIO(b'{"tmdb_id": 1}\n{bad'), chunk_size=4)
+    assert next(records) == {"tmdb_id": 1}
+    with pytest.raises(ValueError):
+        next(records)
+
+
+def test_normalize_letterboxd_and_imdb_rows():
+    letterboxd = io.BytesIO(
+        b"\xef\xbb\xbfDate,Name,Year,Letterboxd URI,Rating,Rewatch,Tags,Watched Date\n"
+        b"2024-03-02,Central do Brasil,1998,https://boxd.it/x,5,,,2024-03-01\n"
+    )
+    (row,) = read_csv(letterboxd)
+    assert normalize_record(row) == {
+        "tmdb_id": None, "imdb_id": None, "title": "Central do Brasil", "year": 1998,
+        "watched_at": datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc), "list": None,
+    }
+
+    imdb = {"Const": "tt0133093", "Title": "The Matrix", "Title Type": "Movie", "Date Rated": "2020-01-05", "Year": "1999"}
+    assert normalize_record(imdb)["imdb_id"] == "tt0133093"
+    assert normalize_record(dict(imdb, **{"Title Type": "TV Series"})) is None
+    assert normalize_record({"tmdb_id": "603", "watched_at": ""})["tmdb_id"] == 603
+    assert normalize_record({"Rating": "4"}) is None
+
+
+def test_import_letterboxd_and_imdb_exports(app):
+    letterboxd = _import(1, (
+        b"Date,Name,Year,Letterboxd URI,Watched Date\n"
+        b"2024-03-02,Central do Brasil,1998,https://boxd.it/x,2024-03-01\n"
+        b"2024-03-03,Filme Inexistente,2001,https://boxd.it/y,2024-03-03\n"
+    ))
+    assert (letterboxd["imported"], letterboxd["unresolved"]) == (1, 1)
+    assert letterboxd["unresolved_entries"] == ["Filme Inexistente (2001)"]
+
+    imdb = _import(1, (
+        b"Const,Your Rating,Date Rated,Title,Title Type,Year\n"
+        b"tt0133093,9,2020-01-05,The Matrix,Movie,1999\n"
+        b"tt0903747,10,2020-01-06,Breaking Bad,TV Series,2008\n"
+        b"tt9999999,7,2020-01-07,Unknown,Movie,2020\n"
+    ))
+    assert (imdb["imported"], imdb["invalid"], imdb["unresolved"]) == (1, 1, 1)
+    assert imdb["unresolved_entries"] == ["tt9999999"]
+    watched = {row.tmdb_id: row.watched_at.date() for row in Watched.query.filter_by(user_id=1)}
+    assert watched == {666: datetime.date(2024, 3, 1), 603: datetime.date(2020, 1, 5)}
+    assert {row.tmdb_id for row in MovieList.query.filter_by(list_id="assistidos1")} == {666, 603}
+
+
+def test_reimport_is_idempotent(app):
+    data = b"tmdb_id,watched_at,list\n1,2024-01-01,\n2,2024-01-02,\n3,,Favoritos\n"
+    first = _import(1, data)
+    assert (first["imported"], first["listed"], first["lists_created"]) == (2, 1, 1)
+    again = _import(1, data)
+    assert (again["imported"], again["already_watched"], again["listed"], again["already_listed"]) == (0, 2, 0, 1)
+    assert again["lists_created"] == 0
+    assert Watched.query.filter_by(user_id=1).count() == 2
+    assert List.query.filter_by(user_id=1, name="Favoritos").count() == 1
+    assert db.session.get(WatchedSummary, (1, "total", "")).count == 2
+
+
+@pytest.mark.parametrize("fmt", ["csv", "json"])
+def test_export_round_trip_keeps_history_and_lists(app, fmt):
+    _import(1, (
+        b'[{"tmdb_id": 1, "watched_at": "2024-01-01"}, {"tmdb_id": 2, "watched_at": "2024-02-01"},'
+        b' {"tmdb_id": 2, "list": "Favoritos"}, {"tmdb_id": 3, "list": "Favoritos"}, {"tmdb_id": 4, "list": "Terror"}]'
+    ), fmt="json")
+    exported = "".join(export_watched(1, fmt, chunk_size=2)).encode()
+    # "Assistidos" mirrors the history and is not exported as a list
+    assert b"Assistidos" not in exported
+
+    final = _import(2, exported, fmt)
+    assert (final["imported"], final["listed"], final["invalid"]) == (2, 3, 0)
+
+    def snapshot(user_id):
+        watched = sorted((row.tmdb_id, row.watched_at.date()) for row in Watched.query.filter_by(user_id=user_id))
+        lists = sorted(
+            (user_list.name, row.tmdb_id)
+            for user_list in List.query.filter_by(user_id=user_id)
+            for row in MovieList.query.filter_by(list_id=user_list.id)
+        )
+        return watched, lists
+
+    assert snapshot(2) == snapshot(1)
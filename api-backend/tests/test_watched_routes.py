@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+from flask import Flask
+
+import api.watched_routes
+from api.watched_routes import watched_bp
+from extensions import auth_tokens, db
+from models import List, Movie, MovieList, User, Watched, WatchedSummary
+from utils import _insert_ignore
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SECRET_KEY="test-secret-key-with-enough-bytes!")
+    db.init_app(app)
+    auth_tokens.init_app(app)
+    app.register_blueprint(watched_bp)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@example.com", password="x"))
+        db.session.add(List(id="assistidos", name="Assistidos", is_main=True, user_id=1))
+        db.session.add(Movie(tmdb_id=10, title="A", rating=7.0, genres=[{"id": 18, "name": "Drama"}]))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    token = auth_tokens.issue(db.session.get(User, 1), datetime.timedelta(hours=1))
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def test_add_then_update_the_watched_date(client):
+    created = client.post("/movie/watched/", json={"tmdb_id": 10, "watched_at": "2024-01-05"})
+    assert created.status_code == 201
+    updated = client.post("/movie/watched/", json={"tmdb_id": 10, "watched_at": "2024-03-05"})
+    assert updated.status_code == 200 and updated.get_json()["watched_at"] == "2024-03-05"
+    assert db.session.get(WatchedSummary, (1, "total", "")).count == 1
+    assert MovieList.query.filter_by(list_id="assistidos", tmdb_id=10).count() == 1
+
+
+def test_entry_deleted_between_the_insert_and_the_read_is_inserted_again(client, monkeypatch):
+    calls = []
+
+    def insert_ignore(model, rows):
+        calls.append(model)
+        if model is Watched and calls.count(Watched) == 1:
+            return 0  # The row existed, then a concurrent request deleted it
+        return _insert_ignore(model, rows)
+
+    monkeypatch.setattr(api.watched_routes, "_insert_ignore", insert_ignore)
+    response = client.post("/movie/watched/", json={"tmdb_id": 10, "watched_at": "2024-01-05"})
+    assert response.status_code == 201
+    assert calls.count(Watched) == 2
+    assert Watched.query.filter_by(user_id=1, tmdb_id=10).count() == 1
+    assert db.session.get(WatchedSummary, (1, "total", "")).count == 1
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+from flask import Flask
+
+from extensions import db
+from models import Movie, User, Watched
+from watched_stats import apply_changes, counted_fields, get_stats, movie_fields, rebuild
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name="a", email="a@example.com", password="x"))
+        db.session.add_all([
+            Movie(tmdb_id=1, title="A", release_date=datetime.date(1999, 5, 1), rating=8.0,
+                  genres=[{"id": 28, "name": "Ação"}, {"id": 18, "name": "Drama"}]),
+            Movie(tmdb_id=2, title="B", release_date=datetime.date(2010, 1, 1), rating=6.0,
+                  genres=[{"id": 18, "name": "Drama"}]),
+        ])
+        db.session.commit()
+        yield app
+
+
+def watch(tmdb_id, day):
+    watched_at = datetime.datetime(2024, day.month, day.day)
+    fields = movie_fields(db.session.get(Movie, tmdb_id))
+    db.session.add(Watched(user_id=1, tmdb_id=tmdb_id, watched_at=watched_at, **fields))
+    apply_changes(1, added=[(watched_at, fields)])
+    db.session.commit()
+
+
+def unwatch(tmdb_id):
+    record = Watched.query.filter_by(user_id=1, tmdb_id=tmdb_id).one()
+    apply_changes(1, removed=[(record.watched_at, counted_fields(record))])
+    db.session.delete(record)
+    db.session.commit()
+
+
+def test_incremental_updates_match_rebuild(app):
+    watch(1, datetime.date(2024, 1, 10))
+    watch(2, datetime.date(2024, 2, 3))
+    watch(3, datetime.date(2024, 2, 4))  # not stored: counts only towards total and month
+
+    unwatch(1)
+
+    stats = get_stats(1)
+    assert stats["count"] == 2
+    assert stats["average_rating"] == 6.0
+    assert stats["by_month"] == [{"month": "2024-02", "count": 2}]
+    assert stats["by_release_year"] == [{"year": 2010, "count": 1, "average_rating": 6.0}]
+    assert stats["by_genre"] == [{"genre_id": 18, "count": 1, "average_rating": 6.0}]
+
+    rebuild(db.session)
+    db.session.commit()
+    assert get_stats(1) == stats
+
+
+def test_stats_without_history(app):
+    assert get_stats(1) == {"user_id": 1, "count": 0, "average_rating": None,
+                            "by_month": [], "by_release_year": [], "by_genre": []}
+
+
+def test_removal_subtracts_what_was_counted_after_the_movie_changed(app):
+    watch(1, datetime.date(2024, 1, 10))
+    watch(2, datetime.date(2024, 1, 11))
+    # A background refresh changes the movies after they were counted
+    movie = db.session.get(Movie, 1)
+    movie.rating, movie.genres, movie.release_date = 2.0, [{"id": 35, "name": "Comédia"}], datetime.date(2001, 1, 1)
+    db.session.get(Movie, 2).genres = [{"id": 28, "name": "Ação"}]
+    db.session.commit()
+
+    unwatch(1)
+    stats = get_stats(1)
+    assert stats["count"] == 1
+    assert stats["average_rating"] == 6.0
+    assert stats["by_release_year"] == [{"year": 2010, "count": 1, "average_rating": 6.0}]
+    assert stats["by_genre"] == [{"genre_id": 18, "count": 1, "average_rating": 6.0}]
+
+    # A rebuild counts the current movie fields, and later removals subtract those
+    rebuild(db.session)
+    db.session.commit()
+    assert get_stats(1)["by_genre"] == [{"genre_id": 28, "count": 1, "average_rating": 6.0}]
+    unwatch(2)
+    assert get_stats(1) == {"user_id": 1, "count": 0, "average_rating": None,
+                            "by_month": [], "by_release_year": [], "by_genre": []}
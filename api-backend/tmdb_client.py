@@ -0,0 +1,445 @@
+"""
+Shared HTTP client for the TMDB API.
+
+A single ``TMDBClient`` (see ``extensions.tmdb``) replaces ad-hoc ``requests.get`` calls:
+it keeps a pooled keep-alive ``requests.Session`` per process, applies connect/read
+timeouts, retries 429 and 5xx responses with jittered exponential backoff and offers a
+bounded concurrent ``get_many()`` for bulk fetches.
+
+Failures are raised as the usual ``requests.exceptions.RequestException`` subclasses, so
+callers keep their existing error handling. Every attempt is counted and timed by route
+template in the /metrics endpoint (metrics.py).
+
+Each client has a ``CircuitBreaker``: once too many recent attempts failed or were slow it
+opens, and calls fail at once with ``CircuitOpenError`` (a ConnectionError) instead of holding
+a worker until their timeouts. After TMDB_BREAKER_OPEN_SECONDS a few probe calls go through
+(half-open); if they succeed the circuit closes again.
+
+``AsyncTMDBClient`` is the asyncio counterpart used by the ASGI serving mode (asgi.py).
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import TMDB_CIRCUIT_REJECTIONS, observe_tmdb, route_template
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling TMDB while the circuit breaker is open."""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds until the breaker lets probes through
+
+
+class CircuitPermit(NamedTuple):
+    """What CircuitBreaker.allow() hands to each call it lets through, to pass back to record()."""
+    probe: bool  # Holds one of the half-open probe slots
+    generation: int  # Half-open period the probe was granted in
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over the TMDB attempts of the last ``window`` seconds.
+
+    An attempt fails when it raises a network error or timeout, answers one of RETRY_STATUSES
+    or takes ``slow_call`` seconds or more. With at least ``min_calls`` attempts in the window
+    and ``error_rate`` of them failed, the circuit opens for ``open_seconds``; then up to
+    ``half_open_calls`` probes are let through, and it closes once that many succeeded (or
+    opens again on the first failure).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self):
+        self.enabled = True
+        self.window = 30.0
+        self.min_calls = 10
+        self.error_rate = 0.5
+        self.slow_call = 5.0
+        self.open_seconds = 30.0
+        self.half_open_calls = 2
+        self._lock = threading.Lock()
+        self._generation = 0  # Half-open periods so far; tells current probes from earlier ones
+        self.reset()
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown circuit breaker option: {name}")
+            setattr(self, name, value)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._calls = deque()  # (finished at, failed) within the window
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probes = 0  # Half-open probes in flight
+            self._probe_successes = 0
+
+    def allow(self):
+        """
+        A CircuitPermit when a call may go to TMDB now, None when it is rejected. Every permit
+        must be passed back exactly once, to record() or, for an abandoned call, release().
+        """
+        if not self.enabled:
+            return CircuitPermit(False, self._generation)
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return None
+                self.state = self.HALF_OPEN
+                self._generation += 1
+                self._probes = self._probe_successes = 0
+                logger.info("TMDB circuit half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_calls - self._probe_successes:
+                    return None
+                self._probes += 1
+                return CircuitPermit(True, self._generation)
+            return CircuitPermit(False, self._generation)
+
+    def _is_current_probe(self, permit):
+        return self.state == self.HALF_OPEN and permit.probe and permit.generation == self._generation
+
+    def release(self, permit):
+        """Gives back the probe slot of a call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            if self._is_current_probe(permit):
+                self._probes -= 1
+
+    def record(self, permit, ok, elapsed):
+        """Records the attempt ``permit`` was granted for: ``ok`` is False for errors and retryable statuses."""
+        if not self.enabled:
+            return
+        failed = not ok or elapsed >= self.slow_call
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if not self._is_current_probe(permit):
+                    return  # Started before this half-open period: it is not one of the probes
+                self._probes -= 1
+                if failed:
+                    self._open(now, "probe failed")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self.state = self.CLOSED
+                        self._calls.clear()
+                        self._failures = 0
+                        logger.info("TMDB circuit closed")
+                return
+            if self.state == self.OPEN:
+                return  # Started before the circuit opened
+            self._calls.append((now, failed))
+            self._failures += failed
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._failures -= self._calls.popleft()[1]
+            calls = len(self._calls)
+            if calls >= self.min_calls and self._failures >= calls * self.error_rate:
+                self._open(now, f"{self._failures} of the last {calls} calls failed or were slow")
+
+    def _open(self, now, reason):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._failures = 0
+        logger.warning(f"TMDB circuit open for {self.open_seconds:.0f}s: {reason}")
+
+    def retry_after(self):
+        """Seconds until the circuit lets probes through (0 unless open)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0
+            return max(0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "failures": self._failures,
+                "error_rate": round(self._failures / calls, 4) if calls else 0.0,
+            }
+
+
+class TMDBClient:
+    extension_name = "tmdb"
+
+    def __init__(self, app=None):
+        self.api_key = None
+        self.base_url = "https://api.themoviedb.org/3"
+        self.connect_timeout = 3.05
+        self.read_timeout = 10
+        self.max_retries = 2
+        self.backoff_base = 0.5
+        self.backoff_max = 8
+        self.pool_size = 10
+        self.max_concurrency = 8
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(
+            api_key=app.config.get("TMDB_API_KEY"),
+            base_url=app.config.get("TMDB_BASE_URL", self.base_url),
+            connect_timeout=app.config.get("TMDB_CONNECT_TIMEOUT", self.connect_timeout),
+            read_timeout=app.config.get("TMDB_READ_TIMEOUT", self.read_timeout),
+            max_retries=app.config.get("TMDB_MAX_RETRIES", self.max_retries),
+            backoff_base=app.config.get("TMDB_BACKOFF_BASE", self.backoff_base),
+            backoff_max=app.config.get("TMDB_BACKOFF_MAX", self.backoff_max),
+            pool_size=app.config.get("TMDB_POOL_SIZE", self.pool_size),
+            max_concurrency=app.config.get("TMDB_MAX_CONCURRENCY", self.max_concurrency),
+        )
+        self.breaker.configure(
+            enabled=app.config.get("TMDB_BREAKER_ENABLED", self.breaker.enabled),
+            window=app.config.get("TMDB_BREAKER_WINDOW", self.breaker.window),
+            min_calls=app.config.get("TMDB_BREAKER_MIN_CALLS", self.breaker.min_calls),
+            error_rate=app.config.get("TMDB_BREAKER_ERROR_RATE", self.breaker.error_rate),
+            slow_call=app.config.get("TMDB_BREAKER_SLOW_CALL", self.breaker.slow_call),
+            open_seconds=app.config.get("TMDB_BREAKER_OPEN_SECONDS", self.breaker.open_seconds),
+            half_open_calls=app.config.get("TMDB_BREAKER_HALF_OPEN_CALLS", self.breaker.half_open_calls),
+        )
+        app.extensions[self.extension_name] = self
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown TMDB client option: {name}")
+            setattr(self, name, value)
+        self.base_url = self.base_url.rstrip("/")
+        self.close()
+
+    @property
+    def session(self):
+        # Sessions (and their sockets) must not be shared with a forked gunicorn worker
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=max(self.pool_size, self.max_concurrency),
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._session_pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._session_pid = None
+
+    def _backoff(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _admit(self, path):
+        """The breaker permit for a call to ``path``; raises CircuitOpenError when it is rejected."""
+        permit = self.breaker.allow()
+        if permit is None:
+            TMDB_CIRCUIT_REJECTIONS.inc(route_template(path))
+            raise CircuitOpenError(f"TMDB circuit open, not calling {path}", self.breaker.retry_after())
+        return permit
+
+    def _attempted(self, path, status, started, permit):
+        """Records a finished attempt (``status`` is the HTTP code, "timeout" or "error"), once per permit."""
+        observe_tmdb(path, status, started)
+        self.breaker.record(
+            permit, isinstance(status, int) and status not in RETRY_STATUSES, time.perf_counter() - started
+        )
+
+    def get(self, path, params=None):
+        """
+        GETs ``path`` (e.g. "/movie/550") and returns the decoded JSON body.
+        Raises requests.exceptions.HTTPError for error statuses once retries are exhausted,
+        Timeout/ConnectionError for network failures and CircuitOpenError while the circuit
+        breaker is open.
+        """
+        params = {**(params or {}), "api_key": self.api_key}
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            permit = self._admit(path)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url, params=params, timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._attempted(
+                    path, "timeout" if isinstance(e, requests.exceptions.Timeout) else "error", started, permit
+                )
+                if last_attempt:
+                    raise
+                logger.warning(f"TMDB request to {path} failed ({e}), retrying")
+                time.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                self._attempted(path, "error", started, permit)
+                raise
+            self._attempted(path, response.status_code, started, permit)
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                logger.warning(f"TMDB returned {response.status_code} for {path}, retrying")
+                time.sleep(self._backoff(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def get_many(self, calls, max_workers=None):
+        """
+        Runs several GETs concurrently, with at most ``max_workers`` (default TMDB_MAX_CONCURRENCY)
+        in flight. ``calls`` is an iterable of (path, params) tuples; the result is a list in the
+        same order holding the JSON body of each call, or None when that call failed.
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+
+        def fetch(call):
+            path, params = call
+            try:
+                return self.get(path, params)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error fetching {path} from TMDB: {str(e)}")
+                return None
+
+        workers = min(max_workers or self.max_concurrency, len(calls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fetch, calls))
+
+
+class AsyncTMDBClient(TMDBClient):
+    """
+    asyncio version of TMDBClient with the same options and retry policy, built on an
+    ``aiohttp.ClientSession`` (optional dependency: ``pip install -e .[async]``). Errors are
+    translated to the requests exceptions TMDBClient raises, so callers handle both alike.
+
+    Unlike the thread-bound sync pool, one event loop multiplexes every in-flight call over
+    up to TMDB_ASYNC_MAX_CONNECTIONS connections.
+    """
+    extension_name = "tmdb_async"
+
+    def __init__(self, app=None):
+        self.max_connections = 100
+        self._client = None
+        self._client_loop = None
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.max_connections = app.config.get("TMDB_ASYNC_MAX_CONNECTIONS", self.max_connections)
+        super().init_app(app)
+
+    @property
+    def client(self):
+        # aiohttp sessions are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            import aiohttp
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout),
+            )
+            self._client_loop = loop
+        return self._client
+
+    def close(self):
+        # Called by configure(); the session itself can only be closed from its loop (aclose)
+        self._client = None
+        self._client_loop = None
+
+    async def aclose(self):
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None:
+            await client.close()
+
+    async def get(self, path, params=None):
+        """Async version of TMDBClient.get, raising the same requests exceptions."""
+        import aiohttp
+        # Encoded like requests does: None values dropped, booleans as "True"/"False"
+        params = {
+            name: str(value) if isinstance(value, bool) else value
+            for name, value in {**(params or {}), "api_key": self.api_key}.items()
+            if value is not None
+        }
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            permit = self._admit(path)
+            started = time.perf_counter()
+            # The attempt is recorded once it is over, body included: a body that fails to
+            # download or decode is one failed attempt, not a success and then a failure
+            try:
+                async with self.client.get(url, params=params) as response:
+                    if response.status < 400:
+                        data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._attempted(path, "timeout" if isinstance(e, asyncio.TimeoutError) else "error", started, permit)
+                if last_attempt:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise requests.exceptions.Timeout(f"TMDB request to {path} timed out") from e
+                    raise requests.exceptions.ConnectionError(f"TMDB request to {path} failed: {e!r}") from e
+                logger.warning(f"TMDB request to {path} failed ({e!r}), retrying")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except asyncio.CancelledError:
+                self.breaker.release(permit)
+                raise
+            except BaseException:
+                self._attempted(path, "error", started, permit)
+                raise
+            self._attempted(path, response.status, started, permit)
+            if response.status in RETRY_STATUSES and not last_attempt:
+                logger.warning(f"TMDB returned {response.status} for {path}, retrying")
+                await asyncio.sleep(self._backoff(attempt, response))
+                continue
+            if response.status >= 400:
+                # Carries a requests Response with the status, like raise_for_status() does
+                error_response = requests.Response()
+                error_response.status_code, error_response.reason = response.status, response.reason
+                error_response.url = f"{self.base_url}{path}"
+                raise requests.exceptions.HTTPError(
+                    f"{response.status} {response.reason} for url: {self.base_url}{path}", response=error_response
+                )
+            return data
+
+    async def get_many(self, calls, max_workers=None):
+        """Async version of TMDBClient.get_many: results in order, None for failed calls."""
+        semaphore = asyncio.Semaphore(max_workers or self.max_concurrency)
+
+        async def fetch(path, params):
+            async with semaphore:
+                try:
+                    return await self.get(path, params)
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Error fetching {path} from TMDB: {str(e)}")
+                    return None
+
+        return list(await asyncio.gather(*(fetch(path, params) for path, params in calls)))
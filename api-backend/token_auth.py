@@ -0,0 +1,131 @@
+"""
+Bearer token issuing and verification.
+
+Verified tokens are kept in a bounded LRU keyed by the SHA-256 of the token, so repeated
+requests with the same token skip the HMAC check and JSON decoding until the token's ``exp``.
+
+Tokens carry the user's ``token_version`` in a ``tv`` claim; bumping the column (password
+reset, "log out everywhere") revokes every token issued before. The current version is read
+from a per-worker cache with a short TTL (AUTH_TOKEN_VERSION_TTL seconds) instead of a
+query per request, so other workers reject revoked tokens within that many seconds.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+class TokenCache:
+    """Thread-safe LRU of decoded token payloads keyed by token hash, each held until its exp."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, token, payload):
+        expires_at = payload.get("exp")
+        if not self.max_entries or not isinstance(expires_at, (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenVerifier:
+    def __init__(self, app=None):
+        self.app = None
+        self.tokens = TokenCache()
+        self.check_version = True
+        self.version_ttl = 30.0
+        self._versions = {}
+        self._versions_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.tokens = TokenCache(app.config.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+        self.check_version = app.config.get("AUTH_CHECK_TOKEN_VERSION", True)
+        self.version_ttl = app.config.get("AUTH_TOKEN_VERSION_TTL", 30.0)
+        app.extensions["token_verifier"] = self
+
+    def issue(self, user, expires_in):
+        """Signs a token for ``user`` valid for the ``expires_in`` timedelta."""
+        return jwt.encode({
+            'user_id': user.id,
+            'tv': user.token_version or 0,
+            'exp': datetime.datetime.now(datetime.timezone.utc) + expires_in
+        }, self.app.config['SECRET_KEY'], algorithm="HS256")
+
+    def verify(self, token):
+        """
+        Returns the payload of a valid token. Raises jwt.ExpiredSignatureError or
+        jwt.InvalidTokenError (also for revoked tokens), like jwt.decode.
+        """
+        payload = self.tokens.get(token)
+        if payload is None:
+            payload = jwt.decode(token, self.app.config['SECRET_KEY'], algorithms=["HS256"])
+            self.tokens.set(token, payload)
+        if self.check_version and payload.get("tv", 0) != self.current_version(payload.get("user_id")):
+            raise jwt.InvalidTokenError("Token has been revoked")
+        return payload
+
+    def current_version(self, user_id):
+        """The user's token_version, cached for version_ttl seconds; None if the user is gone."""
+        now = time.monotonic()
+        with self._versions_lock:
+            cached = self._versions.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        from extensions import db
+        from models import User
+        version = db.session.query(User.token_version).filter(User.id == user_id).scalar()
+        with self._versions_lock:
+            if len(self._versions) >= self.tokens.max_entries:
+                self._versions.clear()
+            self._versions[user_id] = (version, now + self.version_ttl)
+        return version
+
+    def revoke_all(self, user_id):
+        """
+        Invalidates every token issued to the user so far by bumping User.token_version and
+        committing the session. Takes effect immediately in this worker.
+        """
+        from extensions import db
+        from models import User
+        User.query.filter_by(id=user_id).update({"token_version": User.token_version + 1})
+        db.session.commit()
+        with self._versions_lock:
+            self._versions.pop(user_id, None)
@@ -1,10 +1,25 @@
 from functools import wraps
+import base64
 import datetime
+import json
+import re
 import jwt
 import requests
 from flask import request, jsonify, current_app
-from extensions import db
-from models import Movie # Assuming Movie model is needed for _save_movie_details_if_not_exist
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from extensions import auth_tokens, db, metrics, tmdb
+from metrics import MOVIE_STORE_LOOKUPS
+from models import DEFAULT_LANGUAGE, Movie, MovieExtra, MovieTranslation, utcnow # Assuming Movie model is needed for _save_movie_details_if_not_exist
+from singleflight import SingleFlight
+
+# Concurrent misses for the same (tmdb_id, language) in this worker share one TMDB fetch and insert
+_movie_fetch_flight = SingleFlight()
+
+LANGUAGE_PATTERN = re.compile(r"^[a-z]{2}(-[A-Z]{2})?$")
+
+# Upper bound for the ``limit`` of keyset-paginated routes
+MAX_PAGE_SIZE = 500
 
 def require_user_match(func):
     @wraps(func)
@@ -14,7 +29,7 @@ def require_user_match(func):
             return jsonify({"msg": "Missing or invalid token"}), 401
         token = auth.split(" ")[1]
         try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+            payload = auth_tokens.verify(token) # Cached per token until exp, plus the token_version check
         except jwt.ExpiredSignatureError:
             return jsonify({"msg": "Token has expired"}), 401
         except jwt.InvalidTokenError:
@@ -29,58 +44,319 @@ def require_user_match(func):
         return func(*args, **kwargs)
     return wrapper
 
-def _get_tmdb_movie_details_internal(tmdb_id):
-    TMDB_API_KEY = current_app.config.get("TMDB_API_KEY")
-    TMDB_BASE_URL = current_app.config.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
-    if not TMDB_API_KEY:
+def require_metrics_token(func):
+    """Internal diagnostics: same ``Bearer <METRICS_TOKEN>`` as /metrics (open when it is unset)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not metrics.authorized(request):
+            return jsonify({"msg": "Missing or invalid token"}), 401
+        return func(*args, **kwargs)
+    return wrapper
+
+def _get_tmdb_movie_details_internal(tmdb_id, language=DEFAULT_LANGUAGE):
+    if not tmdb.api_key:
         print("ALERT: TMDB_API_KEY is not configured (internal).")
         return None
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{tmdb_id}?api_key={TMDB_API_KEY}&language=pt-BR"
-        )
-        response.raise_for_status()
-        return response.json()
+        return tmdb.get(f"/movie/{tmdb_id}", {"language": language})
     except requests.exceptions.RequestException as e:
         print(f"Error fetching movie details for {tmdb_id} from TMDB (internal): {str(e)}")
         return None
 
-def _save_movie_details_if_not_exist(tmdb_id):
+def _get_tmdb_movies_details_concurrently(tmdb_ids, language=DEFAULT_LANGUAGE):
     """
-    Checks if a movie exists in the local DB. If not, fetches from TMDB and saves it.
-    Returns the Movie object or None if fetching fails.
+    Fetches details for several movies from TMDB in parallel, bounded by TMDB_MAX_CONCURRENCY.
+    Returns a dict of tmdb_id -> details; movies that could not be fetched are left out.
     """
-    movie = db.session.get(Movie, tmdb_id) # Use db.session.get for primary key lookup
-    if movie:
-        return movie
+    tmdb_ids = list(dict.fromkeys(tmdb_ids))
+    if not tmdb_ids or not tmdb.api_key:
+        return {}
+    results = tmdb.get_many((f"/movie/{tmdb_id}", {"language": language}) for tmdb_id in tmdb_ids)
+    return {tmdb_id: details for tmdb_id, details in zip(tmdb_ids, results) if details}
 
-    tmdb_details = _get_tmdb_movie_details_internal(tmdb_id)
-    if not tmdb_details:
-        return None
+def _insert_ignore(model, rows):
+    """
+    Inserts rows, silently skipping those whose primary key or unique constraint already
+    exists, so concurrent writers never surface an IntegrityError.
+    Returns the number of rows actually inserted.
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).prefix_with("IGNORE")
+    else:
+        inserted = 0
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert(), row)
+                inserted += 1
+            except IntegrityError:
+                pass
+        return inserted
+    if len(rows) == 1:
+        return db.session.execute(stmt, rows[0]).rowcount
+    return db.session.execute(stmt, rows).rowcount
 
+def _movie_values_from_tmdb_details(tmdb_details):
+    """Maps a TMDB /movie/{id} payload to Movie column values."""
     release_date_str = tmdb_details.get("release_date")
     release_date_obj = None
     if release_date_str:
         try:
             release_date_obj = datetime.datetime.strptime(release_date_str, "%Y-%m-%d").date()
         except ValueError:
-            print(f"Warning: Could not parse release_date '{release_date_str}' for tmdb_id {tmdb_id}")
+            print(f"Warning: Could not parse release_date '{release_date_str}' for tmdb_id {tmdb_details.get('id')}")
             release_date_obj = None
 
-    new_movie = Movie(
-        tmdb_id=tmdb_details.get("id"),
-        title=tmdb_details.get("title"),
-        overview=tmdb_details.get("overview"),
-        poster_path=tmdb_details.get("poster_path"),
-        release_date=release_date_obj,
-        rating=tmdb_details.get("vote_average"),
-        genres=tmdb_details.get("genres")
-    )
-    db.session.add(new_movie)
+    return {
+        "tmdb_id": tmdb_details.get("id"),
+        "title": tmdb_details.get("title"),
+        "overview": tmdb_details.get("overview"),
+        "poster_path": tmdb_details.get("poster_path"),
+        "release_date": release_date_obj,
+        "rating": tmdb_details.get("vote_average"),
+        "genres": tmdb_details.get("genres"),
+        "runtime": tmdb_details.get("runtime"),
+        "original_title": tmdb_details.get("original_title"),
+        "adult": tmdb_details.get("adult"),
+        "fetched_at": utcnow()
+    }
+
+def _translation_values_from_tmdb_details(tmdb_details, language):
+    """Maps a TMDB /movie/{id} payload fetched in ``language`` to MovieTranslation column values."""
+    return {
+        "tmdb_id": tmdb_details.get("id"),
+        "language": language,
+        "title": tmdb_details.get("title") or tmdb_details.get("original_title") or "",
+        "overview": tmdb_details.get("overview"),
+        "poster_path": tmdb_details.get("poster_path"),
+        "genres": tmdb_details.get("genres"),
+        "fetched_at": utcnow()
+    }
+
+def _movie_extra_rows(tmdb_id, language, sections, tmdb_details):
+    """MovieExtra rows for the requested sections present in a TMDB payload."""
+    now = utcnow()
+    return [
+        {"tmdb_id": tmdb_id, "language": language, "section": section,
+         "payload": tmdb_details[section], "fetched_at": now}
+        for section in sections if section in tmdb_details
+    ]
+
+def _movie_to_dict(movie, translation=None):
+    """
+    Serializes a Movie using the same field names as the TMDB details payload, with the
+    localized fields taken from ``translation`` when one is given.
+    """
+    localized = translation or movie
+    return {
+        "id": movie.tmdb_id,
+        "title": localized.title,
+        "overview": localized.overview,
+        "poster_path": localized.poster_path or movie.poster_path,
+        "release_date": movie.release_date.isoformat() if movie.release_date else None,
+        "vote_average": movie.rating,
+        "genres": localized.genres,
+        "runtime": movie.runtime
+    }
+
+def _fetch_and_store_movie(tmdb_id, language=DEFAULT_LANGUAGE):
+    """
+    Fetches a movie from TMDB and stores it (as a Movie row for DEFAULT_LANGUAGE, a
+    MovieTranslation otherwise) with an insert-or-ignore, so losing a race against another
+    worker is not an error. Returns True if the movie is now stored.
+    """
+    tmdb_details = _get_tmdb_movie_details_internal(tmdb_id, language)
+    if not tmdb_details:
+        return False
     try:
+        if language == DEFAULT_LANGUAGE:
+            _insert_ignore(Movie, [_movie_values_from_tmdb_details(tmdb_details)])
+        else:
+            _insert_ignore(MovieTranslation, [_translation_values_from_tmdb_details(tmdb_details, language)])
         db.session.commit()
-        return new_movie
+        return True
     except Exception as e:
         db.session.rollback()
-        print(f"Error saving movie {tmdb_id} to database: {str(e)}")
+        print(f"Error saving movie {tmdb_id} ({language}) to database: {str(e)}")
+        return False
+
+def _save_movie_details_if_not_exist(tmdb_id):
+    """
+    Checks if a movie exists in the local DB. If not, fetches from TMDB and saves it.
+    Concurrent requests for the same missing movie wait for a single fetch and insert.
+    Returns the Movie object or None if fetching fails.
+    """
+    movie = db.session.get(Movie, tmdb_id) # Use db.session.get for primary key lookup
+    if movie:
+        MOVIE_STORE_LOOKUPS.inc("hit")
+        return movie
+
+    key = (tmdb_id, DEFAULT_LANGUAGE)
+    if not _movie_fetch_flight.do(key, lambda: _fetch_and_store_movie(tmdb_id)):
+        MOVIE_STORE_LOOKUPS.inc("failed")
         return None
+    MOVIE_STORE_LOOKUPS.inc("fetched")
+    # End the read transaction started by the lookup above: under REPEATABLE READ (MySQL)
+    # it would otherwise keep hiding the row committed by the thread that did the fetch.
+    db.session.commit()
+    return db.session.get(Movie, tmdb_id)
+
+def _save_movie_translation_if_not_exist(tmdb_id, language):
+    """
+    Same as _save_movie_details_if_not_exist for the localized fields of a non-default language.
+    Returns the MovieTranslation object or None if fetching fails.
+    """
+    translation = db.session.get(MovieTranslation, (tmdb_id, language))
+    if translation:
+        return translation
+
+    key = (tmdb_id, language)
+    if not _movie_fetch_flight.do(key, lambda: _fetch_and_store_movie(tmdb_id, language)):
+        return None
+    db.session.commit()
+    return db.session.get(MovieTranslation, (tmdb_id, language))
+
+def _save_movies_details_if_not_exist(tmdb_ids):
+    """
+    Bulk version of _save_movie_details_if_not_exist: resolves every id with a single
+    IN (...) query, fetches only the misses from TMDB concurrently and saves them in one commit.
+    Returns a dict of tmdb_id -> Movie for the movies that could be resolved.
+    """
+    tmdb_ids = list(dict.fromkeys(tmdb_ids))
+    if not tmdb_ids:
+        return {}
+    movies = {m.tmdb_id: m for m in Movie.query.filter(Movie.tmdb_id.in_(tmdb_ids)).all()}
+    missing_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in movies]
+    if not missing_ids:
+        return movies
+
+    fetched = _get_tmdb_movies_details_concurrently(missing_ids)
+    try:
+        _insert_ignore(Movie, [_movie_values_from_tmdb_details(details) for details in fetched.values()])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving movies {missing_ids} to database: {str(e)}")
+        return movies
+    stored = Movie.query.filter(Movie.tmdb_id.in_(list(fetched))).all()
+    movies.update({m.tmdb_id: m for m in stored})
+    return movies
+
+def _save_movie_translations_if_not_exist(tmdb_ids, language):
+    """
+    Bulk version of _save_movie_translation_if_not_exist, following the same single
+    IN (...) query / concurrent fetch of the misses / single commit pattern.
+    Returns a dict of tmdb_id -> MovieTranslation.
+    """
+    tmdb_ids = list(dict.fromkeys(tmdb_ids))
+    if not tmdb_ids:
+        return {}
+    query = MovieTranslation.query.filter(MovieTranslation.language == language)
+    translations = {t.tmdb_id: t for t in query.filter(MovieTranslation.tmdb_id.in_(tmdb_ids))}
+    missing_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in translations]
+    if not missing_ids:
+        return translations
+
+    fetched = _get_tmdb_movies_details_concurrently(missing_ids, language)
+    try:
+        _insert_ignore(MovieTranslation, [
+            _translation_values_from_tmdb_details(details, language) for details in fetched.values()
+        ])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving {language} translations {missing_ids} to database: {str(e)}")
+        return translations
+    stored = query.filter(MovieTranslation.tmdb_id.in_(list(fetched))).all()
+    translations.update({t.tmdb_id: t for t in stored})
+    return translations
+
+def _get_movie_extras(movie, sections, language=DEFAULT_LANGUAGE):
+    """
+    Returns {section: payload} for the append_to_response sections of a stored movie.
+    Sections already in MovieExtra are served locally; only the missing ones are fetched
+    from TMDB (in a single call) and stored. Raises requests exceptions on TMDB failures.
+    """
+    sections = list(dict.fromkeys(sections))
+    extras = {
+        extra.section: extra.payload for extra in MovieExtra.query.filter(
+            MovieExtra.tmdb_id == movie.tmdb_id,
+            MovieExtra.language == language,
+            MovieExtra.section.in_(sections)
+        )
+    }
+    missing = [section for section in sections if section not in extras]
+    if not missing:
+        return extras
+
+    tmdb_details = tmdb.get(
+        f"/movie/{movie.tmdb_id}",
+        {"language": language, "append_to_response": ",".join(missing)}
+    )
+    rows = _movie_extra_rows(movie.tmdb_id, language, missing, tmdb_details)
+    extras.update({row["section"]: row["payload"] for row in rows})
+    try:
+        _insert_ignore(MovieExtra, rows)
+        if movie.runtime is None and tmdb_details.get("runtime"):
+            movie.runtime = tmdb_details["runtime"]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving extras {missing} for movie {movie.tmdb_id}: {str(e)}")
+    return extras
+
+def _encode_cursor(values):
+    """Opaque cursor for keyset pagination: the sort key of the last row returned."""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError("cursor must encode a list")
+    return values
+
+def _page_args():
+    """
+    Reads the optional ``limit`` and ``cursor`` query parameters of a keyset-paginated route.
+    Returns (limit, cursor_values, error); limit is None when the client did not ask for
+    pagination, in which case the route returns every row as before.
+    """
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is None and cursor is None:
+        return None, None, None
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    except ValueError:
+        return None, None, "limit must be an integer"
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, None, f"limit must be between 1 and {MAX_PAGE_SIZE}"
+    if not cursor:
+        return limit, None, None
+    try:
+        return limit, _decode_cursor(cursor), None
+    except (ValueError, TypeError):
+        return None, None, "Invalid cursor"
+
+def _keyset_page(query, limit, sort_key):
+    """
+    Runs ``query`` (already ordered and filtered past the cursor) and returns (rows, next_cursor).
+    One extra row is fetched to tell whether another page exists; ``sort_key(row)`` gives the
+    JSON-serializable values the next page continues after.
+    """
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor(sort_key(rows[-1]))
@@ -0,0 +1,183 @@
+"""
+Background catalog warmer.
+
+Pre-populates the local Movie table so the first viewer of a title does not pay the TMDB
+latency. It collects IDs from the popular and trending TMDB listings plus every tmdb_id
+referenced by MovieList or Watched rows that has no Movie row yet, then fetches the missing
+details with bounded concurrency, paced to stay under the TMDB rate limit.
+
+Run it once or as a scheduled worker through the Flask CLI:
+
+    python -m flask --app app warm-catalog --pages 5
+    python -m flask --app app warm-catalog --pages 5 --languages pt-BR,en-US --interval 3600
+"""
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from extensions import db, tmdb
+from models import DEFAULT_LANGUAGE, Movie, MovieList, MovieTranslation, Watched
+from utils import (
+    LANGUAGE_PATTERN, _insert_ignore, _movie_values_from_tmdb_details, _translation_values_from_tmdb_details
+)
+
+
+def referenced_missing_ids():
+    """tmdb_ids used in lists or watched history that have no Movie row."""
+    referenced = db.session.query(MovieList.tmdb_id.label("tmdb_id")).union(
+        db.session.query(Watched.tmdb_id.label("tmdb_id"))
+    ).subquery()
+    rows = (
+        db.session.query(referenced.c.tmdb_id)
+        .outerjoin(Movie, Movie.tmdb_id == referenced.c.tmdb_id)
+        .filter(Movie.tmdb_id.is_(None))
+    )
+    return [tmdb_id for (tmdb_id,) in rows]
+
+
+def listed_ids(pages, language=DEFAULT_LANGUAGE):
+    """tmdb_ids of the first ``pages`` pages of the popular and weekly trending listings."""
+    calls = []
+    for page in range(1, pages + 1):
+        calls.append(("/discover/movie", {
+            "language": language,
+            "sort_by": "popularity.desc",
+            "include_adult": False,
+            "page": page,
+        }))
+        calls.append(("/trending/movie/week", {"language": language, "page": page}))
+    ids = []
+    for data in tmdb.get_many(calls):
+        for movie in (data or {}).get("results", []):
+            if not movie.get("adult", False):
+                ids.append(movie["id"])
+    return list(dict.fromkeys(ids))
+
+
+def _pace(started, calls, requests_per_second):
+    """Sleeps so that ``calls`` made since ``started`` average at most ``requests_per_second``."""
+    if requests_per_second:
+        elapsed = time.monotonic() - started
+        min_duration = calls / requests_per_second
+        if elapsed < min_duration:
+            time.sleep(min_duration - elapsed)
+
+
+def warm_movies(tmdb_ids, batch_size=100, requests_per_second=20, languages=(DEFAULT_LANGUAGE,), progress=None):
+    """
+    Fetches and stores the given movies that are not in the Movie table yet, plus their
+    MovieTranslation rows for every other language in ``languages``.
+    Batches are fetched concurrently and then paced so that on average no more than
+    ``requests_per_second`` TMDB calls are made. Returns a dict with counters.
+    """
+    stats = {"requested": 0, "already_stored": 0, "inserted": 0, "translated": 0, "failed": 0}
+    tmdb_ids = list(dict.fromkeys(tmdb_ids))
+    for start in range(0, len(tmdb_ids), batch_size):
+        chunk = tmdb_ids[start:start + batch_size]
+        stats["requested"] += len(chunk)
+        stored = {
+            tmdb_id for (tmdb_id,) in
+            db.session.query(Movie.tmdb_id).filter(Movie.tmdb_id.in_(chunk))
+        }
+        stats["already_stored"] += len(stored)
+        missing = [tmdb_id for tmdb_id in chunk if tmdb_id not in stored]
+
+        started = time.monotonic()
+        calls = 0
+        if missing:
+            results = tmdb.get_many((f"/movie/{tmdb_id}", {"language": DEFAULT_LANGUAGE}) for tmdb_id in missing)
+            calls += len(missing)
+            rows = [_movie_values_from_tmdb_details(details) for details in results if details]
+            stats["failed"] += len(missing) - len(rows)
+            stored.update(row["tmdb_id"] for row in rows)
+            try:
+                stats["inserted"] += _insert_ignore(Movie, rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                stats["failed"] += len(rows)
+                print(f"Error saving warmed movies to database: {str(e)}")
+
+        for language in languages:
+            if language == DEFAULT_LANGUAGE:
+                continue
+            translated = {
+                tmdb_id for (tmdb_id,) in db.session.query(MovieTranslation.tmdb_id).filter(
+                    MovieTranslation.language == language, MovieTranslation.tmdb_id.in_(chunk)
+                )
+            }
+            untranslated = [tmdb_id for tmdb_id in chunk if tmdb_id in stored and tmdb_id not in translated]
+            if not untranslated:
+                continue
+            results = tmdb.get_many((f"/movie/{tmdb_id}", {"language": language}) for tmdb_id in untranslated)
+            calls += len(untranslated)
+            rows = [_translation_values_from_tmdb_details(details, language) for details in results if details]
+            stats["failed"] += len(untranslated) - len(rows)
+            try:
+                stats["translated"] += _insert_ignore(MovieTranslation, rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                stats["failed"] += len(rows)
+                print(f"Error saving warmed {language} translations to database: {str(e)}")
+
+        if calls:
+            if progress:
+                progress(stats)
+            _pace(started, calls, requests_per_second)
+    return stats
+
+
+def warm_catalog(pages=5, batch_size=100, requests_per_second=20, languages=(DEFAULT_LANGUAGE,), progress=None):
+    """One warm-up pass: referenced-but-missing movies first, then popular and trending."""
+    tmdb_ids = referenced_missing_ids()
+    if pages:
+        tmdb_ids += listed_ids(pages)
+    return warm_movies(tmdb_ids, batch_size, requests_per_second, languages, progress=progress)
+
+
+def _parse_languages(ctx, param, value):
+    """Splits --languages, rejecting codes the routes would reject as ?language= too."""
+    languages = [language.strip() for language in value.split(",") if language.strip()]
+    invalid = [language for language in languages if not LANGUAGE_PATTERN.match(language)]
+    if invalid or not languages:
+        raise click.BadParameter(
+            f"invalid language {', '.join(invalid) or value!r}, expected codes such as pt-BR or en-US"
+        )
+    return list(dict.fromkeys(languages))
+
+
+@click.command("warm-catalog")
+@click.option("--pages", default=5, show_default=True, help="Pages of popular and trending movies to load.")
+@click.option("--batch-size", default=100, show_default=True, help="Movies fetched and inserted per batch.")
+@click.option("--rate", "requests_per_second", default=20.0, show_default=True, help="Average TMDB requests per second.")
+@click.option(
+    "--languages", default=DEFAULT_LANGUAGE, show_default=True, callback=_parse_languages,
+    help="Comma-separated languages to store, e.g. pt-BR,en-US.",
+)
+@click.option("--interval", default=0, show_default=True, help="Repeat every N seconds (0 runs once).")
+@with_appcontext
+def warm_catalog_command(pages, batch_size, requests_per_second, languages, interval):
+    """Pre-populate the local Movie table from TMDB."""
+    if not tmdb.api_key:
+        raise click.ClickException("TMDB_API_KEY is not configured")
+
+    def progress(stats):
+        click.echo(
+            f"  {stats['requested']} checked, {stats['inserted']} inserted, "
+            f"{stats['translated']} translations, {stats['already_stored']} already stored, "
+            f"{stats['failed']} failed"
+        )
+
+    while True:
+        click.echo("Warming movie catalog...")
+        stats = warm_catalog(pages, batch_size, requests_per_second, languages, progress=progress)
+        click.echo(
+            f"Done: {stats['inserted']} movies and {stats['translated']} translations inserted, "
+            f"{stats['failed']} failed."
+        )
+        if not interval:
+            break
+        db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,399 @@
+"""
+Bulk import and export of the watched history and the user's lists.
+
+Imports stream a CSV (Letterboxd or IMDb export, or our own export) or JSON file (an array
+or newline-delimited objects) without loading it whole. Entries are processed in chunks:
+IMDb ids and titles are resolved to tmdb_ids with one batch of concurrent TMDB lookups,
+missing Movie rows are fetched in bulk, and Watched, WatchedSummary and the "Assistidos"
+list are written with insert-or-ignore and a single commit per chunk. Movies already in
+the history keep their current date. An entry with a ``list`` column (or key) is not a
+watched entry: the movie is added to the user's list of that name, which is created when
+missing. Progress is reported after every chunk.
+
+Exports stream the history, then the movies of every list except "Assistidos" (which
+mirrors the history), as CSV or a JSON array in fixed-size chunks, reading the rows with
+a server-side cursor, so memory use does not depend on the size of the history.
+
+    python -m flask --app app import-watched --user-id 42 letterboxd-diary.csv
+    python -m flask --app app export-watched --user-id 42 --format json backup.json
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+import re
+
+import click
+from flask.cli import with_appcontext
+
+from sqlalchemy import null, or_
+
+from extensions import db, tmdb
+from models import List, Movie, MovieList, User, Watched
+from utils import _insert_ignore, _save_movies_details_if_not_exist
+from watched_stats import apply_changes, movie_fields
+
+IMPORT_CHUNK_SIZE = 200
+EXPORT_CHUNK_SIZE = 1000
+FORMATS = ("csv", "json")
+EXPORT_FIELDS = ["tmdb_id", "title", "year", "watched_at", "list"]
+MAX_UNRESOLVED_REPORTED = 100
+
+IMDB_ID_PATTERN = re.compile(r"^tt\d+$")
+
+# Accepted column names (lowercase), in order of preference. Covers our own export,
+# Letterboxd (Name, Year, Date, Watched Date) and IMDb (Const, Title, Year, Date Rated, Title Type).
+FIELD_ALIASES = {
+    "tmdb_id": ("tmdb_id", "tmdbid", "tmdb id"),
+    "imdb_id": ("imdb_id", "imdbid", "imdb id", "const"),
+    "title": ("title", "name"),
+    "year": ("year",),
+    "watched_at": ("watched_at", "watched date", "date rated", "date"),
+    "title_type": ("title type",),
+    "list": ("list", "list name"),
+}
+MOVIE_TITLE_TYPES = ("movie", "tvmovie", "video")
+
+
+def guess_format(filename=None, mimetype=None):
+    """'csv' or 'json' from a file name or content type, None if neither matches."""
+    name = (filename or "").lower()
+    for fmt in FORMATS:
+        if name.endswith(f".{fmt}") or (mimetype or "").endswith(f"/{fmt}"):
+            return fmt
+    if name.endswith((".ndjson", ".jsonl")) or mimetype == "application/x-ndjson":
+        return "json"
+    return None
+
+
+def _text_stream(stream):
+    if not hasattr(stream, "read1"):
+        stream = io.BufferedReader(stream)
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def read_csv(stream):
+    """Yields the rows of a binary CSV stream as dicts keyed by the header."""
+    yield from csv.DictReader(_text_stream(stream))
+
+
+def read_json(stream, chunk_size=64 * 1024):
+    """
+    Yields the objects of a binary JSON stream holding either an array of objects or
+    newline-delimited objects, decoding them one at a time. Raises ValueError on bad JSON.
+    """
+    decoder = json.JSONDecoder()
+    text = _text_stream(stream)
+    buffer, eof = "", False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,[]")
+        if buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON: {e}")
+                obj = None
+            else:
+                buffer = buffer[end:]
+                yield obj
+                continue
+        elif eof:
+            return
+        chunk = text.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_records(stream, fmt):
+    return read_csv(stream) if fmt == "csv" else read_json(stream)
+
+
+def _int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_watched_at(value):
+    try:
+        day = datetime.date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def normalize_record(record):
+    """
+    Maps an imported record to {tmdb_id, imdb_id, title, year, watched_at, list}, or None when it
+    has nothing to identify a movie by or is not a movie (IMDb "Title Type").
+    """
+    if not isinstance(record, dict):
+        return None
+    fields = {str(key).strip().lower(): value for key, value in record.items()}
+
+    def pick(field):
+        for alias in FIELD_ALIASES[field]:
+            value = fields.get(alias)
+            if value not in (None, ""):
+                return value
+        return None
+
+    title_type = pick("title_type")
+    if title_type and str(title_type).replace(" ", "").lower() not in MOVIE_TITLE_TYPES:
+        return None
+    imdb_id = str(pick("imdb_id") or "").strip()
+    title = str(pick("title") or "").strip()
+    list_name = str(pick("list") or "").strip()[:150]
+    entry = {
+        "tmdb_id": _int(pick("tmdb_id")),
+        "imdb_id": imdb_id if IMDB_ID_PATTERN.match(imdb_id) else None,
+        "title": title or None,
+        "year": _int(pick("year")),
+        "watched_at": _parse_watched_at(pick("watched_at")),
+        "list": list_name or None,
+    }
+    if not (entry["tmdb_id"] or entry["imdb_id"] or entry["title"]):
+        return None
+    return entry
+
+
+def resolve_tmdb_ids(entries):
+    """
+    Fills in ``tmdb_id`` for the entries that only have an IMDb id (TMDB /find) or a title
+    and year (TMDB /search/movie, first result), with one batch of concurrent lookups.
+    """
+    pending = [entry for entry in entries if not entry["tmdb_id"]]
+    calls = []
+    for entry in pending:
+        if entry["imdb_id"]:
+            calls.append((f"/find/{entry['imdb_id']}", {"external_source": "imdb_id"}))
+        else:
+            params = {"query": entry["title"], "include_adult": False}
+            if entry["year"]:
+                params["year"] = entry["year"]
+            calls.append(("/search/movie", params))
+    if not calls or not tmdb.api_key:
+        return
+    for entry, data in zip(pending, tmdb.get_many(calls)):
+        results = (data or {}).get("movie_results" if entry["imdb_id"] else "results") or []
+        if results:
+            entry["tmdb_id"] = results[0]["id"]
+
+
+def _describe(entry):
+    if entry["imdb_id"]:
+        return entry["imdb_id"]
+    return f"{entry['title']} ({entry['year']})" if entry["year"] else entry["title"]
+
+
+def _list_id(user_id, name, list_ids, created):
+    """Id of the user's list called ``name``, created when missing (its name is added to ``created``)."""
+    if name not in list_ids:
+        user_list = List.query.filter_by(user_id=user_id, name=name).order_by(List.is_main.desc()).first()
+        if user_list is None:
+            user_list = List(name=name, is_main=False, user_id=user_id)
+            db.session.add(user_list)
+            db.session.flush()
+            created.append(name)
+        list_ids[name] = user_list.id
+    return list_ids[name]
+
+
+def _import_chunk(user_id, entries, watched_list_id, list_ids, stats, unresolved):
+    resolve_tmdb_ids(entries)
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time.min, tzinfo=datetime.timezone.utc)
+    latest = {}
+    listed = {}  # (list name, tmdb_id) -> None, in file order
+    for entry in entries:
+        tmdb_id = entry["tmdb_id"]
+        if not tmdb_id:
+            stats["unresolved"] += 1
+            if len(unresolved) < MAX_UNRESOLVED_REPORTED:
+                unresolved.append(_describe(entry))
+            continue
+        if entry["list"]:
+            if (entry["list"], tmdb_id) in listed:
+                stats["duplicates"] += 1
+            listed[(entry["list"], tmdb_id)] = None
+            continue
+        watched_at = entry["watched_at"] or today
+        if tmdb_id in latest:
+            stats["duplicates"] += 1
+            watched_at = max(watched_at, latest[tmdb_id])
+        latest[tmdb_id] = watched_at
+    if not latest and not listed:
+        return
+
+    # Movies TMDB cannot return right now are imported anyway; the catalog warmer fills them in later
+    movies = _save_movies_details_if_not_exist(list(dict.fromkeys([*latest, *(tmdb_id for _, tmdb_id in listed)])))
+    existing = {
+        tmdb_id for (tmdb_id,) in db.session.query(Watched.tmdb_id).filter(
+            Watched.user_id == user_id, Watched.tmdb_id.in_(list(latest))
+        )
+    } if latest else set()
+    new = {tmdb_id: watched_at for tmdb_id, watched_at in latest.items() if tmdb_id not in existing}
+    stats["already_watched"] += len(latest) - len(new)
+    if not new and not listed:
+        return
+    created = []
+    try:
+        if new:
+            rows = [
+                {"user_id": user_id, "tmdb_id": tmdb_id, "watched_at": watched_at, **movie_fields(movies.get(tmdb_id))}
+                for tmdb_id, watched_at in new.items()
+            ]
+            _insert_ignore(Watched, rows)
+            apply_changes(user_id, added=[(row["watched_at"], row) for row in rows])
+            if watched_list_id:
+                _insert_ignore(MovieList, [{"list_id": watched_list_id, "tmdb_id": tmdb_id} for tmdb_id in new])
+        list_rows = [
+            {"list_id": _list_id(user_id, name, list_ids, created), "tmdb_id": tmdb_id} for name, tmdb_id in listed
+        ]
+        added = _insert_ignore(MovieList, list_rows) if list_rows else 0
+        db.session.commit()
+        stats["imported"] += len(new)
+        stats["listed"] += added
+        stats["already_listed"] += len(list_rows) - added
+        stats["lists_created"] += len(created)
+    except Exception as e:
+        db.session.rollback()
+        for name in created:
+            list_ids.pop(name, None)
+        stats["failed"] += len(new) + len(listed)
+        print(f"Error importing watched movies for user {user_id}: {str(e)}")
+
+
+def import_watched(user_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Imports ``records`` (dicts, e.g. from read_records) into the user's watched history and lists.
+    Yields a progress dict after every chunk; the last one has ``done`` set and lists up to
+    MAX_UNRESOLVED_REPORTED entries that could not be matched to a TMDB movie, plus ``error``
+    if the file turned out to be malformed (the entries read before it are still imported).
+    """
+    stats = {"processed": 0, "imported": 0, "already_watched": 0, "listed": 0, "already_listed": 0,
+             "lists_created": 0, "duplicates": 0, "unresolved": 0, "invalid": 0, "failed": 0}
+    unresolved = []
+    list_ids = {}  # List name -> id, for the entries with a list
+    watched_list = List.query.filter_by(user_id=user_id, is_main=True, name="Assistidos").first()
+    watched_list_id = watched_list.id if watched_list else None
+
+    chunk = []
+    error = None
+    try:
+        for record in records:
+            stats["processed"] += 1
+            entry = normalize_record(record)
+            if entry is None:
+                stats["invalid"] += 1
+                continue
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                _import_chunk(user_id, chunk, watched_list_id, list_ids, stats, unresolved)
+                chunk = []
+                yield dict(stats)
+    except (ValueError, csv.Error) as e:
+        # Malformed file: keep what was read before the error and report it
+        error = str(e)
+    if chunk:
+        _import_chunk(user_id, chunk, watched_list_id, list_ids, stats, unresolved)
+    final = dict(stats, done=True, unresolved_entries=unresolved)
+    if error:
+        final["error"] = error
+    yield final
+
+
+def export_watched(user_id, fmt="csv", chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the user's watched history, oldest first, then the movies of the user's lists
+    (``list`` set, no ``watched_at``), as CSV or a JSON array in text chunks of ``chunk_size``
+    rows. The output can be imported back with import_watched.
+    """
+    watched = (
+        db.session.query(Watched.tmdb_id, Movie.title, Movie.release_date, Watched.watched_at, null())
+        .outerjoin(Movie, Movie.tmdb_id == Watched.tmdb_id)
+        .filter(Watched.user_id == user_id)
+        .order_by(Watched.watched_at, Watched.id)
+        .yield_per(chunk_size)
+    )
+    # "Assistidos" is filled from the history on import
+    listed = (
+        db.session.query(MovieList.tmdb_id, Movie.title, Movie.release_date, null(), List.name)
+        .join(List, List.id == MovieList.list_id)
+        .outerjoin(Movie, Movie.tmdb_id == MovieList.tmdb_id)
+        .filter(List.user_id == user_id, or_(List.is_main.isnot(True), List.name != "Assistidos"))
+        .order_by(List.name, MovieList.id)
+        .yield_per(chunk_size)
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+    else:
+        buffer.write("[")
+
+    count = 0
+    for tmdb_id, title, release_date, watched_at, list_name in itertools.chain(watched, listed):
+        values = [
+            tmdb_id,
+            title,
+            release_date.year if release_date else None,
+            watched_at.date().isoformat() if watched_at else None,
+            list_name,
+        ]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(("\n" if count == 0 else ",\n") + json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False))
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if not writer:
+        buffer.write("\n]\n")
+    yield buffer.getvalue()
+
+
+def _require_user(user_id):
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f"User {user_id} not found")
+
+
+@click.command("import-watched")
+@click.argument("file", type=click.File("rb"))
+@click.option("--user-id", type=int, required=True, help="User that receives the watched history.")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="File format (guessed from the file name by default).")
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True, help="Entries resolved and inserted per transaction.")
+@with_appcontext
+def import_watched_command(file, user_id, fmt, chunk_size):
+    """Import a watched history (and lists) from a Letterboxd/IMDb CSV or a JSON file."""
+    _require_user(user_id)
+    fmt = fmt or guess_format(file.name)
+    if fmt is None:
+        raise click.ClickException("Could not guess the file format, pass --format csv or --format json")
+    for progress in import_watched(user_id, read_records(file, fmt), chunk_size):
+        click.echo(
+            f"  {progress['processed']} read, {progress['imported']} imported, "
+            f"{progress['already_watched']} already watched, {progress['listed']} added to lists, "
+            f"{progress['unresolved']} unresolved, "
+            f"{progress['invalid']} invalid, {progress['failed']} failed"
+        )
+    for entry in progress["unresolved_entries"]:
+        click.echo(f"  not found on TMDB: {entry}")
+    if "error" in progress:
+        raise click.ClickException(f"Import stopped early: {progress['error']}")
+
+
+@click.command("export-watched")
+@click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--user-id", type=int, required=True, help="User whose watched history and lists are exported.")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="csv", show_default=True)
+@with_appcontext
+def export_watched_command(output, user_id, fmt):
+    """Export a watched history and lists as CSV or JSON (to stdout by default)."""
+    _require_user(user_id)
+    for chunk in export_watched(user_id, fmt):
+        output.write(chunk)
@@ -0,0 +1,190 @@
+"""
+Watched statistics backed by the WatchedSummary table.
+
+Every Watched insert, delete or date change adjusts the user's summary rows (counts per
+watched month, release year and genre, plus the sums behind the average TMDB rating), so
+/movie/watched/stats reads a handful of pre-aggregated rows instead of the whole history.
+
+Each Watched row keeps the movie fields it was counted with (movie_rating, movie_release_date,
+movie_genres), so removing it subtracts exactly what was added even if a background refresh
+changed the movie meanwhile. The summaries thus describe movies as they were when watched;
+a rebuild re-reads the current Movie fields into every row and recomputes the counters:
+
+    python -m flask --app app rebuild-watched-stats
+    python -m flask --app app rebuild-watched-stats --user-id 42
+"""
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, bindparam, delete, insert, select, update
+
+from extensions import db
+from models import Movie, Watched, WatchedSummary
+from utils import _insert_ignore
+
+summary = WatchedSummary.__table__
+
+
+def movie_fields(movie):
+    """Values of the Watched movie_* columns for a new entry of ``movie`` (None when it is not stored)."""
+    if movie is None:
+        return {"movie_rating": None, "movie_release_date": None, "movie_genres": None}
+    return {"movie_rating": movie.rating, "movie_release_date": movie.release_date, "movie_genres": movie.genres}
+
+
+def counted_fields(watched):
+    """The movie_* values a stored Watched row was counted with."""
+    return {"movie_rating": watched.movie_rating, "movie_release_date": watched.movie_release_date,
+            "movie_genres": watched.movie_genres}
+
+
+def summary_buckets(watched_at, fields):
+    """(dimension, bucket) pairs a watched entry with the given movie_* ``fields`` counts towards."""
+    buckets = [("total", ""), ("month", watched_at.strftime("%Y-%m"))]
+    if fields["movie_release_date"]:
+        buckets.append(("release_year", str(fields["movie_release_date"].year)))
+    for genre in fields["movie_genres"] or []:
+        genre_id = genre.get("id") if isinstance(genre, dict) else genre
+        if genre_id is not None:
+            buckets.append(("genre", str(genre_id)))
+    return buckets
+
+
+def _accumulate(totals, watched_at, fields, sign):
+    rating = fields["movie_rating"]
+    for key in summary_buckets(watched_at, fields):
+        counters = totals[key]
+        counters[0] += sign
+        if rating is not None:
+            counters[1] += sign * rating
+            counters[2] += sign
+
+
+def apply_changes(user_id, added=(), removed=()):
+    """
+    Adjusts the user's summary rows in the current session for Watched entries that were
+    added or removed, each given as (watched_at, fields) with the entry's movie_* column
+    values: movie_fields() for a new entry, counted_fields() for a stored one. The caller commits.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for watched_at, movie in added:
+        _accumulate(totals, watched_at, movie, 1)
+    for watched_at, movie in removed:
+        _accumulate(totals, watched_at, movie, -1)
+    changes = [(key, counters) for key, counters in totals.items() if counters[0] or counters[2]]
+    if not changes:
+        return
+
+    _insert_ignore(WatchedSummary, [
+        {"user_id": user_id, "dimension": dimension, "bucket": bucket, "count": 0, "rating_sum": 0, "rating_count": 0}
+        for (dimension, bucket), _ in changes
+    ])
+    stmt = update(summary).where(and_(
+        summary.c.user_id == bindparam("b_user_id"),
+        summary.c.dimension == bindparam("b_dimension"),
+        summary.c.bucket == bindparam("b_bucket"),
+    )).values(
+        count=summary.c.count + bindparam("b_count"),
+        rating_sum=summary.c.rating_sum + bindparam("b_rating_sum"),
+        rating_count=summary.c.rating_count + bindparam("b_rating_count"),
+    )
+    db.session.execute(stmt, [
+        {"b_user_id": user_id, "b_dimension": dimension, "b_bucket": bucket,
+         "b_count": count, "b_rating_sum": rating_sum, "b_rating_count": rating_count}
+        for (dimension, bucket), (count, rating_sum, rating_count) in changes
+    ])
+    if removed:
+        db.session.execute(delete(summary).where(summary.c.user_id == user_id, summary.c.count <= 0))
+
+
+def rebuild(connection, user_ids=None, batch_size=1000):
+    """
+    Copies the current Movie fields into the movie_* columns of Watched and recomputes the
+    summary rows from them, for every user or only ``user_ids``. ``connection`` is a
+    Connection or the session; the caller commits. Returns the number of summary rows written.
+    """
+    def current(column):
+        return select(column).where(Movie.tmdb_id == Watched.tmdb_id).scalar_subquery()
+
+    refresh = update(Watched).values(
+        movie_rating=current(Movie.rating),
+        movie_release_date=current(Movie.release_date),
+        movie_genres=current(Movie.genres),
+    )
+    clear = delete(summary)
+    watched = select(
+        Watched.user_id, Watched.watched_at, Watched.movie_rating, Watched.movie_release_date, Watched.movie_genres
+    ).order_by(Watched.user_id)
+    if user_ids is not None:
+        refresh = refresh.where(Watched.user_id.in_(user_ids))
+        clear = clear.where(summary.c.user_id.in_(user_ids))
+        watched = watched.where(Watched.user_id.in_(user_ids))
+    connection.execute(refresh)
+    connection.execute(clear)
+
+    written = 0
+    pending = []
+
+    def flush_user(user_id, totals):
+        pending.extend(
+            {"user_id": user_id, "dimension": dimension, "bucket": bucket,
+             "count": count, "rating_sum": rating_sum, "rating_count": rating_count}
+            for (dimension, bucket), (count, rating_sum, rating_count) in totals.items()
+        )
+
+    current_user, totals = None, None
+    for row in connection.execute(watched):
+        if row.user_id != current_user:
+            if current_user is not None:
+                flush_user(current_user, totals)
+            current_user, totals = row.user_id, defaultdict(lambda: [0, 0.0, 0])
+            if len(pending) >= batch_size:
+                connection.execute(insert(summary), pending)
+                written += len(pending)
+                pending = []
+        _accumulate(totals, row.watched_at, row._mapping, 1)
+    if current_user is not None:
+        flush_user(current_user, totals)
+    if pending:
+        connection.execute(insert(summary), pending)
+        written += len(pending)
+    return written
+
+
+def get_stats(user_id):
+    """The /movie/watched/stats payload, read from the user's summary rows in one query."""
+    rows = db.session.query(
+        WatchedSummary.dimension, WatchedSummary.bucket, WatchedSummary.count,
+        WatchedSummary.rating_sum, WatchedSummary.rating_count,
+    ).filter(WatchedSummary.user_id == user_id)
+
+    def average(row):
+        return round(row.rating_sum / row.rating_count, 2) if row.rating_count else None
+
+    stats = {"user_id": user_id, "count": 0, "average_rating": None,
+             "by_month": [], "by_release_year": [], "by_genre": []}
+    for row in rows:
+        if row.dimension == "total":
+            stats["count"] = row.count
+            stats["average_rating"] = average(row)
+        elif row.dimension == "month":
+            stats["by_month"].append({"month": row.bucket, "count": row.count})
+        elif row.dimension == "release_year":
+            stats["by_release_year"].append({"year": int(row.bucket), "count": row.count, "average_rating": average(row)})
+        elif row.dimension == "genre":
+            stats["by_genre"].append({"genre_id": int(row.bucket), "count": row.count, "average_rating": average(row)})
+    stats["by_month"].sort(key=lambda item: item["month"])
+    stats["by_release_year"].sort(key=lambda item: item["year"])
+    stats["by_genre"].sort(key=lambda item: (-item["count"], item["genre_id"]))
+    return stats
+
+
+@click.command("rebuild-watched-stats")
+@click.option("--user-id", "user_ids", type=int, multiple=True, help="Only rebuild these users (repeatable).")
+@with_appcontext
+def rebuild_watched_stats_command(user_ids):
+    """Recompute the WatchedSummary table from the watched history."""
+    written = rebuild(db.session, list(user_ids) or None)
+    db.session.commit()
+    click.echo(f"Done: {written} summary rows written.")
@@ -90,7 +90,42 @@ export async function apiPut(url, data, options = {}) {
   })
 }
 
+// Função wrapper para PATCH
+export async function apiPatch(url, data, options = {}) {
+  return apiCall(url, {
+    ...options,
+    method: 'PATCH',
+    headers: {
+      'Content-Type': 'application/json',
+      ...options.headers
+    },
+    body: JSON.stringify(data)
+  })
+}
+
 // Função wrapper para DELETE
 export async function apiDelete(url, options = {}) {
   return apiCall(url, { ...options, method: 'DELETE' })
 }
+
+// Busca os detalhes de vários filmes em uma única requisição (em blocos de até 500 IDs),
+// evitando uma chamada a /api/tmdb/movie/:id por filme
+const MOVIES_BATCH_SIZE = 500
+
+export async function apiGetMoviesBatch(ids, language = 'pt-BR') {
+  const movies = []
+  for (let i = 0; i < ids.length; i += MOVIES_BATCH_SIZE) {
+    const data = await apiPost('/api/tmdb/movies/batch', {
+      ids: ids.slice(i, i + MOVIES_BATCH_SIZE),
+      language
+    })
+    movies.push(...(data.movies || []))
+  }
+  return movies
+}
+
+// Adiciona, remove e move vários filmes de uma lista em uma única requisição
+// changes: { add: [tmdbId], remove: [tmdbId], move: [{ tmdb_id, to_list_id }] }
+export async function apiUpdateListMovies(listId, changes) {
+  return apiPatch(`/api/lists/${listId}/movies`, changes)
+}